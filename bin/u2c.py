@@ -46,7 +46,7 @@ PY27 = sys.version_info > (2, 7) and PY2
 PY37 = sys.version_info > (3, 7)
 if PY2:
     import httplib as http_client
-    from Queue import Queue
+    from Queue import Empty, Queue
     from urllib import quote, unquote
     from urlparse import urlsplit, urlunsplit
 
@@ -58,7 +58,7 @@ else:
     from urllib.parse import urlsplit, urlunsplit
 
     import http.client as http_client
-    from queue import Queue
+    from queue import Empty, Queue
 
     unicode = str
 
@@ -154,6 +154,7 @@ class HCli(object):
         self.tls = tls
         self.verify = ar.te or not ar.td
         self.conns = []
+        self.nobatch = False
         if tls:
             import ssl
 
@@ -218,6 +219,8 @@ MJ = "application/json"
 MO = "application/octet-stream"
 CLEN = "Content-Length"
 
+HAVE_PREAD = hasattr(os, "pread")  # not on windows / py2
+
 web = None  # type: HCli
 
 
@@ -334,12 +337,13 @@ class FileSlice(object):
 
 
 class MTHash(object):
-    def __init__(self, cores):
+    def __init__(self, cores, bufsz=1024 * 1024 * 12):
         self.f = None
+        self.fn = ""
+        self.bufsz = bufsz
         self.sz = 0
         self.csz = 0
         self.omutex = threading.Lock()
-        self.imutex = threading.Lock()
         self.work_q = Queue()
         self.done_q = Queue()
         self.thrs = []
@@ -351,6 +355,8 @@ class MTHash(object):
             self.f = f
             self.sz = fsz
             self.csz = chunksz
+            if not HAVE_PREAD:
+                self.fn = f.name
 
             chunks = {}
             nchunks = int(math.ceil(fsz / chunksz))
@@ -377,6 +383,7 @@ class MTHash(object):
                 ret.append(chunks[n])
 
             self.f = None
+            self.fn = ""
             self.csz = 0
             self.sz = 0
             return ret
@@ -397,17 +404,29 @@ class MTHash(object):
         ofs = ofs0 = nch * self.csz
         hashobj = hashlib.sha512()
         chunk_sz = chunk_rem = min(self.csz, self.sz - ofs)
-        while chunk_rem > 0:
-            with self.imutex:
-                f.seek(ofs)
-                buf = f.read(min(chunk_rem, 1024 * 1024 * 12))
-
-            if not buf:
-                raise Exception("EOF at " + str(ofs))
+        if HAVE_PREAD:
+            # positional reads on the shared fd; no lock, no seek
+            fd = f.fileno()
+            while chunk_rem > 0:
+                buf = os.pread(fd, min(chunk_rem, self.bufsz), ofs)
+                if not buf:
+                    raise Exception("EOF at " + str(ofs))
 
-            hashobj.update(buf)
-            chunk_rem -= len(buf)
-            ofs += len(buf)
+                hashobj.update(buf)
+                chunk_rem -= len(buf)
+                ofs += len(buf)
+        else:
+            # a private fd for each chunk, so the seeks don't collide
+            with open(self.fn, "rb", 0) as f2:
+                f2.seek(ofs)
+                while chunk_rem > 0:
+                    buf = f2.read(min(chunk_rem, self.bufsz))
+                    if not buf:
+                        raise Exception("EOF at " + str(ofs))
+
+                    hashobj.update(buf)
+                    chunk_rem -= len(buf)
+                    ofs += len(buf)
 
         digest = ub64enc(hashobj.digest()[:33]).decode("utf-8")
         return nch, digest, ofs0, chunk_sz
@@ -697,7 +716,7 @@ def get_hashlist(file, pcb, mth):
             file_rem = 0
 
         while file_rem > 0:
-            # same as `hash_at` except for `imutex` / bufsz
+            # same as `hash_at` except for pread / bufsz
             hashobj = hashlib.sha512()
             chunk_sz = chunk_rem = min(chunk_sz, file_rem)
             while chunk_rem > 0:
@@ -725,14 +744,21 @@ def get_hashlist(file, pcb, mth):
             file.kchunks[k] = [v1, v2]
 
 
-def handshake(ar, file, search):
-    # type: (argparse.Namespace, File, bool) -> tuple[list[str], bool]
-    """
-    performs a handshake with the server; reply is:
-      if search, a list of search results
-      otherwise, a list of chunks to upload
-    """
+def hs_url(ar, file):
+    # type: (argparse.Namespace, File) -> str
+    """the folder-url to handshake with"""
+    if file.url:
+        return file.url
+
+    if b"/" in file.rel:
+        url = quotep(file.rel.rsplit(b"/", 1)[0]).decode("utf-8")
+    else:
+        url = ""
+    return ar.vtop + url
 
+
+def hs_req(ar, file, search):
+    # type: (argparse.Namespace, File, bool) -> dict[str, Any]
     req = {
         "hash": [x[0] for x in file.cids],
         "name": file.name,
@@ -748,14 +774,47 @@ def handshake(ar, file, search):
             req["replace"] = True
 
     file.recheck = False
-    if file.url:
-        url = file.url
-    else:
-        if b"/" in file.rel:
-            url = quotep(file.rel.rsplit(b"/", 1)[0]).decode("utf-8")
-        else:
-            url = ""
-        url = ar.vtop + url
+    return req
+
+
+def hs_err(file, sc, txt):
+    # type: (File, int, str) -> bool
+    """True if the handshake error is final (file skipped or rechecked)"""
+    if (
+        sc == 422
+        or "partial upload exists at a different" in txt
+        or "source file busy; please try again" in txt
+    ):
+        file.recheck = True
+        return True
+    elif sc == 409 or "upload rejected, file already exists" in txt:
+        return True
+    elif sc == 403:
+        print("\nERROR: login required, or wrong password:\n%s" % (txt,))
+        raise BadAuth()
+
+    return False
+
+
+def hs_ok(file, r):
+    # type: (File, dict[str, Any]) -> tuple[list[str], bool]
+    file.url = quotep(r["purl"].encode("utf-8", WTF8)).decode("utf-8")
+    file.name = r["name"]
+    file.wark = r["wark"]
+
+    return r["hash"], r["sprs"]
+
+
+def handshake(ar, file, search):
+    # type: (argparse.Namespace, File, bool) -> tuple[list[str], bool]
+    """
+    performs a handshake with the server; reply is:
+      if search, a list of search results
+      otherwise, a list of chunks to upload
+    """
+
+    req = hs_req(ar, file, search)
+    url = hs_url(ar, file)
 
     while True:
         sc = 600
@@ -772,18 +831,8 @@ def handshake(ar, file, search):
         except Exception as ex:
             em = str(ex).split("SSLError(")[-1].split("\nURL: ")[0].strip()
 
-            if (
-                sc == 422
-                or "<pre>partial upload exists at a different" in txt
-                or "<pre>source file busy; please try again" in txt
-            ):
-                file.recheck = True
+            if hs_err(file, sc, txt):
                 return [], False
-            elif sc == 409 or "<pre>upload rejected, file already exists" in txt:
-                return [], False
-            elif sc == 403:
-                print("\nERROR: login required, or wrong password:\n%s" % (txt,))
-                raise BadAuth()
 
             t = "handshake failed, retrying: %s\n  t0=%.3f t1=%.3f td=%.3f\n  %s\n\n"
             now = time.time()
@@ -798,11 +847,49 @@ def handshake(ar, file, search):
     if search:
         return r["hits"], False
 
-    file.url = quotep(r["purl"].encode("utf-8", WTF8)).decode("utf-8")
-    file.name = r["name"]
-    file.wark = r["wark"]
+    return hs_ok(file, r)
 
-    return r["hash"], r["sprs"]
+
+def handshakes(ar, files):
+    # type: (argparse.Namespace, list[File]) -> list[tuple[list[str], bool]]
+    """
+    one handshake for several files into the same folder (if the
+    server supports it); any file it could not deal with, or all of
+    them if the server is too old, gets a regular handshake instead
+    """
+    req = [hs_req(ar, x, False) for x in files]
+    rsp = None
+    try:
+        zs = json.dumps(req, separators=(",\n", ": "))
+        sc, txt = web.req("POST", hs_url(ar, files[0]), {}, zs.encode("utf-8"), MJ)
+        if sc == 403:
+            hs_err(files[0], sc, txt)
+
+        rsp = json.loads(txt) if sc < 400 else None
+        if not isinstance(rsp, list) or len(rsp) != len(files):
+            rsp = None
+            if not web.nobatch:
+                eprint("batch handshake failed (http %d); server too old?\n" % (sc,))
+            web.nobatch = True
+    except BadAuth:
+        raise
+    except Exception as ex:
+        eprint("batch handshake failed: %r\n" % (ex,))
+
+    ret = []
+    for n, file in enumerate(files):
+        r = rsp[n] if rsp else {}
+        if "error" in r:
+            if hs_err(file, r["status"], r["error"]):
+                ret.append(([], False))
+                continue
+        elif r:
+            ret.append(hs_ok(file, r))
+            continue
+
+        ret.append(handshake(ar, file, False))
+
+    return ret
 
 
 def upload(fsl, stats):
@@ -924,7 +1011,10 @@ class Ctl(object):
             self.st_hash = [None, "(idle, starting...)"]  # type: tuple[File, int]
             self.st_up = [None, "(idle, starting...)"]  # type: tuple[File, int]
 
-            self.mth = MTHash(ar.J) if ar.J > 1 else None
+            if ar.J > 1:
+                self.mth = MTHash(ar.J, ar.hrs * 1024)
+            else:
+                self.mth = None
 
             self._fancy()
 
@@ -1213,15 +1303,15 @@ class Ctl(object):
 
     def handshaker(self):
         search = self.ar.s
+        pend = []
         while True:
-            file = self.q_handshake.get()
+            file = pend.pop(0) if pend else self.q_handshake.get()
             if not file:
                 with self.mutex:
                     self.handshaker_alive -= 1
                 self.q_upload.put(None)
                 return
 
-            chunksz = up2k_chunksize(file.size)
             upath = file.abs.decode("utf-8", "replace")
             if not VT100:
                 upath = upath.lstrip("\\?")
@@ -1235,102 +1325,137 @@ class Ctl(object):
             while time.time() < file.cd:
                 time.sleep(0.1)
 
+            # grab any more files headed for the same folder
+            files = [file]
+            if not search and self.ar.hsb > 1 and not web.nobatch:
+                url = hs_url(self.ar, file)
+                ncids = len(file.cids)
+                while len(files) < min(self.ar.hsb, 256):
+                    try:
+                        f2 = self.q_handshake.get(False)
+                    except Empty:
+                        break
+                    if (
+                        not f2
+                        or f2.nhs >= 32
+                        or f2.cd > time.time()
+                        or hs_url(self.ar, f2) != url
+                        or ncids + len(f2.cids) > 4096
+                    ):
+                        pend.append(f2)
+                        break
+                    f2.nhs += 1
+                    ncids += len(f2.cids)
+                    files.append(f2)
+
             try:
-                hs, sprs = handshake(self.ar, file, search)
+                if len(files) > 1:
+                    rets = handshakes(self.ar, files)
+                else:
+                    rets = [handshake(self.ar, file, search)]
             except BadAuth:
                 self.panik = 1
                 break
 
-            if search:
-                if hs:
-                    for hit in hs:
-                        print("found: %s\n  %s/%s" % (upath, self.ar.burl, hit["rp"]))
-                else:
-                    print("NOT found: {0}".format(upath))
+            for file, (hs, sprs) in zip(files, rets):
+                self.handshaked(file, hs, sprs, search)
 
-                with self.mutex:
-                    self.up_f += 1
-                    self.up_c += len(file.cids)
-                    self.up_b += file.size
+    def handshaked(self, file, hs, sprs, search):
+        chunksz = up2k_chunksize(file.size)
+        upath = file.abs.decode("utf-8", "replace")
+        if not VT100:
+            upath = upath.lstrip("\\?")
 
-                self._check_if_done()
-                continue
-
-            if file.recheck:
-                self.recheck.append(file)
+        if search:
+            if hs:
+                for hit in hs:
+                    print("found: %s\n  %s/%s" % (upath, self.ar.burl, hit["rp"]))
+            else:
+                print("NOT found: {0}".format(upath))
 
             with self.mutex:
-                if hs and not sprs and not self.serialized:
-                    t = "server filesystem does not support sparse files; serializing uploads\n"
-                    eprint(t)
-                    self.serialized = True
-                    for _ in range(self.ar.j - 1):
-                        self.q_upload.put(None)
-                if not hs:
-                    # all chunks done
-                    self.up_f += 1
-                    self.up_c += len(file.cids) - file.up_c
-                    self.up_b += file.size - file.up_b
-
-                    if not file.recheck:
-                        self.up_done(file)
-
-                if hs and file.up_c:
-                    # some chunks failed
-                    self.up_c -= len(hs)
-                    file.up_c -= len(hs)
-                    for cid in hs:
-                        sz = file.kchunks[cid][1]
-                        self.up_br -= sz
-                        self.up_b -= sz
-                        file.up_b -= sz
-
-                if hs and not file.up_b:
-                    # first hs of this file; is this an upload resume?
-                    file.up_b = chunksz * max(0, len(file.kchunks) - len(hs))
+                self.up_f += 1
+                self.up_c += len(file.cids)
+                self.up_b += file.size
 
-                file.ucids = hs
+            self._check_if_done()
+            return
 
-            if not hs:
-                self.at_hash += file.t_hash
+        if file.recheck:
+            self.recheck.append(file)
 
-                if self.ar.spd:
-                    if VT100:
-                        c1 = "\033[36m"
-                        c2 = "\033[0m"
-                    else:
-                        c1 = c2 = ""
+        with self.mutex:
+            if hs and not sprs and not self.serialized:
+                t = "server filesystem does not support sparse files; serializing uploads\n"
+                eprint(t)
+                self.serialized = True
+                for _ in range(self.ar.j - 1):
+                    self.q_upload.put(None)
+            if not hs:
+                # all chunks done
+                self.up_f += 1
+                self.up_c += len(file.cids) - file.up_c
+                self.up_b += file.size - file.up_b
+
+                if not file.recheck:
+                    self.up_done(file)
+
+            if hs and file.up_c:
+                # some chunks failed
+                self.up_c -= len(hs)
+                file.up_c -= len(hs)
+                for cid in hs:
+                    sz = file.kchunks[cid][1]
+                    self.up_br -= sz
+                    self.up_b -= sz
+                    file.up_b -= sz
+
+            if hs and not file.up_b:
+                # first hs of this file; is this an upload resume?
+                file.up_b = chunksz * max(0, len(file.kchunks) - len(hs))
+
+            file.ucids = hs
+
+        if not hs:
+            self.at_hash += file.t_hash
+
+            if self.ar.spd:
+                if VT100:
+                    c1 = "\033[36m"
+                    c2 = "\033[0m"
+                else:
+                    c1 = c2 = ""
 
-                    spd_h = humansize(file.size / file.t_hash, True)
-                    if file.up_c:
-                        t_up = file.t1_up - file.t0_up
-                        spd_u = humansize(file.size / t_up, True)
+                spd_h = humansize(file.size / file.t_hash, True)
+                if file.up_c:
+                    t_up = file.t1_up - file.t0_up
+                    spd_u = humansize(file.size / t_up, True)
 
-                        t = "uploaded %s %s(h:%.2fs,%s/s,up:%.2fs,%s/s)%s"
-                        print(t % (upath, c1, file.t_hash, spd_h, t_up, spd_u, c2))
-                    else:
-                        t = "   found %s %s(%.2fs,%s/s)%s"
-                        print(t % (upath, c1, file.t_hash, spd_h, c2))
+                    t = "uploaded %s %s(h:%.2fs,%s/s,up:%.2fs,%s/s)%s"
+                    print(t % (upath, c1, file.t_hash, spd_h, t_up, spd_u, c2))
                 else:
-                    kw = "uploaded" if file.up_c else "   found"
-                    print("{0} {1}".format(kw, upath))
+                    t = "   found %s %s(%.2fs,%s/s)%s"
+                    print(t % (upath, c1, file.t_hash, spd_h, c2))
+            else:
+                kw = "uploaded" if file.up_c else "   found"
+                print("{0} {1}".format(kw, upath))
 
-                self._check_if_done()
-                continue
+            self._check_if_done()
+            return
 
-            njoin = (self.ar.sz * 1024 * 1024) // chunksz
-            cs = hs[:]
-            while cs:
-                fsl = FileSlice(file, cs[:1])
-                try:
-                    if file.nojoin:
-                        raise Exception()
-                    for n in range(2, min(len(cs), njoin + 1)):
-                        fsl = FileSlice(file, cs[:n])
-                except:
-                    pass
-                cs = cs[len(fsl.cids) :]
-                self.q_upload.put(fsl)
+        njoin = (self.ar.sz * 1024 * 1024) // chunksz
+        cs = hs[:]
+        while cs:
+            fsl = FileSlice(file, cs[:1])
+            try:
+                if file.nojoin:
+                    raise Exception()
+                for n in range(2, min(len(cs), njoin + 1)):
+                    fsl = FileSlice(file, cs[:n])
+            except:
+                pass
+            cs = cs[len(fsl.cids) :]
+            self.q_upload.put(fsl)
 
     def uploader(self):
         while True:
@@ -1458,7 +1583,9 @@ source file/folder selection uses rsync syntax, meaning that:
     ap = app.add_argument_group("performance tweaks")
     ap.add_argument("-j", type=int, metavar="CONNS", default=2, help="parallel connections")
     ap.add_argument("-J", type=int, metavar="CORES", default=hcores, help="num cpu-cores to use for hashing; set 0 or 1 for single-core hashing")
+    ap.add_argument("--hrs", type=int, metavar="KiB", default=12288, help="read size for each of the -J hashing threads; try 1024 on NVMe or network drives")
     ap.add_argument("--sz", type=int, metavar="MiB", default=64, help="try to make each POST this big")
+    ap.add_argument("--hsb", type=int, metavar="FILES", default=256, help="handshake up to this many files (in the same folder) in one request; 1 = disable, max 256")
     ap.add_argument("-nh", action="store_true", help="disable hashing while uploading")
     ap.add_argument("-ns", action="store_true", help="no status panel (for slow consoles and macos)")
     ap.add_argument("--cd", type=float, metavar="SEC", default=5, help="delay before reattempting a failed handshake/upload")
@@ -946,6 +946,8 @@ def add_general(ap, nc, srvname):
     ap2.add_argument("-c", metavar="PATH", type=u, action="append", help="add config file")
     ap2.add_argument("-nc", metavar="NUM", type=int, default=nc, help="max num clients")
     ap2.add_argument("-j", metavar="CORES", type=int, default=1, help="max num cpu cores, 0=all")
+    ap2.add_argument("--ipc-thr", metavar="N", type=int, default=16, help="when multiprocessing (\033[33m-j\033[0m), max number of calls from the worker processes (uploads, thumbnails, ...) to run concurrently in the main process")
+    ap2.add_argument("--ipc-tmo", metavar="SEC", type=float, default=0, help="when multiprocessing (\033[33m-j\033[0m), give up on a call into the main process if it takes longer than \033[33mSEC\033[0m seconds; 0 = wait forever. Deletes and moves always wait forever")
     ap2.add_argument("-a", metavar="ACCT", type=u, action="append", help="add account, \033[33mUSER\033[0m:\033[33mPASS\033[0m; example [\033[32med:wark\033[0m]")
     ap2.add_argument("-v", metavar="VOL", type=u, action="append", help="add volume, \033[33mSRC\033[0m:\033[33mDST\033[0m:\033[33mFLAG\033[0m; examples [\033[32m.::r\033[0m], [\033[32m/mnt/nas/music:/music:r:aed\033[0m], see --help-accounts")
     ap2.add_argument("--grp", metavar="G:N,N", type=u, action="append", help="add group, \033[33mNAME\033[0m:\033[33mUSER1\033[0m,\033[33mUSER2\033[0m,\033[33m...\033[0m; example [\033[32madmins:ed,foo,bar\033[0m]")
@@ -999,15 +1001,18 @@ def add_upload(ap):
     ap2.add_argument("--blank-wt", metavar="SEC", type=int, default=300, help="file write grace period (any client can write to a blank file last-modified more recently than \033[33mSEC\033[0m seconds ago)")
     ap2.add_argument("--reg-cap", metavar="N", type=int, default=38400, help="max number of uploads to keep in memory when running without \033[33m-e2d\033[0m; roughly 1 MiB RAM per 600")
     ap2.add_argument("--no-fpool", action="store_true", help="disable file-handle pooling -- instead, repeatedly close and reopen files during upload (bad idea to enable this on windows and/or cow filesystems)")
+    ap2.add_argument("--no-u2pipe", action="store_true", help="disable pipelined up2k chunk receiving -- instead of hashing+writing each buffer in a separate thread while the next one is received, do everything in the connection's own thread (the old behavior)")
     ap2.add_argument("--use-fpool", action="store_true", help="force file-handle pooling, even when it might be dangerous (multiprocessing, filesystems lacking sparse-files support, ...)")
     ap2.add_argument("--dedup", action="store_true", help="enable symlink-based upload deduplication (volflag=dedup)")
     ap2.add_argument("--safe-dedup", metavar="N", type=int, default=50, help="how careful to be when deduplicating files; [\033[32m1\033[0m] = just verify the filesize, [\033[32m50\033[0m] = verify file contents have not been altered (volflag=safededup)")
     ap2.add_argument("--hardlink", action="store_true", help="enable hardlink-based dedup; will fallback on symlinks when that is impossible (across filesystems) (volflag=hardlink)")
     ap2.add_argument("--hardlink-only", action="store_true", help="do not fallback to symlinks when a hardlink cannot be made (volflag=hardlinkonly)")
+    ap2.add_argument("--reflink", action="store_true", help="enable reflink-based dedup; dupes become independent copy-on-write copies which share disk space (btrfs, xfs, bcachefs, ...), and repeated chunks within an upload are cloned in-kernel; falls back on \033[33m--hardlink\033[0m / symlinks / regular copies when the filesystem refuses (volflag=reflink)")
     ap2.add_argument("--no-dupe", action="store_true", help="reject duplicate files during upload; only matches within the same volume (volflag=nodupe)")
     ap2.add_argument("--no-clone", action="store_true", help="do not use existing data on disk to satisfy dupe uploads; reduces server HDD reads in exchange for much more network load (volflag=noclone)")
-    ap2.add_argument("--no-snap", action="store_true", help="disable snapshots -- forget unfinished uploads on shutdown; don't create .hist/up2k.snap files -- abandoned/interrupted uploads must be cleaned up manually")
-    ap2.add_argument("--snap-wri", metavar="SEC", type=int, default=300, help="write upload state to ./hist/up2k.snap every \033[33mSEC\033[0m seconds; allows resuming incomplete uploads after a server crash")
+    ap2.add_argument("--unpack", action="store_true", help="allow uploading a tar/zip file with \033[33m?unpack\033[0m (PUT or POST) to have it extracted into the target folder as it is received, without storing the archive itself; each file inside is checked against upload limits, runs the xbu/xau hooks, and is indexed as a regular upload (volflag=unpack)")
+    ap2.add_argument("--no-snap", action="store_true", help="disable snapshots -- forget unfinished uploads on shutdown; don't create .hist/up2k.snap or .hist/up2k.jnl files -- abandoned/interrupted uploads must be cleaned up manually")
+    ap2.add_argument("--snap-wri", metavar="SEC", type=int, default=300, help="changes to the upload state are logged to ./hist/up2k.jnl as they happen, allowing incomplete uploads to resume after a server crash; this journal is merged into ./hist/up2k.snap every \033[33mSEC\033[0m seconds")
     ap2.add_argument("--snap-drop", metavar="MIN", type=float, default=1440.0, help="forget unfinished uploads after \033[33mMIN\033[0m minutes; impossible to resume them after that (360=6h, 1440=24h)")
     ap2.add_argument("--u2ts", metavar="TXT", type=u, default="c", help="how to timestamp uploaded files; [\033[32mc\033[0m]=client-last-modified, [\033[32mu\033[0m]=upload-time, [\033[32mfc\033[0m]=force-c, [\033[32mfu\033[0m]=force-u (volflag=u2ts)")
     ap2.add_argument("--rand", action="store_true", help="force randomized filenames, \033[33m--nrand\033[0m chars long (volflag=rand)")
@@ -1036,10 +1041,17 @@ def add_network(ap):
         ap2.add_argument("--reuseaddr", action="store_true", help="set reuseaddr on listening sockets on windows; allows rapid restart of copyparty at the expense of being able to accidentally start multiple instances")
     else:
         ap2.add_argument("--freebind", action="store_true", help="allow listening on IPs which do not yet exist, for example if the network interfaces haven't finished going up. Only makes sense for IPs other than '0.0.0.0', '127.0.0.1', '::', and '::1'. May require running as root (unless net.ipv6.ip_nonlocal_bind)")
+        ap2.add_argument("--reuseport", action="store_true", help="linux-only: when multiprocessing (\033[33m-j\033[0m), give each process its own listening socket (SO_REUSEPORT) and let the kernel spread new connections between them, instead of all processes competing for the same socket. Makes it possible to accidentally start multiple instances on the same port")
     ap2.add_argument("--s-thead", metavar="SEC", type=int, default=120, help="socket timeout (read request header)")
     ap2.add_argument("--s-tbody", metavar="SEC", type=float, default=186.0, help="socket timeout (read/write request/response bodies). Use 60 on fast servers (default is extremely safe). Disable with 0 if reverse-proxied for a 2%% speed boost")
     ap2.add_argument("--s-rd-sz", metavar="B", type=int, default=256*1024, help="socket read size in bytes (indirectly affects filesystem writes; recommendation: keep equal-to or lower-than \033[33m--iobuf\033[0m)")
     ap2.add_argument("--s-wr-sz", metavar="B", type=int, default=256*1024, help="socket write size in bytes")
+    ap2.add_argument("--cmp-enc", metavar="LIST", type=u, default="zstd,br,gzip", help="compress dynamic responses (folder listings, search results, ...) using the first of these encodings which the client supports; zstd and br (brotli) are only used if the python module is installed; empty = disable")
+    ap2.add_argument("--cmp-min", metavar="B", type=int, default=4096, help="only compress dynamic responses larger than \033[33mB\033[0m bytes")
+    ap2.add_argument("--cmp-lv", metavar="LVL", type=int, default=3, help="compression level for dynamic responses; same number is used for all encodings (gzip 1-9, br 0-11, zstd 1-22)")
+    ap2.add_argument("--no-cmp", action="store_true", help="never compress dynamic responses (volflag=nocmp)")
+    ap2.add_argument("--s-wr-cmb", metavar="B", type=int, default=64*1024, help="send the response headers and body in one syscall if the body is smaller than \033[33mB\033[0m bytes; 0 = always separate")
+    ap2.add_argument("--max-ranges", metavar="N", type=int, default=16, help="max number of byte-ranges to serve (as multipart/byteranges) in one request; if a client asks for more, it gets the whole file instead. Set 1 to disable multirange")
     ap2.add_argument("--s-wr-slp", metavar="SEC", type=float, default=0.0, help="debug: socket write delay in seconds")
     ap2.add_argument("--rsp-slp", metavar="SEC", type=float, default=0.0, help="debug: response delay in seconds")
     ap2.add_argument("--rsp-jtr", metavar="SEC", type=float, default=0.0, help="debug: response delay, random duration 0..\033[33mSEC\033[0m")
@@ -1054,6 +1066,7 @@ def add_tls(ap, cert_path):
     ap2.add_argument("--ciphers", metavar="LIST", type=u, default="", help="set allowed ssl/tls ciphers; [\033[32mhelp\033[0m] shows available ciphers")
     ap2.add_argument("--ssl-dbg", action="store_true", help="dump some tls info")
     ap2.add_argument("--ssl-log", metavar="PATH", type=u, default="", help="log master secrets for later decryption in wireshark")
+    ap2.add_argument("--ssl-tickets", metavar="N", type=int, default=2, help="number of tls1.3 session tickets to issue after each full handshake, allowing clients to resume sessions instead of doing another full handshake; 0 = disable session tickets (the tls context is reused between connections, and reloaded if the \033[33m--cert\033[0m file is modified)")
 
 
 def add_cert(ap, cert_path):
@@ -1300,6 +1313,7 @@ def add_logging(ap):
     ap2.add_argument("--no-ansi", action="store_true", default=not VT100, help="disable colors; same as environment-variable NO_COLOR")
     ap2.add_argument("--ansi", action="store_true", help="force colors; overrides environment-variable NO_COLOR")
     ap2.add_argument("--no-logflush", action="store_true", help="don't flush the logfile after each write; tiny bit faster")
+    ap2.add_argument("--log-q", metavar="N", type=int, default=65536, help="log messages are written by a background thread; this is the max number of messages to keep in its queue, and any more will be dropped (and counted) until it catches up. Set 0 to write each message immediately from whichever thread logged it (slower, but nothing is ever dropped)")
     ap2.add_argument("--no-voldump", action="store_true", help="do not list volumes and permissions on startup")
     ap2.add_argument("--log-utc", action="store_true", help="do not use local timezone; assume the TZ env-var is UTC (tiny bit faster)")
     ap2.add_argument("--log-tdec", metavar="N", type=int, default=3, help="timestamp resolution / number of timestamp decimals")
@@ -1377,7 +1391,14 @@ def add_db_general(ap, hcores):
     ap2.add_argument("--dbd", metavar="PROFILE", default="wal", help="database durability profile; sets the tradeoff between robustness and speed, see \033[33m--help-dbd\033[0m (volflag=dbd)")
     ap2.add_argument("--xlink", action="store_true", help="on upload: check all volumes for dupes, not just the target volume (probably buggy, not recommended) (volflag=xlink)")
     ap2.add_argument("--hash-mt", metavar="CORES", type=int, default=hcores, help="num cpu cores to use for file hashing; set 0 or 1 for single-core hashing")
+    ap2.add_argument("--hash-rd-sz", metavar="B", type=int, default=12*1024*1024, help="read size in bytes for each of the \033[33m--hash-mt\033[0m threads; the reads run in parallel, so on NVMe or network filesystems with deep queues, smaller reads (\033[32m1048576\033[0m) may go faster")
+    ap2.add_argument("--idx-mt", metavar="N", type=int, default=hcores, help="when indexing a volume (\033[33m-e2ds\033[0m), read folders and hash files with this many threads in the background; set 1 to do everything on one thread, like the good old days, which may be faster on HDDs (volflag=idxmt)")
+    ap2.add_argument("--hashq-mt", metavar="N", type=int, default=hcores, help="num threads indexing files which were uploaded by anything other than up2k (ftp, smb, webdav, PUT, basic-uploader), if they were not already hashed during upload")
+    ap2.add_argument("--hashq-grp", metavar="T", type=u, default="vol", choices=["vol", "dev"], help="group those files by [\033[32mvol\033[0m]ume or by [\033[32mdev\033[0m]ice; each group gets its fair share of the \033[33m--hashq-mt\033[0m threads, and each thread commits its batch of files to the db in one go")
+    ap2.add_argument("--hashq-gmt", metavar="N", type=int, default=0, help="max number of \033[33m--hashq-mt\033[0m threads to use for each group at the same time; 0=unlimited, 1=good for HDDs when \033[33m--hashq-grp=dev\033[0m")
     ap2.add_argument("--re-maxage", metavar="SEC", type=int, default=0, help="rescan filesystem for changes every \033[33mSEC\033[0m seconds; 0=off (volflag=scan)")
+    ap2.add_argument("--inotify", action="store_true", help="watch the volumes for changes made outside of copyparty (linux-only), and reindex just the folders where something happened; much cheaper than \033[33m--re-maxage\033[0m on big volumes, and does a full rescan if the kernel drops events. Symlinked folders are not watched (volflag=inotify)")
+    ap2.add_argument("--inotify-cd", metavar="SEC", type=float, default=2.0, help="wait until there have been no changes for \033[33mSEC\033[0m seconds before reindexing, so a burst of changes is handled in one go; max wait is 10x that")
     ap2.add_argument("--db-act", metavar="SEC", type=float, default=10.0, help="defer any scheduled volume reindexing until \033[33mSEC\033[0m seconds after last db write (uploads, renames, ...)")
     ap2.add_argument("--srch-time", metavar="SEC", type=int, default=45, help="search deadline -- terminate searches running for more than \033[33mSEC\033[0m seconds")
     ap2.add_argument("--srch-hits", metavar="N", type=int, default=7999, help="max search results to allow clients to fetch; 125 results will be shown initially")
@@ -1469,6 +1490,8 @@ def add_debug(ap):
     ap2.add_argument("--no-scandir", action="store_true", help="kernel-bug workaround: disable scandir; do a listdir + stat on each file instead")
     ap2.add_argument("--no-fastboot", action="store_true", help="wait for initial filesystem indexing before accepting client requests")
     ap2.add_argument("--no-htp", action="store_true", help="disable httpserver threadpool, create threads as-needed instead")
+    ap2.add_argument("--no-res-cache", action="store_true", help="do not keep web-ui resources (.cpr/*.js, css, ...) in memory; read them from disk/zip for each request")
+    ap2.add_argument("--no-kap", action="store_true", help="disable keepalive-parking; idle keepalive connections will occupy a thread each, instead of waiting in epoll/kqueue")
     ap2.add_argument("--rm-sck", action="store_true", help="when listening on unix-sockets, do a basic delete+bind instead of the default atomic bind")
     ap2.add_argument("--srch-dbg", action="store_true", help="explain search processing, and do some extra expensive sanity checks")
     ap2.add_argument("--rclone-mdns", action="store_true", help="use mdns-domain instead of server-ip on /?hc")
@@ -33,6 +33,7 @@ from .util import (
     get_df,
     humansize,
     odfusion,
+    quotep,
     relchk,
     statdir,
     ub64enc,
@@ -1874,7 +1875,7 @@ class AuthSrv(object):
                 if k not in vol.flags:
                     vol.flags[k] = getattr(self.args, k)
 
-            for k in ("nrand", "u2abort"):
+            for k in ("idxmt", "nrand", "u2abort"):
                 if k in vol.flags:
                     vol.flags[k] = int(vol.flags[k])
 
@@ -1898,6 +1899,13 @@ class AuthSrv(object):
             if len(zs) == 3:  # fc5 => ffcc55
                 vol.flags["tcolor"] = "".join([x * 2 for x in zs])
 
+            if vol.flags.get("xaccel") is True:
+                # no prefix given; default to the volume's own url
+                zs = "/" + quotep(vol.vpath) if vol.vpath else ""
+                t = 'volume "/%s" has volflag xaccel without a location; will send X-Accel-Redirect to "%s/..." -- nginx must map that to an internal location'
+                self.log(t % (vol.vpath, zs), 3)
+                vol.flags["xaccel"] = zs
+
             if vol.flags.get("neversymlink"):
                 vol.flags["hardlinkonly"] = True  # was renamed
             if vol.flags.get("hardlinkonly"):
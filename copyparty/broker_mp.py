@@ -9,7 +9,7 @@ import queue
 
 from .__init__ import CORES, TYPE_CHECKING
 from .broker_mpw import MpWorker
-from .broker_util import ExceptionalQueue, NotExQueue, try_exec
+from .broker_util import ExceptionalQueue, IpcConn, NotExQueue, try_exec
 from .util import Daemon, mp
 
 if TYPE_CHECKING:
@@ -20,16 +20,7 @@ if True:  # pylint: disable=using-constant-test
 
 
 class MProcess(mp.Process):
-    def __init__(
-        self,
-        q_pend: queue.Queue[tuple[int, str, list[Any]]],
-        q_yield: queue.Queue[tuple[int, str, list[Any]]],
-        target: Any,
-        args: Any,
-    ) -> None:
-        super(MProcess, self).__init__(target=target, args=args)
-        self.q_pend = q_pend
-        self.q_yield = q_yield
+    ipc: IpcConn  # assigned after start(); not picklable
 
 
 class BrokerMp(object):
@@ -43,22 +34,31 @@ class BrokerMp(object):
         self.procs = []
         self.mutex = threading.Lock()
 
+        # calls from the workers run in a pool; replies go back out-of-order
+        self.ipc_q: queue.Queue[tuple[MProcess, int, str, list[Any], float]] = (
+            queue.Queue(self.args.ipc_thr * 4)
+        )
+        self.ipc_stats: dict[str, list[float]] = {}
+        for n in range(self.args.ipc_thr):
+            Daemon(self.ipc_worker, "mp-ipc-%d" % (n,))
+
         self.num_workers = self.args.j or CORES
         self.log("broker", "booting {} subprocesses".format(self.num_workers))
         for n in range(1, self.num_workers + 1):
-            q_pend: queue.Queue[tuple[int, str, list[Any]]] = mp.Queue(1)  # type: ignore
-            q_yield: queue.Queue[tuple[int, str, list[Any]]] = mp.Queue(64)  # type: ignore
-
-            proc = MProcess(q_pend, q_yield, MpWorker, (q_pend, q_yield, self.args, n))
+            # plain pipe; mp.Queue adds a feeder-thread hop in each direction
+            c_hub, c_wrk = mp.Pipe()
+            proc = MProcess(target=MpWorker, args=(c_wrk, self.args, n))
+            proc.start()
+            c_wrk.close()
+            proc.ipc = IpcConn(c_hub)
             Daemon(self.collector, "mp-sink-{}".format(n), (proc,))
             self.procs.append(proc)
-            proc.start()
 
     def shutdown(self) -> None:
         self.log("broker", "shutting down")
         for n, proc in enumerate(self.procs):
             name = "mp-shut-%d-%d" % (n, len(self.procs))
-            Daemon(proc.q_pend.put, name, ((0, "shutdown", []),))
+            Daemon(proc.ipc.put, name, ((0, "shutdown", []),))
 
         with self.mutex:
             procs = self.procs
@@ -74,39 +74,70 @@ class BrokerMp(object):
     def reload(self) -> None:
         self.log("broker", "reloading")
         for _, proc in enumerate(self.procs):
-            proc.q_pend.put((0, "reload", []))
+            proc.ipc.put((0, "reload", []))
 
     def reload_sessions(self) -> None:
         for _, proc in enumerate(self.procs):
-            proc.q_pend.put((0, "reload_sessions", []))
+            proc.ipc.put((0, "reload_sessions", []))
 
     def collector(self, proc: MProcess) -> None:
         """receive message from hub in other process"""
         while True:
-            msg = proc.q_yield.get()
-            retq_id, dest, args = msg
+            try:
+                msgs = proc.ipc.get()
+            except EOFError:
+                return
+
+            for retq_id, dest, args in msgs:
+                if dest == "log":
+                    self.log(*args)
 
-            if dest == "log":
-                self.log(*args)
+                elif dest == "retq":
+                    # response from previous ipc call
+                    raise Exception("invalid broker_mp usage")
 
-            elif dest == "retq":
-                # response from previous ipc call
-                raise Exception("invalid broker_mp usage")
+                elif not retq_id:
+                    # no reply wanted; run it here to keep them in order
+                    self.ipc_exec(proc, retq_id, dest, args, time.time())
 
-            else:
-                # new ipc invoking managed service in hub
-                try:
-                    obj = self.hub
-                    for node in dest.split("."):
-                        obj = getattr(obj, node)
+                else:
+                    # new ipc invoking managed service in hub
+                    self.ipc_q.put((proc, retq_id, dest, args, time.time()))
 
-                    # TODO will deadlock if dest performs another ipc
-                    rv = try_exec(retq_id, obj, *args)
-                except:
-                    rv = ["exception", "stack", traceback.format_exc()]
+    def ipc_worker(self) -> None:
+        while True:
+            self.ipc_exec(*self.ipc_q.get())
 
-                if retq_id:
-                    proc.q_pend.put((retq_id, "retq", rv))
+    def ipc_exec(
+        self, proc: MProcess, retq_id: int, dest: str, args: list[Any], t0: float
+    ) -> None:
+        try:
+            obj = self.hub
+            for node in dest.split("."):
+                obj = getattr(obj, node)
+
+            rv = try_exec(retq_id, obj, *args)
+        except:
+            rv = ["exception", "stack", traceback.format_exc()]
+
+        if retq_id:
+            proc.ipc.put((retq_id, "retq", rv))
+
+        td = time.time() - t0
+        with self.mutex:
+            try:
+                st = self.ipc_stats[dest]
+                st[0] += 1
+                st[1] += td
+                if td > st[2]:
+                    st[2] = td
+            except KeyError:
+                self.ipc_stats[dest] = [1, td, td]
+
+    def get_ipc_stats(self) -> dict[str, list[float]]:
+        """per-dest [num_calls, total_sec, max_sec], incl. time queued"""
+        with self.mutex:
+            return {k: v[:] for k, v in self.ipc_stats.items()}
 
     def ask(self, dest: str, *args: Any) -> Union[ExceptionalQueue, NotExQueue]:
 
@@ -129,11 +160,11 @@ class BrokerMp(object):
         """
         if dest == "listen":
             for p in self.procs:
-                p.q_pend.put((0, dest, [args[0], len(self.procs)]))
+                p.ipc.put((0, dest, [args[0], len(self.procs)]))
 
         elif dest == "set_netdevs":
             for p in self.procs:
-                p.q_pend.put((0, dest, list(args)))
+                p.ipc.put((0, dest, list(args)))
 
         elif dest == "cb_httpsrv_up":
             self.hub.cb_httpsrv_up()
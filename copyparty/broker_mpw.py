@@ -7,11 +7,9 @@ import signal
 import sys
 import threading
 
-import queue
-
 from .__init__ import ANYWIN
 from .authsrv import AuthSrv
-from .broker_util import BrokerCli, ExceptionalQueue, NotExQueue
+from .broker_util import BrokerCli, ExceptionalQueue, IpcConn, NotExQueue
 from .httpsrv import HttpSrv
 from .util import FAKE_MP, Daemon, HMaccas
 
@@ -20,21 +18,22 @@ if True:  # pylint: disable=using-constant-test
 
     from typing import Any, Optional, Union
 
+# can legitimately take longer than --ipc-tmo (deleting/moving big trees)
+IPC_NO_TMO = set(["up2k.handle_rm", "up2k.handle_mv"])
+
 
 class MpWorker(BrokerCli):
     """one single mp instance"""
 
     def __init__(
         self,
-        q_pend: queue.Queue[tuple[int, str, list[Any]]],
-        q_yield: queue.Queue[tuple[int, str, list[Any]]],
+        conn: Any,
         args: argparse.Namespace,
         n: int,
     ) -> None:
         super(MpWorker, self).__init__()
 
-        self.q_pend = q_pend
-        self.q_yield = q_yield
+        self.ipc = IpcConn(conn)
         self.args = args
         self.n = n
 
@@ -42,6 +41,7 @@ class MpWorker(BrokerCli):
 
         self.retpend: dict[int, Any] = {}
         self.retpend_mutex = threading.Lock()
+        self.retq_n = 0
         self.mutex = threading.Lock()
 
         # we inherited signal_handler from parent,
@@ -70,7 +70,7 @@ class MpWorker(BrokerCli):
         pass
 
     def _log_enabled(self, src: str, msg: str, c: Union[int, str] = 0) -> None:
-        self.q_yield.put((0, "log", [src, msg, c]))
+        self.ipc.put((0, "log", [src, msg, c]))
 
     def _log_disabled(self, src: str, msg: str, c: Union[int, str] = 0) -> None:
         pass
@@ -80,48 +80,69 @@ class MpWorker(BrokerCli):
 
     def main(self) -> None:
         while True:
-            retq_id, dest, args = self.q_pend.get()
-
-            # self.logw("work: [{}]".format(d[0]))
-            if dest == "shutdown":
-                self.httpsrv.shutdown()
-                self.logw("ok bye")
-                sys.exit(0)
-                return
-
-            elif dest == "reload":
-                self.logw("mpw.asrv reloading")
-                self.asrv.reload()
-                self.logw("mpw.asrv reloaded")
-
-            elif dest == "reload_sessions":
-                with self.asrv.mutex:
-                    self.asrv.load_sessions()
-
-            elif dest == "listen":
-                self.httpsrv.listen(args[0], args[1])
-
-            elif dest == "set_netdevs":
-                self.httpsrv.set_netdevs(args[0])
-
-            elif dest == "retq":
-                # response from previous ipc call
-                with self.retpend_mutex:
-                    retq = self.retpend.pop(retq_id)
-
+            try:
+                msgs = self.ipc.get()
+            except EOFError:
+                return  # hub is gone
+
+            for retq_id, dest, args in msgs:
+                self.handle(retq_id, dest, args)
+
+    def handle(self, retq_id: int, dest: str, args: list[Any]) -> None:
+        # self.logw("work: [{}]".format(dest))
+        if dest == "shutdown":
+            self.httpsrv.shutdown()
+            self.logw("ok bye")
+            sys.exit(0)
+            return
+
+        elif dest == "reload":
+            self.logw("mpw.asrv reloading")
+            self.asrv.reload()
+            self.httpsrv.reload()
+            self.logw("mpw.asrv reloaded")
+
+        elif dest == "reload_sessions":
+            with self.asrv.mutex:
+                self.asrv.load_sessions()
+
+        elif dest == "listen":
+            self.httpsrv.listen(args[0], args[1])
+
+        elif dest == "set_netdevs":
+            self.httpsrv.set_netdevs(args[0])
+
+        elif dest == "retq":
+            # response from previous ipc call; can arrive out-of-order
+            with self.retpend_mutex:
+                retq = self.retpend.pop(retq_id, None)
+
+            if retq:
                 retq.put(args)
-
             else:
-                raise Exception("what is " + str(dest))
+                self.logw("late ipc response %d" % (retq_id,), 3)
+
+        else:
+            raise Exception("what is " + str(dest))
 
     def ask(self, dest: str, *args: Any) -> Union[ExceptionalQueue, NotExQueue]:
         retq = ExceptionalQueue(1)
-        retq_id = id(retq)
+        retq.dest = dest
+        if dest not in IPC_NO_TMO:
+            retq.tmo = self.args.ipc_tmo or None
         with self.retpend_mutex:
+            # not id(retq); a timed-out id could be reused before its reply
+            self.retq_n += 1
+            retq_id = self.retq_n
             self.retpend[retq_id] = retq
 
-        self.q_yield.put((retq_id, dest, list(args)))
+        def forget() -> None:
+            with self.retpend_mutex:
+                self.retpend.pop(retq_id, None)
+
+        retq.on_tmo = forget
+        self.ipc.put((retq_id, dest, list(args)))
         return retq
 
     def say(self, dest: str, *args: Any) -> None:
-        self.q_yield.put((0, dest, list(args)))
+        self.ipc.put((0, dest, list(args)))
@@ -33,7 +33,7 @@ class BrokerThr(BrokerCli):
         # instantiate all services here (TODO: inheritance?)
         self.iphash = HMaccas(os.path.join(self.args.E.cfg, "iphash"), 8)
         self.httpsrv = HttpSrv(self, None)
-        self.reload = self.noop
+        self.reload = self.httpsrv.reload
         self.reload_sessions = self.noop
 
     def shutdown(self) -> None:
@@ -43,6 +43,9 @@ class BrokerThr(BrokerCli):
     def noop(self) -> None:
         pass
 
+    def get_ipc_stats(self) -> dict[str, list[float]]:
+        return {}
+
     def ask(self, dest: str, *args: Any) -> Union[ExceptionalQueue, NotExQueue]:
 
         # new ipc invoking managed service in hub
@@ -2,16 +2,17 @@
 from __future__ import print_function, unicode_literals
 
 import argparse
+import threading
 import traceback
 
-from queue import Queue
+from queue import Empty, Queue
 
 from .__init__ import TYPE_CHECKING
 from .authsrv import AuthSrv
 from .util import HMaccas, Pebkac
 
 if True:  # pylint: disable=using-constant-test
-    from typing import Any, Optional, Union
+    from typing import Any, Callable, Optional, Union
 
     from .util import RootLogger
 
@@ -20,8 +21,27 @@ if TYPE_CHECKING:
 
 
 class ExceptionalQueue(Queue, object):
+    # if set, get() gives up after tmo seconds waiting for dest,
+    # and calls on_tmo so the asker can forget about the reply
+    tmo: Optional[float] = None
+    dest = ""
+    on_tmo: Optional[Callable[[], None]] = None
+
     def get(self, block: bool = True, timeout: Optional[float] = None) -> Any:
-        rv = super(ExceptionalQueue, self).get(block, timeout)
+        if block and timeout is None:
+            timeout = self.tmo
+
+        try:
+            rv = super(ExceptionalQueue, self).get(block, timeout)
+        except Empty:
+            if not self.dest:
+                raise
+
+            if self.on_tmo:
+                self.on_tmo()
+
+            t = "no reply from [%s] within %s seconds" % (self.dest, timeout)
+            raise Pebkac(500, t)
 
         if isinstance(rv, list):
             if rv[0] == "exception":
@@ -45,6 +65,36 @@ class NotExQueue(object):
         return self.rv
 
 
+class IpcConn(object):
+    """
+    one end of a multiprocessing.Pipe between the hub and an MpWorker;
+    each frame is a list of messages, so concurrent senders get batched
+    """
+
+    def __init__(self, conn: Any) -> None:
+        self.conn = conn
+        self.mutex = threading.Lock()  # pend
+        self.tx_mutex = threading.Lock()  # conn
+        self.pend: list[tuple[int, str, list[Any]]] = []
+
+    def put(self, msg: tuple[int, str, list[Any]]) -> None:
+        with self.mutex:
+            self.pend.append(msg)
+
+        with self.tx_mutex:
+            with self.mutex:
+                pend = self.pend
+                self.pend = []
+
+            # empty if another thread already sent ours along with theirs
+            if pend:
+                self.conn.send(pend)
+
+    def get(self) -> list[tuple[int, str, list[Any]]]:
+        """not threadsafe; only one reader per end"""
+        return self.conn.recv()
+
+
 class BrokerCli(object):
     """
     helps mypy understand httpsrv.broker but still fails a few levels deeper,
@@ -14,6 +14,7 @@ def vf_bmap() -> dict[str, str]:
         "ed": "dots",
         "hardlink_only": "hardlinkonly",
         "no_clone": "noclone",
+        "no_cmp": "nocmp",
         "no_dirsz": "nodirsz",
         "no_dupe": "nodupe",
         "no_forget": "noforget",
@@ -39,6 +40,7 @@ def vf_bmap() -> dict[str, str]:
         "grid",
         "gsel",
         "hardlink",
+        "inotify",
         "magic",
         "no_sb_md",
         "no_sb_lg",
@@ -46,6 +48,8 @@ def vf_bmap() -> dict[str, str]:
         "og_no_head",
         "og_s_title",
         "rand",
+        "reflink",
+        "unpack",
         "xdev",
         "xlink",
         "xvol",
@@ -59,6 +63,7 @@ def vf_vmap() -> dict[str, str]:
     ret = {
         "no_hash": "nohash",
         "no_idx": "noidx",
+        "idx_mt": "idxmt",
         "re_maxage": "scan",
         "safe_dedup": "safededup",
         "th_convt": "convt",
@@ -135,12 +140,14 @@ flagcats = {
         "dedup": "enable symlink-based file deduplication",
         "hardlink": "enable hardlink-based file deduplication,\nwith fallback on symlinks when that is impossible",
         "hardlinkonly": "dedup with hardlink only, never symlink;\nmake a full copy if hardlink is impossible",
+        "reflink": "enable reflink-based (copy-on-write) file deduplication,\nwith fallback on hardlink/symlink when that is impossible",
         "safededup": "verify on-disk data before using it for dedup",
         "noclone": "take dupe data from clients, even if available on HDD",
         "nodupe": "rejects existing files (instead of linking/cloning them)",
         "sparse": "force use of sparse files, mainly for s3-backed storage",
         "daw": "enable full WebDAV write support (dangerous);\nPUT-operations will now \033[1;31mOVERWRITE\033[0;35m existing files",
         "nosub": "forces all uploads into the top folder of the vfs",
+        "unpack": "allow uploading tar/zip files to be extracted with ?unpack",
         "magic": "enables filetype detection for nameless uploads",
         "gz": "allows server-side gzip of uploads with ?gz (also c,xz)",
         "pk": "forces server-side compression, optional arg: xz,9",
@@ -177,9 +184,11 @@ flagcats = {
         "d2d": "disables all database stuff, overrides -e2*",
         "hist=/tmp/cdb": "puts thumbnails and indexes at that location",
         "scan=60": "scan for new files every 60sec, same as --re-maxage",
+        "inotify": "reindex folders when they change (linux-only)",
         "nohash=\\.iso$": "skips hashing file contents if path matches *.iso",
         "noidx=\\.iso$": "fully ignores the contents at paths matching *.iso",
         "noforget": "don't forget files when deleted from disk",
+        "idxmt=4": "index the volume with 4 threads (1 for HDDs)",
         "fat32": "avoid excessive reindexing on android sdcardfs",
         "dbd=[acid|swal|wal|yolo]": "database speed-durability tradeoff",
         "xlink": "cross-volume dupe detection / linking (dangerous)",
@@ -233,6 +242,7 @@ flagcats = {
         "md_sbf": "list of markdown-sandbox safeguards to disable",
         "lg_sbf": "list of *logue-sandbox safeguards to disable",
         "nohtml": "return html and markdown as text/html",
+        "nocmp": "never compress listings/search-results (gzip/br/zstd)",
     },
     "others": {
         "dots": "allow all users with read-access to\nenable the option to show dotfiles in listings",
@@ -242,6 +252,8 @@ flagcats = {
         "rm_retry": "ms-windows: timeout for deleting busy files",
         "davauth": "ask webdav clients to login for all folders",
         "davrt": "show lastmod time of symlink destination, not the link itself\n(note: this option is always enabled for recursive listings)",
+        "xaccel=/int/v1": "let the reverse-proxy (nginx) send file downloads;\nreply with X-Accel-Redirect to /int/v1/ + path in volume\n(needs --rproxy; make that an internal location)",
+        "xsendfile": "let the reverse-proxy (apache/lighttpd) send file downloads;\nreply with X-Sendfile and the abspath of the file\n(needs --rproxy; optional value replaces the volume's path)",
     },
 }
 
@@ -18,6 +18,7 @@ from pyftpdlib.servers import FTPServer
 from .__init__ import PY2, TYPE_CHECKING
 from .authsrv import VFS
 from .bos import bos
+from .up2k import ChunkHasher
 from .util import (
     VF_CAREFUL,
     Daemon,
@@ -128,6 +129,25 @@ class FtpAuth(DummyAuthorizer):
         return "cya"
 
 
+class HashFile(object):
+    """file wrapper which up2k-hashes everything written to it"""
+
+    def __init__(self, f: typing.BinaryIO, u2h: ChunkHasher) -> None:
+        self.f = f
+        self.u2h = u2h
+
+    def write(self, buf: bytes) -> int:
+        self.u2h.update(buf)
+        return self.f.write(buf)
+
+    def seek(self, *a: Any) -> int:
+        self.u2h.ok = False  # resumed upload (REST)
+        return self.f.seek(*a)
+
+    def __getattr__(self, k: str) -> Any:
+        return getattr(self.f, k)
+
+
 class FtpFs(AbstractedFS):
     def __init__(
         self, root: str, cmd_channel: Any
@@ -218,7 +238,7 @@ class FtpFs(AbstractedFS):
         r = "r" in mode
         w = "w" in mode or "a" in mode or "+" in mode
 
-        ap = self.rv2a(filename, r, w)[0]
+        ap, vfs, _ = self.rv2a(filename, r, w)
         self.validpath(ap)
         if w:
             try:
@@ -250,7 +270,13 @@ class FtpFs(AbstractedFS):
 
             wunlink(self.log, ap, VF_CAREFUL)
 
-        return open(fsenc(ap), mode, self.args.iobuf)
+        ret = open(fsenc(ap), mode, self.args.iobuf)
+        if mode == "wb" and "e2d" in vfs.flags:
+            u2h = ChunkHasher(self.h.allo)
+            self.h.u2h_map[ap] = u2h
+            return HashFile(ret, u2h)  # type: ignore
+
+        return ret
 
     def chdir(self, path: str) -> None:
         nwd = join(self.cwd, path)
@@ -464,6 +490,12 @@ class FtpHandler(FTPHandler):
         # abspath->vpath mapping to resolve log_transfer paths
         self.vfs_map: dict[str, str] = {}
 
+        # abspath->hasher for files being uploaded
+        self.u2h_map: dict[str, ChunkHasher] = {}
+
+        # filesize from ALLO, for the next STOR
+        self.allo = -1
+
         # reduce non-debug logging
         self.log_cmds_list = [x for x in self.log_cmds_list if x not in ("CWD", "XCWD")]
 
@@ -493,10 +525,22 @@ class FtpHandler(FTPHandler):
             raise FSE("Upload blocked by xbu server config")
 
         # print("ftp_STOR: {} {} => {}".format(vp, mode, ap))
-        ret = FTPHandler.ftp_STOR(self, file, mode)
+        try:
+            ret = FTPHandler.ftp_STOR(self, file, mode)
+        finally:
+            self.allo = -1
         # print("ftp_STOR: {} {} OK".format(vp, mode))
         return ret
 
+    def ftp_ALLO(self, line: str) -> Any:
+        # "ALLO 1234" or "ALLO 1234 R 512"; remember the size as a hint
+        try:
+            self.allo = int(line.split()[0])
+        except:
+            self.allo = -1
+
+        return FTPHandler.ftp_ALLO(self, line)
+
     def log_transfer(
         self,
         cmd: str,
@@ -509,8 +553,16 @@ class FtpHandler(FTPHandler):
         # None
         ap = filename.decode("utf-8", "replace")
         vp = self.vfs_map.pop(ap, None)
+        u2h = self.u2h_map.pop(ap, None)
         # print("xfer_end: {} => {}".format(ap, vp))
         if vp:
+            hashes = None
+            if u2h and completed:
+                try:
+                    hashes = u2h.finish(bos.path.getsize(ap))
+                except:
+                    pass
+
             vp, fn = os.path.split(vp)
             vfs, rem = self.hub.asrv.vfs.get(vp, self.uname, False, True)
             vfs, rem = vfs.get_dbv(rem)
@@ -523,6 +575,8 @@ class FtpHandler(FTPHandler):
                 self.cli_ip,
                 time.time(),
                 self.uname,
+                False,
+                hashes,
             )
 
         return FTPHandler.log_transfer(
@@ -40,17 +40,21 @@ from .star import StreamTar
 from .stolen.qrcodegen import QrCode, qr2svg
 from .sutil import StreamArc, gfilter
 from .szip import StreamZip
-from .up2k import up2k_chunksize
+from .unarc import BodyReader, unarc
+from .up2k import ChunkHasher, up2k_chunksize
 from .util import unquote  # type: ignore
 from .util import (
     APPLESAN_RE,
     BITNESS,
     DAV_ALLPROPS,
+    HAVE_PWRITE,
     HAVE_SQLITE3,
     HTTPCODE,
+    RE_CMP_NO,
     META_NOBOTS,
     UTC,
     Garda,
+    HashPw,
     MultipartParser,
     ODict,
     Pebkac,
@@ -60,6 +64,9 @@ from .util import (
     alltrace,
     atomic_move,
     b64dec,
+    clone_range,
+    cmp_buf,
+    cmp_pick,
     exclude_dotfiles,
     formatdate,
     fsenc,
@@ -131,6 +138,12 @@ LOGUES = [[0, ".prologue.html"], [1, ".epilogue.html"]]
 
 READMES = [[0, ["preadme.md", "PREADME.md"]], [1, ["readme.md", "README.md"]]]
 
+U2HS_KEYS = ("name", "size", "lmod", "hash")
+
+# max handshakes / chunk-hashes in one batch; same as u2c (--hsb)
+U2HS_MAXB = 256
+U2HS_MAXC = 4096
+
 
 class HttpCli(object):
     """
@@ -163,6 +176,7 @@ class HttpCli(object):
         self.keepalive = False
         self.is_https = False
         self.is_vproxied = False
+        self.is_rproxied = False
         self.in_hdr_recv = True
         self.headers: dict[str, str] = {}
         self.mode = " "
@@ -371,6 +385,7 @@ class HttpCli(object):
                 else:
                     self.ip = cli_ip
                     self.is_vproxied = bool(self.args.R)
+                    self.is_rproxied = True
                     self.log_src = self.conn.set_rproxy(self.ip)
                     self.host = self.headers.get("x-forwarded-host") or self.host
                     trusted_xff = True
@@ -826,8 +841,15 @@ class HttpCli(object):
         status: int = 200,
         mime: Optional[str] = None,
         headers: Optional[dict[str, str]] = None,
+        hblock: str = "",
+        body: bytes = b"",
     ) -> None:
-        response = ["%s %s %s" % (self.http_ver, status, HTTPCODE[status])]
+        """
+        hblock: prevalidated header lines to append;
+        body: sent in the same syscall as the headers
+        """
+        status_line = "%s %s %s" % (self.http_ver, status, HTTPCODE[status])
+        response = [status_line]
 
         if length is not None:
             response.append("Content-Length: " + unicode(length))
@@ -849,21 +871,32 @@ class HttpCli(object):
 
         self.out_headers["Content-Type"] = mime
 
+        hdrs = [status_line]
         for k, zs in list(self.out_headers.items()) + self.out_headerlist:
-            response.append("%s: %s" % (k, zs))
-
-        for zs in response:
-            m = self.conn.hsrv.ptn_cc.search(zs)
-            if m:
-                hit = zs[m.span()[0] :]
-                t = "malicious user; Cc in out-hdr {!r} => [{!r}]"
-                self.log(t.format(zs, hit), 1)
-                self.cbonk(self.conn.hsrv.gmal, zs, "cc_hdr", "Cc in out-hdr")
-                raise Pebkac(999)
+            hdrs.append("%s: %s" % (k, zs))
+
+        # one scan of everything that may contain client-provided text;
+        # only look for the offending line when there is a hit
+        ptn_cc = self.conn.hsrv.ptn_cc
+        if ptn_cc.search("".join(hdrs)):
+            for zs in hdrs:
+                m = ptn_cc.search(zs)
+                if m:
+                    hit = zs[m.span()[0] :]
+                    t = "malicious user; Cc in out-hdr {!r} => [{!r}]"
+                    self.log(t.format(zs, hit), 1)
+                    self.cbonk(self.conn.hsrv.gmal, zs, "cc_hdr", "Cc in out-hdr")
+                    raise Pebkac(999)
+
+        response += hdrs[1:]
+
+        if hblock:
+            response.append(hblock)
 
         response.append("\r\n")
+        zb = "\r\n".join(response).encode("utf-8")
         try:
-            self.s.sendall("\r\n".join(response).encode("utf-8"))
+            self.s.sendall(zb + body if body else zb)
         except:
             raise Pebkac(400, "client d/c while replying headers")
 
@@ -874,6 +907,7 @@ class HttpCli(object):
         mime: Optional[str] = None,
         headers: Optional[dict[str, str]] = None,
         volsan: bool = False,
+        cmp: bool = False,
     ) -> bytes:
         if (
             status > 400
@@ -918,16 +952,41 @@ class HttpCli(object):
             except:
                 pass
 
+        if cmp and len(body) >= self.args.cmp_min and self.args.cmp_enc:
+            body = self.cmp_body(body, mime)
+
+        if self.mode == "HEAD":
+            self.send_headers(len(body), status, mime, headers)
+            return body
+
+        if len(body) < self.args.s_wr_cmb:
+            # small enough to send in the same syscall as the headers
+            self.send_headers(len(body), status, mime, headers, body=body)
+            return body
+
         self.send_headers(len(body), status, mime, headers)
 
         try:
-            if self.mode != "HEAD":
-                self.s.sendall(body)
+            self.s.sendall(body)
         except:
             raise Pebkac(400, "client d/c while replying body")
 
         return body
 
+    def cmp_body(self, body: bytes, mime: Optional[str]) -> bytes:
+        """compress a dynamic response if the client and volume allow it"""
+        if "nocmp" in self.vn.flags or RE_CMP_NO.search(mime or ""):
+            return body
+
+        self.out_headers["Vary"] += ", Accept-Encoding"
+        ae = self.headers.get("accept-encoding")
+        enc = cmp_pick(ae, self.args.cmp_enc) if ae else ""
+        if not enc:
+            return body
+
+        self.out_headers["Content-Encoding"] = enc
+        return cmp_buf(enc, body, self.args.cmp_lv)
+
     def loud_reply(self, body: str, *args: Any, **kwargs: Any) -> None:
         if not kwargs.get("mime"):
             kwargs["mime"] = "text/plain; charset=utf-8"
@@ -1111,6 +1170,17 @@ class HttpCli(object):
                 return self.conn.hsrv.metrics.tx(self)
 
             res_path = "web/" + self.vpath[5:]
+            if (
+                res_path in RES
+                and not self.args.no_res_cache
+                and "range" not in self.headers
+                and "txt" not in self.uparam
+                and "mime" not in self.uparam
+            ):
+                ent = self.conn.hsrv.get_res(res_path)
+                if ent:
+                    return self.tx_res_c(ent)
+
             if res_path in RES:
                 ap = os.path.join(self.E.mod, res_path)
                 if bos.path.exists(ap) or bos.path.exists(ap + ".gz"):
@@ -1602,6 +1672,9 @@ class HttpCli(object):
             except:
                 raise Pebkac(400, "client d/c before 100 continue")
 
+        if "unpack" in self.uparam:
+            return self.handle_unpack(True)
+
         return self.handle_stash(True)
 
     def handle_post(self) -> bool:
@@ -1613,6 +1686,9 @@ class HttpCli(object):
             except:
                 raise Pebkac(400, "client d/c before 100 continue")
 
+        if "unpack" in self.uparam:
+            return self.handle_unpack(False)
+
         if "raw" in self.uparam:
             return self.handle_stash(False)
 
@@ -1713,7 +1789,9 @@ class HttpCli(object):
 
         return enc or "utf-8"
 
-    def get_body_reader(self) -> tuple[Generator[bytes, None, None], int]:
+    def get_body_reader(
+        self,
+    ) -> tuple[Generator[Union[bytes, memoryview], None, None], int]:
         bufsz = self.args.s_rd_sz
         if "chunked" in self.headers.get("transfer-encoding", "").lower():
             return read_socket_chunked(self.sr, bufsz), -1
@@ -1881,10 +1959,17 @@ class HttpCli(object):
                 # small toctou, but better than clobbering a hardlink
                 wunlink(self.log, path, vfs.flags)
 
+        # up2k-hash it while writing, unless it gets compressed
+        u2h = None
+        if "e2d" in vfs.flags and open_ka["fun"] is open and not self.args.nw:
+            u2h = ChunkHasher(remains)
+
         f, fn = ren_open(fn, *open_a, **params)
         try:
             path = os.path.join(fdir, fn)
-            post_sz, sha_hex, sha_b64 = hashcopy(reader, f, self.args.s_wr_slp)
+            post_sz, sha_hex, sha_b64 = hashcopy(
+                reader, f, self.args.s_wr_slp, u2h=u2h
+            )
         finally:
             f.close()
 
@@ -1973,6 +2058,9 @@ class HttpCli(object):
         else:
             sz = post_sz
 
+        # xau may have modified the file; then it must be reread
+        hashes = u2h.finish(sz) if u2h and not xau else None
+
         vfs, rem = vfs.get_dbv(rem)
         self.conn.hsrv.broker.say(
             "up2k.hash_file",
@@ -1985,6 +2073,7 @@ class HttpCli(object):
             at,
             self.uname,
             True,
+            hashes,
         )
 
         vsuf = ""
@@ -2035,6 +2124,119 @@ class HttpCli(object):
         self.reply(t.encode("utf-8"), 201, headers=h)
         return True
 
+    def handle_unpack(self, is_put: bool) -> bool:
+        reader, remains = self.get_body_reader()
+        vfs, rem = self.asrv.vfs.get(self.vpath, self.uname, False, True)
+        self._assert_safe_rem(rem)
+        if "unpack" not in vfs.flags:
+            raise Pebkac(403, "archive extraction is not enabled in this volume")
+
+        nullwrite = self.args.nw
+        uflags = self.upload_flags(vfs)
+        fdir_base = vfs.canonical(rem)
+        if rem and not self.trailing_slash and not bos.path.isdir(fdir_base):
+            # PUT/POST to a filename (the archive's); extract next to it
+            rem, _ = vsplit(rem)
+            fdir_base = vfs.canonical(rem)
+
+        lim = vfs.get_dbv(rem)[0].lim
+        if lim:
+            fdir_base, rem = lim.all(
+                self.ip, rem, -1, vfs.realpath, fdir_base, self.conn.hsrv.broker
+            )
+
+        upload_vpath = vjoin(vfs.vpath, rem)
+        if not nullwrite:
+            bos.makedirs(fdir_base)
+
+        self.log("unpacking %d bytes into %s" % (remains, fdir_base))
+        nfiles = ndirs = nbytes = 0
+        skipped: list[str] = []
+        dip = self.dip()
+        breader = BodyReader(reader)
+        try:
+            for ap, lastmod, fgen in unarc(self.log, breader):
+                zsl = ap.replace("\\", "/").split("/")
+                zsl = [sanitize_fn(x, "") for x in zsl if x not in ("", ".")]
+                zsl = [x for x in zsl if x]
+                if not zsl:
+                    continue
+
+                if ".." in zsl or zsl[0] == ".hist":
+                    self.log("unpack: skipping %r" % (ap,), 3)
+                    skipped.append(ap)
+                    continue
+
+                if fgen is None:
+                    erem = vjoin(rem, "/".join(zsl))
+                    self._assert_safe_rem(erem)
+                    if lim:
+                        lim.chk_rem(erem)
+                    if not nullwrite:
+                        bos.makedirs(os.path.join(fdir_base, *zsl))
+                    ndirs += 1
+                    continue
+
+                fname = zsl.pop()
+                erem = vjoin(rem, "/".join(zsl))
+                self._assert_safe_rem(erem)
+                if lim:
+                    lim.chk_rem(erem)
+
+                if nullwrite:
+                    nbytes += sum(len(x) for x in fgen)
+                    nfiles += 1
+                    continue
+
+                fdir = os.path.join(fdir_base, *zsl)
+                vdir = vjoin(upload_vpath, "/".join(zsl))
+                suffix = "-%.6f-%s" % (time.time(), dip)
+                sz = self._upload_file(
+                    vfs,
+                    erem,
+                    fdir,
+                    vdir,
+                    fname,
+                    fgen,
+                    "unpack",
+                    uflags,
+                    suffix,
+                    lastmod=lastmod,
+                    allow_empty=True,
+                    rm_partial=True,
+                )[0]
+                nfiles += 1
+                nbytes += sz
+
+        except:
+            # the rest of the body is still in the socket
+            self.keepalive = False
+            if nfiles:
+                t = "unpack aborted after %d files (%d bytes) were extracted"
+                self.log(t % (nfiles, nbytes), 3)
+            raise
+
+        spd = self._spd(breader.nbyte)
+        t = "%s unpacked %d bytes into %d files, %d folders, %d skipped"
+        self.log(t % (spd, breader.nbyte, nfiles, ndirs, len(skipped)))
+
+        jmsg = {
+            "files": nfiles,
+            "dirs": ndirs,
+            "bytes": nbytes,
+            "skipped": skipped,
+        }
+        if "j" in self.uparam:
+            jtxt = json.dumps(jmsg, indent=2, sort_keys=True).encode("utf-8", "replace")
+            self.reply(jtxt, mime="application/json", status=201)
+        else:
+            t = "extracted %d files (%d bytes) and %d folders into /%s\n"
+            t = t % (nfiles, nbytes, ndirs, upload_vpath)
+            t += "".join("skipped %s\n" % (x,) for x in skipped)
+            self.reply(t.encode("utf-8", "replace"), 201)
+
+        return True
+
     def bakflip(
         self,
         f: typing.BinaryIO,
@@ -2185,8 +2387,11 @@ class HttpCli(object):
         try:
             body = json.loads(json_buf.decode(enc, "replace"))
             try:
-                zds = {k: v for k, v in body.items()}
-                zds["hash"] = "%d chunks" % (len(body["hash"]))
+                if isinstance(body, list):
+                    zds = "[%d handshakes]" % (len(body),)
+                else:
+                    zds = {k: v for k, v in body.items()}
+                    zds["hash"] = "%d chunks" % (len(body["hash"]))
             except:
                 zds = body
             t = "POST len=%d type=%s ip=%s user=%s req=%r json=%s"
@@ -2197,6 +2402,9 @@ class HttpCli(object):
         # self.reply(b"cloudflare", 503)
         # return True
 
+        if isinstance(body, list):
+            return self.handle_u2hs_batch(body)
+
         if "srch" in self.uparam or "srch" in body:
             return self.handle_search(body)
 
@@ -2206,23 +2414,81 @@ class HttpCli(object):
         if "delete" in self.uparam:
             return self.handle_rm(body)
 
-        name = undot(body["name"])
-        if "/" in name:
-            raise Pebkac(400, "your client is old; press CTRL-SHIFT-R and try again")
+        dbv, vrem = self._u2hs_dst()
+        self._u2hs_prep(body, dbv, vrem)
 
-        vfs, rem = self.asrv.vfs.get(self.vpath, self.uname, False, True)
-        dbv, vrem = vfs.get_dbv(rem)
+        # not to protect u2fh, but to prevent handshakes while files are closing
+        with self.u2mutex:
+            x = self.conn.hsrv.broker.ask("up2k.handle_json", body, self.u2fh.aps)
+            ret = x.get()
 
-        body["vtop"] = dbv.vpath
-        body["ptop"] = dbv.realpath
-        body["prel"] = vrem
-        body["host"] = self.host
-        body["user"] = self.uname
-        body["addr"] = self.ip
-        body["vcfg"] = dbv.flags
+        if self.is_vproxied:
+            if "purl" in ret:
+                ret["purl"] = self.args.SR + ret["purl"]
 
-        if not self.can_delete:
-            body.pop("replace", None)
+        ret = json.dumps(ret)
+        self.log(ret)
+        self.reply(ret.encode("utf-8"), mime="application/json")
+        return True
+
+    def handle_u2hs_batch(self, bodies: list[Any]) -> bool:
+        """
+        up2k handshakes for many files into the same folder in one
+        request; replies with a list of handshake responses in the same
+        order, with {"error": msg, "status": code} for each that failed
+        """
+        if len(bodies) > U2HS_MAXB:
+            t = "too many handshakes in one batch; max %d"
+            raise Pebkac(400, t % (U2HS_MAXB,))
+
+        ncids = 0
+        for body in bodies:
+            if isinstance(body, dict) and isinstance(body.get("hash"), list):
+                ncids += len(body["hash"])
+        if ncids > U2HS_MAXC and len(bodies) > 1:
+            t = "too many chunks in one batch of handshakes; max %d"
+            raise Pebkac(400, t % (U2HS_MAXC,))
+
+        dbv, vrem = self._u2hs_dst()
+
+        rets: list[Any] = [None] * len(bodies)
+        todo = []
+        for n, body in enumerate(bodies):
+            try:
+                if not isinstance(body, dict) or "srch" in body:
+                    raise Pebkac(400, "batch handshakes cannot do file-search")
+                zs = ", ".join(k for k in U2HS_KEYS if k not in body)
+                if zs:
+                    raise Pebkac(400, "handshake is missing " + zs)
+                self._u2hs_prep(body, dbv, vrem)
+                todo.append(n)
+            except Pebkac as ex:
+                rets[n] = {"error": str(ex), "status": ex.code}
+
+        if todo:
+            broker = self.conn.hsrv.broker
+            zl = [bodies[n] for n in todo]
+            with self.u2mutex:
+                x = broker.ask("up2k.handle_json_batch", zl, self.u2fh.aps)
+                for n, ret in zip(todo, x.get()):
+                    rets[n] = ret
+
+        nok = 0
+        for ret in rets:
+            if "error" in ret:
+                continue
+            nok += 1
+            if self.is_vproxied and "purl" in ret:
+                ret["purl"] = self.args.SR + ret["purl"]
+
+        self.log("batch handshake: %d ok, %d failed" % (nok, len(rets) - nok))
+        ret = json.dumps(rets)
+        self.reply(ret.encode("utf-8"), mime="application/json")
+        return True
+
+    def _u2hs_dst(self) -> tuple[VFS, str]:
+        """handshake target folder; checks write-access and creates it"""
+        vfs, rem = self.asrv.vfs.get(self.vpath, self.uname, False, True)
 
         if rem:
             dst = vfs.canonical(rem)
@@ -2242,19 +2508,23 @@ class HttpCli(object):
             except:
                 raise Pebkac(500, min_ex())
 
-        # not to protect u2fh, but to prevent handshakes while files are closing
-        with self.u2mutex:
-            x = self.conn.hsrv.broker.ask("up2k.handle_json", body, self.u2fh.aps)
-            ret = x.get()
+        return vfs.get_dbv(rem)
 
-        if self.is_vproxied:
-            if "purl" in ret:
-                ret["purl"] = self.args.SR + ret["purl"]
+    def _u2hs_prep(self, body: dict[str, Any], dbv: VFS, vrem: str) -> None:
+        name = undot(body["name"])
+        if "/" in name:
+            raise Pebkac(400, "your client is old; press CTRL-SHIFT-R and try again")
 
-        ret = json.dumps(ret)
-        self.log(ret)
-        self.reply(ret.encode("utf-8"), mime="application/json")
-        return True
+        body["vtop"] = dbv.vpath
+        body["ptop"] = dbv.realpath
+        body["prel"] = vrem
+        body["host"] = self.host
+        body["user"] = self.uname
+        body["addr"] = self.ip
+        body["vcfg"] = dbv.flags
+
+        if not self.can_delete:
+            body.pop("replace", None)
 
     def handle_search(self, body: dict[str, Any]) -> bool:
         idx = self.conn.get_u2idx()
@@ -2317,7 +2587,7 @@ class HttpCli(object):
 
         rj = {"hits": hits, "tag_order": order, "trunc": trunc}
         r = json.dumps(rj).encode("utf-8")
-        self.reply(r, mime="application/json")
+        self.reply(r, mime="application/json", cmp=True)
         return True
 
     def handle_post_binary(self) -> bool:
@@ -2378,15 +2648,24 @@ class HttpCli(object):
                     except:
                         pass
 
-            f = f or open(fsenc(path), "rb+", self.args.iobuf)
+            # pipelined: receive into one buffer while the previous one
+            # is hashed+written by the conn's helper thread; fd is unbuffered
+            # so the seek/read/write below (clone, bakflip) stay in sync
+            pw = HAVE_PWRITE and not self.args.no_u2pipe and path != os.devnull
+            f = f or open(fsenc(path), "rb+", 0 if pw else self.args.iobuf)
 
             try:
                 for chash, cstart in zip(chashes, cstarts):
-                    f.seek(cstart[0])
-                    reader = read_socket(
-                        self.sr, self.args.s_rd_sz, min(remains, chunksize)
-                    )
-                    post_sz, _, sha_b64 = hashcopy(reader, f, self.args.s_wr_slp)
+                    zi = min(remains, chunksize)
+                    if pw:
+                        hpw = self.conn.hpw = self.conn.hpw or HashPw()
+                        post_sz, _, sha_b64 = hpw.copy(
+                            self.sr, zi, f.fileno(), cstart[0], self.args.s_wr_slp
+                        )
+                    else:
+                        reader = read_socket(self.sr, self.args.s_rd_sz, zi)
+                        f.seek(cstart[0])
+                        post_sz, _, sha_b64 = hashcopy(reader, f, self.args.s_wr_slp)
 
                     if sha_b64 != chash:
                         try:
@@ -2404,7 +2683,15 @@ class HttpCli(object):
                     if len(cstart) > 1 and path != os.devnull:
                         t = " & ".join(unicode(x) for x in cstart[1:])
                         self.log("clone %s to %s" % (cstart[0], t))
-                        ofs = 0
+                        zs = ""
+                        if "reflink" in vfs.flags:
+                            f.flush()
+                            for wofs in cstart[1:]:
+                                zs = clone_range(f.fileno(), cstart[0], wofs, post_sz)
+                                if not zs:
+                                    break
+
+                        ofs = chunksize if zs else 0
                         while ofs < chunksize:
                             bufsz = max(4 * 1024 * 1024, self.args.iobuf)
                             bufsz = min(chunksize - ofs, bufsz)
@@ -2416,7 +2703,7 @@ class HttpCli(object):
 
                             ofs += len(buf)
 
-                        self.log("clone {} done".format(cstart[0]))
+                        self.log("clone %s done %s" % (cstart[0], zs))
 
                     # be quick to keep the tcp winsize scale;
                     # if we can't confirm rn then that's fine
@@ -2675,6 +2962,225 @@ class HttpCli(object):
             vfs.flags.get("xau") or [],
         )
 
+    def _upload_file(
+        self,
+        vfs: VFS,
+        rem: str,
+        fdir: str,
+        vdir: str,
+        fname: str,
+        gen: Iterable[bytes],
+        hook: str,
+        uflags: tuple[int, bool, int, list[str], list[str]],
+        suffix: str,
+        lastmod: float = 0,
+        discard: bool = False,
+        allow_empty: bool = False,
+        rm_partial: bool = False,
+        szmax: int = -1,
+    ) -> tuple[int, str, str, str, str, str]:
+        """
+        write one file from a basic upload (bup, unpack) into fdir;
+        xbu, reserve filename, write, check limits, move into place,
+        xau, and tell up2k about it; returns
+        (sz, sha_hex, sha_b64, fname, abspath, vpath)
+
+        szmax: upper bound of the filesize, for the up2k hasher
+        """
+        rnd, _, lifetime, xbu, xau = uflags
+        lim = vfs.get_dbv(rem)[0].lim
+        if discard:
+            fname = os.devnull
+            fdir = abspath = ""
+        else:
+            # same order as bup always had; ?replace and the
+            # xbu hook get the abspath from before rand
+            abspath = os.path.join(fdir, fname)
+            if rnd:
+                fname = rand_name(fdir, fname, rnd)
+
+            if "replace" in self.uparam:
+                if not self.can_delete:
+                    self.log("user not allowed to overwrite with ?replace")
+                elif bos.path.exists(abspath):
+                    try:
+                        wunlink(self.log, abspath, vfs.flags)
+                        t = "overwriting file with new upload: %s"
+                    except:
+                        t = "toctou while deleting for ?replace: %s"
+                    self.log(t % (abspath,))
+
+        if xbu:
+            at = time.time() - lifetime
+            hr = runhook(
+                self.log,
+                self.conn.hsrv.broker,
+                None,
+                "xbu.http." + hook,
+                xbu,
+                abspath,
+                vjoin(vdir, fname),
+                self.host,
+                self.uname,
+                self.asrv.vfs.get_perms(vdir, self.uname),
+                lastmod or at,
+                0,
+                self.ip,
+                at,
+                "",
+            )
+            if not hr:
+                t = "upload blocked by xbu server config"
+                self.log(t, 1)
+                raise Pebkac(403, t)
+            if hr.get("reloc"):
+                zs = vjoin(vdir, fname)
+                x = pathmod(self.asrv.vfs, abspath, zs, hr["reloc"])
+                if x:
+                    if self.args.hook_v:
+                        log_reloc(
+                            self.log, hr["reloc"], x, abspath, zs, fname, vfs, rem
+                        )
+                    fdir, vdir, fname, (vfs, rem) = x
+                    abspath = os.path.join(fdir, fname)
+                    if discard:
+                        fdir = abspath = ""
+
+        if discard:
+            open_args: dict[str, Any] = {}
+            tnam = fname = os.devnull
+        else:
+            bos.makedirs(fdir)
+
+            # reserve destination filename
+            f, fname = ren_open(fname, "wb", fdir=fdir, suffix=suffix)
+            f.close()
+            abspath = os.path.join(fdir, fname)
+
+            tnam = fname + ".PARTIAL"
+            if self.args.dotpart:
+                tnam = "." + tnam
+
+            open_args = {"fdir": fdir, "suffix": suffix}
+
+        max_sz = 0
+        if lim:
+            lim.chk_bup(self.ip)
+            lim.chk_nup(self.ip)
+            v1 = lim.smax
+            v2 = lim.dfv - lim.dfl
+            max_sz = min(v1, v2) if v1 and v2 else v1 or v2
+
+        u2h = None
+        if "e2d" in vfs.flags and not discard:
+            u2h = ChunkHasher(szmax, True)
+
+        f, tnam = ren_open(tnam, "wb", self.args.iobuf, **open_args)
+        tabspath = os.path.join(fdir, tnam)
+        try:
+            try:
+                self.log("writing to {}".format(tabspath))
+                sz, sha_hex, sha_b64 = hashcopy(gen, f, self.args.s_wr_slp, max_sz, u2h)
+                if not sz and not allow_empty:
+                    rm_partial = True  # nothing worth keeping
+                    raise Pebkac(400, "empty files in post")
+            finally:
+                f.close()
+
+            if lim:
+                lim.nup(self.ip)
+                lim.bup(self.ip, sz)
+                try:
+                    lim.chk_df(tabspath, sz, True)
+                    lim.chk_sz(sz)
+                    lim.chk_vsz(self.conn.hsrv.broker, vfs.realpath, sz)
+                    lim.chk_bup(self.ip)
+                    lim.chk_nup(self.ip)
+                except:
+                    if not discard:
+                        wunlink(self.log, tabspath, vfs.flags)
+                        wunlink(self.log, abspath, vfs.flags)
+                    raise
+        except:
+            if not discard and bos.path.exists(tabspath):
+                got = bos.path.getsize(tabspath)
+                t = "connection lost after receiving %s of the file"
+                self.log(t % (humansize(got),), 3)
+                if rm_partial:
+                    wunlink(self.log, tabspath, vfs.flags)
+                    wunlink(self.log, abspath, vfs.flags)
+            raise
+
+        if not discard:
+            atomic_move(self.log, tabspath, abspath, vfs.flags)
+            if lastmod:
+                try:
+                    bos.utime(abspath, (int(time.time()), int(lastmod)), False)
+                except:
+                    self.log("failed to utime %r" % (abspath,), 3)
+
+        at = time.time() - lifetime
+        if xau:
+            hr = runhook(
+                self.log,
+                self.conn.hsrv.broker,
+                None,
+                "xau.http." + hook,
+                xau,
+                abspath,
+                vjoin(vdir, fname),
+                self.host,
+                self.uname,
+                self.asrv.vfs.get_perms(vdir, self.uname),
+                lastmod or at,
+                sz,
+                self.ip,
+                at,
+                "",
+            )
+            if not hr:
+                t = "upload blocked by xau server config"
+                self.log(t, 1)
+                if not discard:
+                    wunlink(self.log, abspath, vfs.flags)
+                raise Pebkac(403, t)
+            if hr.get("reloc"):
+                zs = vjoin(vdir, fname)
+                x = pathmod(self.asrv.vfs, abspath, zs, hr["reloc"])
+                if x:
+                    if self.args.hook_v:
+                        log_reloc(
+                            self.log, hr["reloc"], x, abspath, zs, fname, vfs, rem
+                        )
+                    fdir, vdir, fname, (vfs, rem) = x
+                    ap2 = os.path.join(fdir, fname)
+                    if discard:
+                        fdir = ap2 = ""
+                    else:
+                        bos.makedirs(fdir)
+                        atomic_move(self.log, abspath, ap2, vfs.flags)
+                    abspath = ap2
+            if not discard:
+                sz = bos.path.getsize(abspath)
+
+        hashes = u2h.finish(sz) if u2h and not xau else None
+        dbv, vrem = vfs.get_dbv(rem)
+        self.conn.hsrv.broker.say(
+            "up2k.hash_file",
+            dbv.realpath,
+            vfs.vpath,
+            dbv.flags,
+            vrem,
+            fname,
+            self.ip,
+            at,
+            self.uname,
+            True,
+            hashes,
+        )
+        self.conn.nbyte += sz
+        return sz, sha_hex, sha_b64, fname, abspath, vjoin(vdir, fname)
+
     def handle_plain_upload(
         self, file0: list[tuple[str, Optional[str], Generator[bytes, None, None]]]
     ) -> bool:
@@ -2694,12 +3200,15 @@ class HttpCli(object):
             if not nullwrite:
                 bos.makedirs(fdir_base)
 
-        rnd, want_url, lifetime, xbu, xau = self.upload_flags(vfs)
+        uflags = self.upload_flags(vfs)
+        want_url = uflags[1]
+
+        # whole request body; an upper bound of each filesize
+        clen = int(self.headers.get("content-length", -1))
 
-        files: list[tuple[int, str, str, str, str, str]] = []
-        # sz, sha_hex, sha_b64, p_file, fname, abspath
+        files: list[tuple[int, str, str, str, str, str, str]] = []
+        # sz, sha_hex, sha_b64, p_file, fname, abspath, vpath
         errmsg = ""
-        tabspath = ""
         dip = self.dip()
         t0 = time.time()
         try:
@@ -2710,218 +3219,32 @@ class HttpCli(object):
                     self.log("discarding incoming file without filename")
                     # fallthrough
 
-                fdir = fdir_base
-                fname = sanitize_fn(p_file or "", "")
-                abspath = os.path.join(fdir, fname)
                 suffix = "-%.6f-%s" % (time.time(), dip)
-                if p_file and not nullwrite:
-                    if rnd:
-                        fname = rand_name(fdir, fname, rnd)
-
-                    open_args = {"fdir": fdir, "suffix": suffix}
-
-                    if "replace" in self.uparam:
-                        if not self.can_delete:
-                            self.log("user not allowed to overwrite with ?replace")
-                        elif bos.path.exists(abspath):
-                            try:
-                                wunlink(self.log, abspath, vfs.flags)
-                                t = "overwriting file with new upload: %s"
-                            except:
-                                t = "toctou while deleting for ?replace: %s"
-                            self.log(t % (abspath,))
-                else:
-                    open_args = {}
-                    tnam = fname = os.devnull
-                    fdir = abspath = ""
-
-                if xbu:
-                    at = time.time() - lifetime
-                    hr = runhook(
-                        self.log,
-                        self.conn.hsrv.broker,
-                        None,
-                        "xbu.http.bup",
-                        xbu,
-                        abspath,
-                        vjoin(upload_vpath, fname),
-                        self.host,
-                        self.uname,
-                        self.asrv.vfs.get_perms(upload_vpath, self.uname),
-                        at,
-                        0,
-                        self.ip,
-                        at,
-                        "",
-                    )
-                    if not hr:
-                        t = "upload blocked by xbu server config"
-                        self.log(t, 1)
-                        raise Pebkac(403, t)
-                    if hr.get("reloc"):
-                        zs = vjoin(upload_vpath, fname)
-                        x = pathmod(self.asrv.vfs, abspath, zs, hr["reloc"])
-                        if x:
-                            if self.args.hook_v:
-                                log_reloc(
-                                    self.log,
-                                    hr["reloc"],
-                                    x,
-                                    abspath,
-                                    zs,
-                                    fname,
-                                    vfs,
-                                    rem,
-                                )
-                            fdir, upload_vpath, fname, (vfs, rem) = x
-                            abspath = os.path.join(fdir, fname)
-                            if nullwrite:
-                                fdir = abspath = ""
-                            else:
-                                open_args["fdir"] = fdir
-
-                if p_file and not nullwrite:
-                    bos.makedirs(fdir)
-
-                    # reserve destination filename
-                    f, fname = ren_open(fname, "wb", fdir=fdir, suffix=suffix)
-                    f.close()
-
-                    tnam = fname + ".PARTIAL"
-                    if self.args.dotpart:
-                        tnam = "." + tnam
-
-                    abspath = os.path.join(fdir, fname)
-                else:
-                    open_args = {}
-                    tnam = fname = os.devnull
-                    fdir = abspath = ""
-
-                if lim:
-                    lim.chk_bup(self.ip)
-                    lim.chk_nup(self.ip)
-
                 try:
-                    max_sz = 0
-                    if lim:
-                        v1 = lim.smax
-                        v2 = lim.dfv - lim.dfl
-                        max_sz = min(v1, v2) if v1 and v2 else v1 or v2
-
-                    f, tnam = ren_open(tnam, "wb", self.args.iobuf, **open_args)
-                    try:
-                        tabspath = os.path.join(fdir, tnam)
-                        self.log("writing to {}".format(tabspath))
-                        sz, sha_hex, sha_b64 = hashcopy(
-                            p_data, f, self.args.s_wr_slp, max_sz
-                        )
-                        if sz == 0:
-                            raise Pebkac(400, "empty files in post")
-                    finally:
-                        f.close()
-
-                    if lim:
-                        lim.nup(self.ip)
-                        lim.bup(self.ip, sz)
-                        try:
-                            lim.chk_df(tabspath, sz, True)
-                            lim.chk_sz(sz)
-                            lim.chk_vsz(self.conn.hsrv.broker, vfs.realpath, sz)
-                            lim.chk_bup(self.ip)
-                            lim.chk_nup(self.ip)
-                        except:
-                            if not nullwrite:
-                                wunlink(self.log, tabspath, vfs.flags)
-                                wunlink(self.log, abspath, vfs.flags)
-                            fname = os.devnull
-                            raise
-
-                    if not nullwrite:
-                        atomic_move(self.log, tabspath, abspath, vfs.flags)
-
-                    tabspath = ""
-
-                    at = time.time() - lifetime
-                    if xau:
-                        hr = runhook(
-                            self.log,
-                            self.conn.hsrv.broker,
-                            None,
-                            "xau.http.bup",
-                            xau,
-                            abspath,
-                            vjoin(upload_vpath, fname),
-                            self.host,
-                            self.uname,
-                            self.asrv.vfs.get_perms(upload_vpath, self.uname),
-                            at,
-                            sz,
-                            self.ip,
-                            at,
-                            "",
-                        )
-                        if not hr:
-                            t = "upload blocked by xau server config"
-                            self.log(t, 1)
-                            wunlink(self.log, abspath, vfs.flags)
-                            raise Pebkac(403, t)
-                        if hr.get("reloc"):
-                            zs = vjoin(upload_vpath, fname)
-                            x = pathmod(self.asrv.vfs, abspath, zs, hr["reloc"])
-                            if x:
-                                if self.args.hook_v:
-                                    log_reloc(
-                                        self.log,
-                                        hr["reloc"],
-                                        x,
-                                        abspath,
-                                        zs,
-                                        fname,
-                                        vfs,
-                                        rem,
-                                    )
-                                fdir, upload_vpath, fname, (vfs, rem) = x
-                                ap2 = os.path.join(fdir, fname)
-                                if nullwrite:
-                                    fdir = ap2 = ""
-                                else:
-                                    bos.makedirs(fdir)
-                                    atomic_move(self.log, abspath, ap2, vfs.flags)
-                                abspath = ap2
-                        sz = bos.path.getsize(abspath)
-
-                    files.append(
-                        (sz, sha_hex, sha_b64, p_file or "(discarded)", fname, abspath)
-                    )
-                    dbv, vrem = vfs.get_dbv(rem)
-                    self.conn.hsrv.broker.say(
-                        "up2k.hash_file",
-                        dbv.realpath,
-                        vfs.vpath,
-                        dbv.flags,
-                        vrem,
-                        fname,
-                        self.ip,
-                        at,
-                        self.uname,
-                        True,
+                    sz, sha_hex, sha_b64, fname, abspath, vpath = self._upload_file(
+                        vfs,
+                        rem,
+                        fdir_base,
+                        upload_vpath,
+                        sanitize_fn(p_file or "", ""),
+                        p_data,
+                        "bup",
+                        uflags,
+                        suffix,
+                        discard=nullwrite or not p_file,
+                        szmax=clen,
                     )
-                    self.conn.nbyte += sz
-
                 except Pebkac:
                     self.parser.drop()
                     raise
 
+                ofn = p_file or "(discarded)"
+                files.append((sz, sha_hex, sha_b64, ofn, fname, abspath, vpath))
+
         except Pebkac as ex:
             errmsg = vol_san(
                 list(self.asrv.vfs.all_vols.values()), unicode(ex).encode("utf-8")
             ).decode("utf-8")
-            try:
-                got = bos.path.getsize(tabspath)
-                t = "connection lost after receiving %s of the file"
-                self.log(t % (humansize(got),), 3)
-            except:
-                pass
 
         td = max(0.1, time.time() - t0)
         sz_total = sum(x[0] for x in files)
@@ -2945,7 +3268,7 @@ class HttpCli(object):
             jmsg["error"] = errmsg
             errmsg = "ERROR: " + errmsg
 
-        for sz, sha_hex, sha_b64, ofn, lfn, ap in files:
+        for sz, sha_hex, sha_b64, ofn, lfn, ap, vpath in files:
             vsuf = ""
             if (self.can_read or self.can_upget) and "fk" in vfs.flags:
                 st = bos.stat(ap)
@@ -2961,8 +3284,7 @@ class HttpCli(object):
             if "media" in self.uparam or "medialinks" in vfs.flags:
                 vsuf += "&v" if vsuf else "?v"
 
-            vpath = "{}/{}".format(upload_vpath, lfn).strip("/")
-            rel_url = quotep(self.args.RS + vpath) + vsuf
+            rel_url = quotep(self.args.RS + vpath.strip("/")) + vsuf
             msg += 'sha512: {} // {} // {} bytes // <a href="/{}">{}</a> {}\n'.format(
                 sha_hex[:56],
                 sha_b64,
@@ -3471,6 +3793,49 @@ class HttpCli(object):
 
         return ret
 
+    def tx_res_c(self, ent: dict[str, Any]) -> bool:
+        """send a cached resource from HttpSrv.get_res"""
+        encs = ent["encs"]
+        ae = self.headers.get("accept-encoding")
+        enc = cmp_pick(ae, encs) if ae and encs else ""
+        if enc and re.match(r"MSIE [4-6]\.", self.ua) and " SV1" not in self.ua:
+            enc = ""
+
+        body, etag, hblock = ent[enc]
+        file_ts = ent["ts"]
+
+        inm = self.headers.get("if-none-match")
+        if inm:
+            do_send = etag not in inm
+        elif file_ts:
+            _, do_send = self._chk_lastmod(int(file_ts))
+        else:
+            do_send = True
+
+        status = 200 if do_send else 304
+
+        if ent["ship_gz"]:
+            self.out_headers["Cache-Control"] = "max-age=604869"
+        else:
+            self.permit_caching()
+
+        if encs:
+            self.out_headers["Vary"] += ", Accept-Encoding"
+
+        if self.can_write and file_ts:
+            self.out_headers["X-Lastmod3"] = str(int(file_ts * 1000))
+
+        if self.do_log:
+            t = "%4s %s %s %d cached"
+            self.log(t % ("", self.req, enc or "plain", status))
+
+        if self.mode == "HEAD" or not do_send:
+            self.send_headers(len(body), status, ent["mime"], hblock=hblock)
+            return True
+
+        self.send_headers(len(body), status, ent["mime"], hblock=hblock, body=body)
+        return True
+
     def tx_file(self, req_path: str, ptop: Optional[str] = None) -> bool:
         status = 200
         logmsg = "{:4} {} ".format("", self.req)
@@ -3572,37 +3937,71 @@ class HttpCli(object):
         fs_path, file_sz = editions[selected_edition]
         logmsg += "{} ".format(selected_edition.lstrip("."))
 
+        #
+        # offload to the reverse-proxy (which also does ranges)
+
+        xsend = ""
+        vflags = self.vn.flags
+        if (
+            do_send
+            and self.is_rproxied
+            and ptop is None
+            and not is_compressed
+            and self.mode != "HEAD"
+            and ("xaccel" in vflags or "xsendfile" in vflags)
+        ):
+            zs = self.vn.realpath
+            if fs_path.startswith(zs + os.sep):
+                vrem = fs_path[len(zs) :]
+                if "xaccel" in vflags:
+                    if ANYWIN:
+                        vrem = vrem.replace("\\", "/")
+                    zs = vflags["xaccel"].rstrip("/") + quotep(vrem)
+                    self.out_headers["X-Accel-Redirect"] = xsend = zs
+                else:
+                    zs = vflags["xsendfile"]
+                    zs = fs_path if zs is True else zs.rstrip("/\\") + vrem
+                    self.out_headers["X-Sendfile"] = xsend = zs
+
         #
         # partial
 
-        lower = 0
-        upper = file_sz
         hrange = self.headers.get("range")
 
-        # let's not support 206 with compression
-        # and multirange / multipart is also not-impl (mostly because calculating contentlength is a pain)
-        if do_send and not is_compressed and hrange and file_sz and "," not in hrange:
+        # let's not support 206 with compression;
+        # multirange is sent as multipart/byteranges
+        ranges: list[tuple[int, int]] = []
+        if do_send and not is_compressed and hrange and file_sz and not xsend:
             try:
                 if not hrange.lower().startswith("bytes"):
                     raise Exception()
 
-                a, b = hrange.split("=", 1)[1].split("-")
+                specs = hrange.split("=", 1)[1].split(",")
+                if len(specs) > 1 and (
+                    ptop is not None or len(specs) > self.args.max_ranges
+                ):
+                    # pipes can only do one range, and too many is sus;
+                    # the client will have to make do with the whole file
+                    specs = []
 
-                if a.strip():
-                    lower = int(a.strip())
-                else:
-                    lower = 0
+                for spec in specs:
+                    a, b = spec.split("-")
 
-                if b.strip():
-                    upper = int(b.strip()) + 1
-                else:
-                    upper = file_sz
+                    if a.strip():
+                        lower = int(a.strip())
+                        upper = int(b.strip()) + 1 if b.strip() else file_sz
+                    else:
+                        # suffix; the last N bytes
+                        lower = max(0, file_sz - int(b.strip()))
+                        upper = file_sz if int(b.strip()) else 0
 
-                if upper > file_sz:
-                    upper = file_sz
+                    if upper > file_sz:
+                        upper = file_sz
 
-                if lower < 0 or lower >= upper:
-                    raise Exception()
+                    if lower < 0 or lower >= upper:
+                        raise Exception()
+
+                    ranges.append((lower, upper))
 
             except:
                 err = "invalid range ({}), size={}".format(hrange, file_sz)
@@ -3613,12 +4012,31 @@ class HttpCli(object):
                 )
                 return True
 
+            if len(ranges) > 1:
+                # coalesce overlapping ranges so the reply can't get
+                # bigger than the file itself (plus part headers)
+                ranges.sort()
+                zl = [ranges[0]]
+                for lo, hi in ranges[1:]:
+                    if lo <= zl[-1][1]:
+                        zl[-1] = (zl[-1][0], max(hi, zl[-1][1]))
+                    else:
+                        zl.append((lo, hi))
+                ranges = zl
+
+        lower = 0
+        upper = file_sz
+        if len(ranges) == 1:
+            lower, upper = ranges[0]
             status = 206
             self.out_headers["Content-Range"] = "bytes {}-{}/{}".format(
                 lower, upper - 1, file_sz
             )
 
             logtail += " [\033[36m{}-{}\033[0m]".format(lower, upper)
+        elif ranges:
+            status = 206
+            logtail += " [\033[36m{} ranges\033[0m]".format(len(ranges))
 
         use_sendfile = False
         if decompress:
@@ -3658,6 +4076,22 @@ class HttpCli(object):
         self.out_headers["Accept-Ranges"] = "bytes"
         logmsg += unicode(status) + logtail
 
+        # multipart/byteranges; the part headers are prepared
+        # here so the total content-length is known upfront
+        parts: list[tuple[bytes, int, int]] = []
+        if len(ranges) > 1:
+            zs = uuid.uuid4().hex
+            for lo, hi in ranges:
+                t = "\r\n--%s\r\nContent-Type: %s\r\n"
+                t += "Content-Range: bytes %d-%d/%d\r\n\r\n"
+                zb = (t % (zs, mime, lo, hi - 1, file_sz)).encode("utf-8")
+                parts.append((zb, lo, hi))
+
+            parts.append((("\r\n--%s--\r\n" % (zs,)).encode("utf-8"), 0, 0))
+            mime = "multipart/byteranges; boundary=" + zs
+            lower = 0
+            upper = sum([len(zb) + hi - lo for zb, lo, hi in parts])
+
         if self.mode == "HEAD" or not do_send:
             if self.do_log:
                 self.log(logmsg)
@@ -3665,6 +4099,13 @@ class HttpCli(object):
             self.send_headers(length=upper - lower, status=status, mime=mime)
             return True
 
+        if xsend:
+            if self.do_log:
+                self.log("{}, \033[36mxsend\033[0m {}".format(logmsg, xsend))
+
+            self.send_headers(length=0, status=status, mime=mime)
+            return True
+
         if ptop is not None:
             return self.tx_pipe(
                 ptop, req_path, ap_data, job, lower, upper, status, mime, logmsg
@@ -3675,16 +4116,42 @@ class HttpCli(object):
             self.send_headers(length=upper - lower, status=status, mime=mime)
 
             sendfun = sendfile_kern if use_sendfile else sendfile_py
-            remains = sendfun(
-                self.log,
-                lower,
-                upper,
-                f,
-                self.s,
-                self.args.s_wr_sz,
-                self.args.s_wr_slp,
-                not self.args.no_poll,
-            )
+            if not parts:
+                remains = sendfun(
+                    self.log,
+                    lower,
+                    upper,
+                    f,
+                    self.s,
+                    self.args.s_wr_sz,
+                    self.args.s_wr_slp,
+                    not self.args.no_poll,
+                )
+            else:
+                remains = upper
+                for zb, lo, hi in parts:
+                    try:
+                        self.s.sendall(zb)
+                    except:
+                        break
+
+                    remains -= len(zb)
+                    if lo == hi:
+                        continue
+
+                    n = sendfun(
+                        self.log,
+                        lo,
+                        hi,
+                        f,
+                        self.s,
+                        self.args.s_wr_sz,
+                        self.args.s_wr_slp,
+                        not self.args.no_poll,
+                    )
+                    remains -= (hi - lo) - n
+                    if n:
+                        break
 
         if remains > 0:
             logmsg += " \033[31m" + unicode(upper - remains) + "\033[0m"
@@ -3739,9 +4206,10 @@ class HttpCli(object):
 
             if num_need != len(job["need"]) and data_end - lower < 8 * M:
                 num_need = len(job["need"])
+                need = set(job["need"])
                 data_end = 0
                 for cid in job["hash"]:
-                    if cid in job["need"]:
+                    if cid in need:
                         break
                     data_end += chunk_size
                 t = "pipe: can stream %.2f MiB; requested range is %.2f to %.2f"
@@ -4395,7 +4863,7 @@ class HttpCli(object):
                 ret = {"k%s" % (parent,): ret, "a": []}
 
         zs = json.dumps(ret)
-        self.reply(zs.encode("utf-8"), mime="application/json")
+        self.reply(zs.encode("utf-8"), mime="application/json", cmp=True)
         return True
 
     def gen_tree(self, top: str, target: str, dk: str) -> dict[str, Any]:
@@ -4841,7 +5309,7 @@ class HttpCli(object):
             mime = "application/json"
 
         ret += "\n\033[0m" if arg == "v" else "\n"
-        self.reply(ret.encode("utf-8", "replace"), mime=mime)
+        self.reply(ret.encode("utf-8", "replace"), mime=mime, cmp=True)
         return True
 
     def tx_browser(self) -> bool:
@@ -5190,7 +5658,7 @@ class HttpCli(object):
                 raise Pebkac(403)
 
             html = self.j2s(tpl, **j2a)
-            self.reply(html.encode("utf-8", "replace"))
+            self.reply(html.encode("utf-8", "replace"), cmp=True)
             return True
 
         for k in ["zip", "tar"]:
@@ -5681,5 +6149,5 @@ class HttpCli(object):
                 self.html_head = zs.replace("\n\n", "\n")
 
         html = self.j2s(tpl, **j2a)
-        self.reply(html.encode("utf-8", "replace"))
+        self.reply(html.encode("utf-8", "replace"), cmp=True)
         return True
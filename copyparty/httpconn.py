@@ -2,21 +2,11 @@
 from __future__ import print_function, unicode_literals
 
 import argparse  # typechk
-import os
 import re
 import socket
 import threading  # typechk
 import time
 
-try:
-    if os.environ.get("PRTY_NO_TLS"):
-        raise Exception()
-
-    HAVE_SSL = True
-    import ssl
-except:
-    HAVE_SSL = False
-
 from . import util as Util
 from .__init__ import TYPE_CHECKING, EnvParams
 from .authsrv import AuthSrv  # typechk
@@ -75,9 +65,11 @@ class HttpConn(object):
         self.t0: float = time.time()  # mypy404
         self.freshen_pwd: float = 0.0
         self.stopping = False
+        self.kap_t = 0.0  # parked until
         self.nreq: int = -1  # mypy404
         self.nbyte: int = 0  # mypy404
         self.u2idx: Optional[U2idx] = None
+        self.hpw: Optional[Util.HashPw] = None  # up2k chunk receiver
         self.log_func: "Util.RootLogger" = hsrv.log  # mypy404
         self.log_src: str = "httpconn"  # mypy404
         self.lf_url: Optional[Pattern[str]] = (
@@ -145,7 +137,8 @@ class HttpConn(object):
 
         return not method or not bool(PTN_HTTP.match(method))
 
-    def run(self) -> None:
+    def run(self) -> bool:
+        """returns true if the connection should be parked (idle keepalive)"""
         self.s.settimeout(10)
 
         self.sr = None
@@ -160,28 +153,19 @@ class HttpConn(object):
         if is_https:
             if self.sr:
                 self.log("TODO: cannot do https in jython", c="1;31")
-                return
+                return False
 
             self.log_src = self.log_src.replace("[36m", "[35m")
+            t0 = time.time()
             try:
-                assert ssl  # type: ignore  # !rm
-                ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
-                ctx.load_cert_chain(self.args.cert)
-                if self.args.ssl_ver:
-                    ctx.options &= ~self.args.ssl_flags_en
-                    ctx.options |= self.args.ssl_flags_de
-                    # print(repr(ctx.options))
-
-                if self.args.ssl_log:
-                    try:
-                        ctx.keylog_filename = self.args.ssl_log
-                    except:
-                        self.log("keylog failed; openssl or python too old")
-
-                if self.args.ciphers:
-                    ctx.set_ciphers(self.args.ciphers)
-
+                ctx = self.hsrv.get_ssl_ctx()
                 self.s = ctx.wrap_socket(self.s, server_side=True)
+                with self.hsrv.mutex:
+                    self.hsrv.nhs += 1
+                    self.hsrv.ths += time.time() - t0
+                    if getattr(self.s, "session_reused", False):
+                        self.hsrv.nhs_re += 1
+
                 msg = [
                     "\033[1;3%dm%s" % (c, s)
                     for c, s in zip([0, 5, 0], self.s.cipher())  # type: ignore
@@ -201,6 +185,9 @@ class HttpConn(object):
                         self.log("TLS {}: {}".format(k, v or "nah"))
 
             except Exception as ex:
+                with self.hsrv.mutex:
+                    self.hsrv.nhs_err += 1
+
                 em = str(ex)
 
                 if "ALERT_CERTIFICATE_UNKNOWN" in em:
@@ -210,17 +197,38 @@ class HttpConn(object):
                 else:
                     self.log("handshake\033[0m " + em, c=5)
 
-                return
+                return False
 
         if not self.sr:
             self.sr = Util.Unrecv(self.s, self.log)
 
+        return self.serve()
+
+    def serve(self) -> bool:
+        """
+        process requests until the connection closes (returns false),
+        or until it goes idle and can be parked in hsrv (returns true)
+        """
+        assert self.sr  # !rm
         while not self.stopping:
             self.nreq += 1
             self.cli = HttpCli(self)
             if not self.cli.run():
-                return
+                return False
 
             if self.u2idx:
                 self.hsrv.put_u2idx(str(self.addr), self.u2idx)
                 self.u2idx = None
+
+            if not self.hsrv.kap or self.sr.buf:
+                continue
+
+            # tls may be holding decrypted bytes which select can't see
+            pending = getattr(self.s, "pending", None)
+            if not pending or not pending():
+                # parked conns shouldn't hold on to the upload buffers;
+                # hpw is kept until close_client, for the next chunk
+                self.sr.drop_rbuf()
+                return True
+
+        return False
@@ -1,6 +1,7 @@
 # coding: utf-8
 from __future__ import print_function, unicode_literals
 
+import hashlib
 import math
 import os
 import re
@@ -8,9 +9,30 @@ import socket
 import sys
 import threading
 import time
+import zlib
 
 import queue
 
+try:
+    if os.environ.get("PRTY_NO_KAP"):
+        raise Exception()
+
+    import selectors
+
+    HAVE_SEL = True
+except:
+    HAVE_SEL = False
+
+try:
+    if os.environ.get("PRTY_NO_TLS"):
+        raise Exception()
+
+    import ssl
+
+    HAVE_SSL = True
+except:
+    HAVE_SSL = False
+
 from .__init__ import ANYWIN, CORES, EXE, MACOS, PY2, TYPE_CHECKING, EnvParams, unicode
 
 try:
@@ -60,6 +82,7 @@ from .u2idx import U2idx
 from .util import (
     E_SCK,
     FHC,
+    RE_CMP_NO,
     CachedDict,
     Daemon,
     Garda,
@@ -67,6 +90,9 @@ from .util import (
     Netdev,
     NetMap,
     build_netmap,
+    cmp_buf,
+    formatdate,
+    guess_mime,
     has_resource,
     ipnorm,
     load_ipu,
@@ -76,6 +102,7 @@ from .util import (
     spack,
     start_log_thrs,
     start_stackmon,
+    stat_resource,
     ub64enc,
 )
 
@@ -143,6 +170,28 @@ class HttpSrv(object):
         )
         self.t_periodic: Optional[threading.Thread] = None
 
+        # idle keepalive connections are parked in a selector
+        # until the next request arrives, freeing the pool thread
+        self.kap: Optional["selectors.BaseSelector"] = None
+        self.kap_mutex = threading.Lock()
+        self.nkap = 0
+        if HAVE_SEL and self.tp_q and not self.args.no_kap:
+            sel = selectors.DefaultSelector()
+            # must allow registering fds while another thread is in select()
+            if type(sel).__name__ in ("EpollSelector", "KqueueSelector"):
+                self.kap = sel
+            else:
+                sel.close()
+
+        self.ssl_ctx: Optional["ssl.SSLContext"] = None
+        self.ssl_mutex = threading.Lock()
+        self.ssl_mt = 0.0  # mtime of loaded cert
+        self.ssl_ts = 0.0  # last mtime check
+        self.nhs = 0  # num tls handshakes
+        self.nhs_re = 0  # resumed sessions
+        self.nhs_err = 0
+        self.ths = 0.0  # total handshake time
+
         self.u2fh = FHC()
         self.pipes = CachedDict(0.2)
         self.metrics = Metrics(self)
@@ -156,6 +205,11 @@ class HttpSrv(object):
         self.cb_ts = 0.0
         self.cb_v = ""
 
+        # .cpr resources; dropped on reload or when web/ is modified
+        self.res_cache: dict[str, Optional[dict[str, Any]]] = {}
+        self.res_mutex = threading.Lock()
+        self.res_cb = ""
+
         self.u2idx_free: dict[str, U2idx] = {}
         self.u2idx_n = 0
 
@@ -202,6 +256,9 @@ class HttpSrv(object):
         if self.tp_q:
             self.start_threads(4)
 
+        if self.kap:
+            Daemon(self.thr_kap, self.name + "-kap")
+
         if nid:
             if self.args.stackmon:
                 start_stackmon(self.args.stackmon, nid)
@@ -226,6 +283,73 @@ class HttpSrv(object):
 
         self.nm = NetMap(list(ips), list(netdevs))
 
+    def get_ssl_ctx(self) -> "ssl.SSLContext":
+        """shared tls context; reloaded if the cert is modified"""
+        now = time.time()
+        if self.ssl_ctx and now - self.ssl_ts < 2:
+            return self.ssl_ctx
+
+        with self.ssl_mutex:
+            if self.ssl_ctx and now - self.ssl_ts < 2:
+                return self.ssl_ctx
+
+            self.ssl_ts = now
+            try:
+                mt = os.path.getmtime(self.args.cert)
+            except:
+                mt = 0.0
+
+            if self.ssl_ctx and mt == self.ssl_mt:
+                return self.ssl_ctx
+
+            try:
+                ctx = self._new_ssl_ctx()
+            except Exception as ex:
+                if not self.ssl_ctx:
+                    raise
+
+                t = "failed to reload tls cert [%s]; keeping the old one: %r"
+                self.log(self.name, t % (self.args.cert, ex), 3)
+                self.ssl_mt = mt
+                return self.ssl_ctx
+
+            if self.ssl_ctx:
+                self.log(self.name, "reloaded tls cert [%s]" % (self.args.cert,))
+
+            self.ssl_ctx = ctx
+            self.ssl_mt = mt
+            return ctx
+
+    def _new_ssl_ctx(self) -> "ssl.SSLContext":
+        assert ssl  # type: ignore  # !rm
+        ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        ctx.load_cert_chain(self.args.cert)
+        if self.args.ssl_ver:
+            ctx.options &= ~self.args.ssl_flags_en
+            ctx.options |= self.args.ssl_flags_de
+            # print(repr(ctx.options))
+
+        if self.args.ssl_log:
+            try:
+                ctx.keylog_filename = self.args.ssl_log
+            except:
+                self.log(self.name, "keylog failed; openssl or python too old")
+
+        if self.args.ciphers:
+            ctx.set_ciphers(self.args.ciphers)
+
+        # session resumption; tickets for tls1.3 and tls1.2,
+        # and the server-side session cache (per-context) for tls1.2
+        if self.args.ssl_tickets:
+            ctx.options &= ~getattr(ssl, "OP_NO_TICKET", 0)
+        else:
+            ctx.options |= getattr(ssl, "OP_NO_TICKET", 0)
+
+        if hasattr(ctx, "num_tickets"):
+            ctx.num_tickets = self.args.ssl_tickets
+
+        return ctx
+
     def start_threads(self, n: int) -> None:
         self.tp_nthr += n
         if self.args.log_htp:
@@ -249,7 +373,8 @@ class HttpSrv(object):
             with self.u2mutex, self.mutex:
                 self.u2fh.clean()
                 if self.tp_q:
-                    self.tp_ncli = max(self.ncli, self.tp_ncli - 2)
+                    nact = self.ncli - self.nkap
+                    self.tp_ncli = max(nact, self.tp_ncli - 2)
                     if self.tp_nthr > self.tp_ncli + 8:
                         self.stop_threads(4)
 
@@ -270,6 +395,10 @@ class HttpSrv(object):
 
             sck.settimeout(None)  # < does not inherit, ^ opts above do
 
+            if tcp and (self.nid or 1) > 1 and not ANYWIN and self.args.reuseport:
+                # the first worker keeps the socket from tcpsrv
+                sck = self._reuseport(sck)
+
         if tcp:
             ip, port = sck.getsockname()[:2]
         else:
@@ -285,6 +414,31 @@ class HttpSrv(object):
             (sck,),
         )
 
+    def _reuseport(self, sck: socket.socket) -> socket.socket:
+        """bind a listening socket of our own next to the shared one"""
+        srv = socket.socket(sck.family, socket.SOCK_STREAM)
+        try:
+            srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            srv.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            if sck.family == socket.AF_INET6:
+                zi = sck.getsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY)
+                srv.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, zi)
+            if self.args.freebind:
+                srv.setsockopt(socket.SOL_IP, socket.IP_FREEBIND, 1)
+
+            srv.settimeout(None)
+            srv.bind(sck.getsockname())
+            srv.listen(self.args.nc)
+        except Exception as ex:
+            srv.close()
+            t = "reuseport failed; will share the socket with the other workers: %r"
+            self.log(self.name, t % (ex,), 3)
+            return sck
+
+        sck.close()
+        return srv
+
     def thr_listen(self, srv_sck: socket.socket) -> None:
         """listens on a shared tcp server"""
         fno = srv_sck.fileno()
@@ -415,11 +569,12 @@ class HttpSrv(object):
 
             if self.tp_q:
                 self.tp_time = self.tp_time or now
-                self.tp_ncli = max(self.tp_ncli, self.ncli)
-                if self.tp_nthr < self.ncli + 4:
+                nact = self.ncli - self.nkap
+                self.tp_ncli = max(self.tp_ncli, nact)
+                if self.tp_nthr < nact + 4:
                     self.start_threads(8)
 
-                self.tp_q.put((sck, addr))
+                self.tp_q.put((sck, addr, None))
                 return
 
         if not self.args.no_htp:
@@ -429,7 +584,7 @@ class HttpSrv(object):
         Daemon(
             self.thr_client,
             "httpconn-%s-%d" % (addr[0].split(".", 2)[-1][-6:], addr[1]),
-            (sck, addr),
+            (sck, addr, None),
         )
 
     def thr_poolw(self) -> None:
@@ -443,10 +598,10 @@ class HttpSrv(object):
                 self.tp_time = 0
 
             try:
-                sck, addr = task
+                sck, addr, cli = task
                 me = threading.current_thread()
                 me.name = "httpconn-%s-%d" % (addr[0].split(".", 2)[-1][-6:], addr[1])
-                self.thr_client(sck, addr)
+                self.thr_client(sck, addr, cli)
                 me.name = self.name + "-poolw"
             except Exception as ex:
                 if str(ex).startswith("client d/c "):
@@ -454,6 +609,85 @@ class HttpSrv(object):
                 else:
                     self.log(self.name, "thr_client: " + min_ex(), 3)
 
+    def park(self, cli: HttpConn) -> bool:
+        """hand an idle keepalive connection over to thr_kap"""
+        if self.stopping or cli.stopping:
+            return False
+
+        assert self.kap  # !rm
+        cli.kap_t = time.time() + self.args.s_thead
+        with self.kap_mutex:
+            try:
+                self.kap.register(cli.s, selectors.EVENT_READ, cli)
+            except KeyError:
+                # fd was recycled from a conn which got shut while parked
+                old = self.kap.get_key(cli.s).data
+                self.kap.unregister(old.s)
+                old.stopping = True
+                self.unpark(old)
+                self.kap.register(cli.s, selectors.EVENT_READ, cli)
+            except:
+                return False
+
+            # before thr_kap can see it, so unpark never gets there first
+            with self.mutex:
+                self.nkap += 1
+
+        return True
+
+    def unpark(self, cli: HttpConn) -> None:
+        """resume a parked connection in the threadpool"""
+        with self.mutex:
+            self.nkap -= 1
+            if not self.tp_q:
+                Daemon(self.thr_client, "httpconn-kap", (cli.s, cli.addr, cli))
+                return
+
+            nact = self.ncli - self.nkap
+            self.tp_time = self.tp_time or time.time()
+            self.tp_ncli = max(self.tp_ncli, nact)
+            if self.tp_nthr < nact + 4:
+                self.start_threads(8)
+
+            self.tp_q.put((cli.s, cli.addr, cli))
+
+    def thr_kap(self) -> None:
+        """waits for parked keepalive connections to send another request"""
+        assert self.kap  # !rm
+        sel = self.kap
+        t_sweep = 0.0
+        while not self.stopping:
+            try:
+                evs = sel.select(1)
+            except Exception as ex:
+                self.log(self.name, "kap-select: %r" % (ex,), 3)
+                time.sleep(0.1)
+                continue
+
+            with self.kap_mutex:
+                for key, _ in evs:
+                    sel.unregister(key.fileobj)
+                    self.unpark(key.data)
+
+                now = time.time()
+                if now - t_sweep < 1:
+                    continue
+
+                # drop conns which idled out or were shut while parked
+                t_sweep = now
+                for key in list(sel.get_map().values()):
+                    cli = key.data
+                    if cli.stopping or now > cli.kap_t:
+                        try:
+                            sel.unregister(key.fileobj)
+                        except:
+                            pass
+                        cli.stopping = True
+                        self.unpark(cli)
+
+        with self.kap_mutex:
+            sel.close()
+
     def shutdown(self) -> None:
         self.stopping = True
         for srv in self.srvs:
@@ -481,19 +715,33 @@ class HttpSrv(object):
 
         self.log(self.name, "ok bye")
 
-    def thr_client(self, sck: socket.socket, addr: tuple[str, int]) -> None:
-        """thread managing one tcp client"""
-        cli = HttpConn(sck, addr, self)
-        with self.mutex:
-            self.clients.add(cli)
+    def thr_client(
+        self, sck: socket.socket, addr: tuple[str, int], cli: Optional[HttpConn]
+    ) -> None:
+        """thread managing one tcp client, or resuming a parked one"""
+        if cli:
+            resume = True
+        else:
+            resume = False
+            cli = HttpConn(sck, addr, self)
+            with self.mutex:
+                self.clients.add(cli)
 
         # print("{}\n".format(len(self.clients)), end="")
         fno = sck.fileno()
+        parked = False
         try:
             if self.args.log_conn:
-                self.log("%s %s" % addr, "|%sC-crun" % ("-" * 4,), c="90")
+                zs = "crsm" if resume else "crun"
+                self.log("%s %s" % addr, "|%sC-%s" % ("-" * 4, zs), c="90")
+
+            if resume:
+                park = cli.serve()
+            else:
+                park = cli.run()
 
-            cli.run()
+            # cli is owned by thr_kap from this point on
+            parked = park and self.park(cli)
 
         except (OSError, socket.error) as ex:
             if ex.errno not in E_SCK:
@@ -504,29 +752,37 @@ class HttpSrv(object):
                 )
 
         finally:
-            sck = cli.s
-            if self.args.log_conn:
-                self.log("%s %s" % addr, "|%sC-cdone" % ("-" * 5,), c="90")
+            if not parked:
+                self.close_client(cli, addr)
 
-            try:
-                fno = sck.fileno()
-                shut_socket(cli.log, sck)
-            except (OSError, socket.error) as ex:
-                if not MACOS:
-                    self.log(
-                        "%s %s" % addr,
-                        "shut({}): {}".format(fno, ex),
-                        c="90",
-                    )
-                if ex.errno not in E_SCK:
-                    raise
-            finally:
-                with self.mutex:
-                    self.clients.remove(cli)
-                    self.ncli -= 1
+    def close_client(self, cli: HttpConn, addr: tuple[str, int]) -> None:
+        sck = cli.s
+        if self.args.log_conn:
+            self.log("%s %s" % addr, "|%sC-cdone" % ("-" * 5,), c="90")
 
-                if cli.u2idx:
-                    self.put_u2idx(str(addr), cli.u2idx)
+        try:
+            fno = sck.fileno()
+            shut_socket(cli.log, sck)
+        except (OSError, socket.error) as ex:
+            if not MACOS:
+                self.log(
+                    "%s %s" % addr,
+                    "shut({}): {}".format(fno, ex),
+                    c="90",
+                )
+            if ex.errno not in E_SCK:
+                raise
+        finally:
+            with self.mutex:
+                self.clients.remove(cli)
+                self.ncli -= 1
+
+            if cli.u2idx:
+                self.put_u2idx(str(addr), cli.u2idx)
+
+            if cli.hpw:
+                cli.hpw.close()
+                cli.hpw = None
 
     def cachebuster(self) -> str:
         if time.time() - self.cb_ts < 1:
@@ -550,6 +806,95 @@ class HttpSrv(object):
             self.cb_ts = time.time()
             return self.cb_v
 
+    def reload(self) -> None:
+        with self.res_mutex:
+            self.res_cache.clear()
+
+        self.ssl_ts = 0.0
+
+    def get_res(self, res_path: str) -> Optional[dict[str, Any]]:
+        """
+        cached copy of a .cpr resource in all available encodings;
+        ent[enc] = (body, etag, prerendered headers)
+        """
+        cb = self.cachebuster()
+        with self.res_mutex:
+            if self.res_cb != cb:
+                self.res_cache.clear()
+                self.res_cb = cb
+
+            if res_path in self.res_cache:
+                return self.res_cache[res_path]
+
+        try:
+            ent = self._load_res(res_path)
+        except Exception as ex:
+            # not cached; maybe it works next time
+            t = "failed to cache resource [%s]: %r"
+            self.log(self.name, t % (res_path, ex), 3)
+            return None
+
+        with self.res_mutex:
+            self.res_cache[res_path] = ent
+
+        return ent
+
+    def _load_res(self, res_path: str) -> Optional[dict[str, Any]]:
+        bufs: dict[str, bytes] = {}
+        mts: dict[str, float] = {}
+        for ext in ("", ".gz"):
+            zs = res_path + ext
+            if not has_resource(self.E, zs):
+                continue
+
+            st = stat_resource(self.E, zs)
+            mts[ext] = st.st_mtime if st else 0.0
+            with load_resource(self.E, zs) as f:
+                bufs[ext] = f.read()
+
+        if not bufs:
+            return None
+
+        file_ts = max(mts.values())
+        mime = guess_mime(res_path)
+        ship_gz = ".gz" in bufs
+        if ship_gz and "" in bufs and mts[""] > mts[".gz"]:
+            # plain file was edited after the .gz was made
+            del bufs[".gz"]
+
+        plain = bufs.get("")
+        if plain is None:
+            plain = zlib.decompress(bufs[".gz"], 47)
+
+        eds: dict[str, bytes] = {"": plain}
+        if not RE_CMP_NO.search(mime):
+            eds["gzip"] = bufs.get(".gz") or cmp_buf("gzip", plain, 9)
+            if "zstd" in self.args.cmp_enc:
+                eds["zstd"] = cmp_buf("zstd", plain, 19)
+        elif ".gz" in bufs:
+            eds["gzip"] = bufs[".gz"]
+
+        etag = ub64enc(hashlib.sha1(plain).digest()[:12]).decode("ascii")
+        ret: dict[str, Any] = {
+            "encs": [x for x in ("zstd", "gzip") if x in eds],
+            "mime": mime,
+            "ts": file_ts,
+            "ship_gz": ship_gz,
+        }
+        for enc, buf in eds.items():
+            zs = '"%s%s"' % (etag, enc[:2])
+            zsl = ["ETag: " + zs]
+            if enc:
+                zsl.append("Content-Encoding: " + enc)
+            if file_ts:
+                zsl.append("Last-Modified: " + formatdate(file_ts))
+            hblock = "\r\n".join(zsl)
+            if self.ptn_cc.search(hblock.replace("\r\n", "")):
+                raise Exception("Cc in resource headers")
+            ret[enc] = (buf, zs, hblock)
+
+        return ret
+
     def get_u2idx(self, ident: str) -> Optional[U2idx]:
         utab = self.u2idx_free
         for _ in range(100):  # 5/0.05 = 5sec
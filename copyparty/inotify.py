@@ -0,0 +1,246 @@
+# coding: utf-8
+from __future__ import print_function, unicode_literals
+
+import ctypes
+import errno
+import os
+import struct
+import threading
+import time
+
+from .util import Daemon, fsdec, fsenc
+
+if True:  # pylint: disable=using-constant-test
+    from typing import Callable
+
+    from .util import RootLogger
+
+IN_ATTRIB = 0x4
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ONLYDIR = 0x1000000
+IN_DONT_FOLLOW = 0x2000000
+IN_EXCL_UNLINK = 0x4000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+
+MASK = (
+    IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_ONLYDIR
+    | IN_DONT_FOLLOW
+    | IN_EXCL_UNLINK
+)
+
+EVT = struct.Struct(b"iIII")
+
+
+class Inotify(object):
+    """
+    watches folder trees for changes made outside of copyparty (linux);
+    collects the folders where something happened, and pokes `wake`
+    so the changes can be collected with `take`
+    """
+
+    def __init__(self, log_func: "RootLogger", wake: Callable[[], None]) -> None:
+        self.log_func = log_func
+        self.wake = wake
+        self.mutex = threading.Lock()
+        self.wds: dict[int, tuple[str, str]] = {}  # wd -> top, rd
+        self.tops: dict[str, tuple[set[str], int]] = {}  # top -> excl, dev
+        self.dirty: dict[str, dict[str, bool]] = {}  # top -> rd -> recursive
+        self.overflow: set[str] = set()  # tops which need a full rescan
+        self.t0 = 0.0  # first event since take
+        self.t1 = 0.0  # most recent event
+
+        libc = ctypes.CDLL(None, use_errno=True)
+        self._init = libc.inotify_init1
+        self._add = libc.inotify_add_watch
+        self._add.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm = libc.inotify_rm_watch
+        self._rm.argtypes = [ctypes.c_int, ctypes.c_int]
+
+        self.fd = self._init(IN_CLOEXEC)
+        if self.fd < 0:
+            zi = ctypes.get_errno()
+            raise OSError(zi, os.strerror(zi))
+
+        Daemon(self._reader, "inotify")
+
+    def log(self, msg: str, c: int = 0) -> None:
+        self.log_func("inotify", msg, c)
+
+    def watch(self, top: str, excl: set[str], dev: int) -> int:
+        """watch everything below top; returns num folders, or -1 if full"""
+        with self.mutex:
+            self.tops[top] = (excl, dev)
+            ret = self._add_tree(top, "")
+            if ret < 0:
+                self._unwatch(top)
+
+            return ret
+
+    def unwatch(self, top: str) -> None:
+        with self.mutex:
+            self._unwatch(top)
+
+    def _unwatch(self, top: str) -> None:
+        self.tops.pop(top, None)
+        self.dirty.pop(top, None)
+        for wd, (wtop, _) in list(self.wds.items()):
+            if wtop == top:
+                self._rm(self.fd, wd)
+                del self.wds[wd]
+
+    def due(self, cd: float, now: float) -> float:
+        """num sec until it's time to take; 0 = now, or 9001 if nothing"""
+        with self.mutex:
+            if not self.dirty and not self.overflow:
+                return 9001
+
+            # wait for a quiet moment, but not forever
+            return max(0, min(self.t1 + cd, self.t0 + cd * 10) - now)
+
+    def take(self) -> tuple[dict[str, dict[str, bool]], set[str]]:
+        with self.mutex:
+            ret = self.dirty, self.overflow
+            self.dirty = {}
+            self.overflow = set()
+            self.t0 = 0
+            return ret
+
+    def _mark(self, top: str, rd: str, deep: bool) -> None:
+        zd = self.dirty.get(top)
+        if zd is None:
+            zd = self.dirty[top] = {}
+
+        zd[rd] = deep or zd.get(rd, False)
+        self.t1 = time.time()
+        if not self.t0:
+            self.t0 = self.t1
+
+    def _add_tree(self, top: str, rd0: str) -> int:
+        """watch rd0 and all its subfolders; -1 if out of watches"""
+        excl, dev = self.tops[top]
+        todo = [rd0]
+        ret = 0
+        while todo:
+            rd = todo.pop()
+            ap = os.path.join(top, rd) if rd else top
+            if rd and ap in excl:
+                continue  # another volume, or histpath
+
+            wd = self._add(self.fd, fsenc(ap), MASK)
+            if wd < 0:
+                zi = ctypes.get_errno()
+                if zi == errno.ENOSPC:
+                    t = "cannot watch [%s] for changes; reached the max number of inotify watches (%d folders so far) -- consider increasing the sysctl fs.inotify.max_user_watches"
+                    self.log(t % (top, len(self.wds)), 1)
+                    return -1
+
+                if zi not in (errno.ENOENT, errno.ENOTDIR):
+                    t = "cannot watch [%s]: %s"
+                    self.log(t % (ap, os.strerror(zi)), 3)
+
+                continue
+
+            self.wds[wd] = (top, rd)
+            ret += 1
+            try:
+                with os.scandir(fsenc(ap)) as dh:
+                    for fh in dh:
+                        if not fh.is_dir(follow_symlinks=False):
+                            continue
+
+                        if dev and fh.stat(follow_symlinks=False).st_dev != dev:
+                            continue
+
+                        name = fsdec(fh.name)
+                        todo.append(rd + "/" + name if rd else name)
+            except Exception as ex:
+                if not isinstance(ex, OSError) or ex.errno != errno.ENOENT:
+                    self.log("cannot list [%s]: %r" % (ap, ex), 3)
+
+        return ret
+
+    def _rm_tree(self, top: str, rd0: str) -> None:
+        """forget the watches of rd0 and its subfolders"""
+        pfx = rd0 + "/"
+        for wd, (wtop, rd) in list(self.wds.items()):
+            if wtop == top and (rd == rd0 or rd.startswith(pfx)):
+                self._rm(self.fd, wd)
+                del self.wds[wd]
+
+    def _reader(self) -> None:
+        while True:
+            try:
+                buf = os.read(self.fd, 256 * 1024)
+            except OSError as ex:
+                if ex.errno == errno.EINTR:
+                    continue
+
+                self.log("stopped watching for changes: %r" % (ex,), 1)
+                return
+
+            with self.mutex:
+                ofs = 0
+                while ofs + EVT.size <= len(buf):
+                    wd, mask, _, nlen = EVT.unpack_from(buf, ofs)
+                    ofs += EVT.size
+                    name = buf[ofs : ofs + nlen].rstrip(b"\0")
+                    ofs += nlen
+                    try:
+                        self._evt(wd, mask, fsdec(name))
+                    except Exception as ex:
+                        self.log("event %x for wd %d failed: %r" % (mask, wd, ex), 1)
+
+            self.wake()
+
+    def _evt(self, wd: int, mask: int, name: str) -> None:
+        if mask & IN_Q_OVERFLOW:
+            # events were lost; everything must be rescanned
+            self.log("event queue overflow; will rescan all watched volumes", 3)
+            self.overflow.update(self.tops)
+            self.t1 = time.time()
+            self.t0 = self.t0 or self.t1
+            return
+
+        try:
+            top, rd = self.wds[wd]
+        except KeyError:
+            return
+
+        if mask & IN_IGNORED:
+            # folder deleted, or we stopped watching it
+            del self.wds[wd]
+            return
+
+        self._mark(top, rd, False)
+        if not name or not mask & IN_ISDIR:
+            return
+
+        sub = rd + "/" + name if rd else name
+        if mask & (IN_CREATE | IN_MOVED_TO):
+            # new folder, possibly with stuff inside already;
+            # watch it and index all of it
+            self._rm_tree(top, sub)
+            if self._add_tree(top, sub) < 0:
+                t = "stopped watching [%s] for changes; will rescan it and try again"
+                self.log(t % (top,), 3)
+                self._unwatch(top)
+                self.overflow.add(top)
+                return
+
+            self._mark(top, sub, True)
+        elif mask & (IN_DELETE | IN_MOVED_FROM):
+            self._rm_tree(top, sub)
+            self._mark(top, sub, True)
@@ -78,6 +78,20 @@ class Metrics(object):
         t = "number of http(s) requests since last restart"
         addc("cpp_http_reqs", str(self.hsrv.nreq), t)
 
+        if not args.http_only:
+            t = "number of completed tls handshakes since last restart"
+            addc("cpp_tls_handshakes", str(self.hsrv.nhs), t)
+
+            t = "number of tls handshakes which resumed a previous session"
+            addc("cpp_tls_resumed", str(self.hsrv.nhs_re), t)
+
+            t = "number of failed tls handshakes since last restart"
+            addc("cpp_tls_failed", str(self.hsrv.nhs_err), t)
+
+            t = "total time spent in successful tls handshakes"
+            v = "{:.3f}".format(self.hsrv.ths)
+            adduc("cpp_tls_handshake", "seconds", v, t)
+
         t = "number of 403/422/malicious reqs since restart"
         addc("cpp_sus_reqs", str(self.hsrv.nsus), t)
 
@@ -87,6 +101,29 @@ class Metrics(object):
         t = "number of IPs banned since last restart"
         addg("cpp_total_bans", str(self.hsrv.nban), t)
 
+        if args.j != 1:
+            x = self.hsrv.broker.ask("broker.get_ipc_stats")
+            stats = sorted(x.get().items())
+            if stats:
+                t = "number of calls from worker processes into the main process"
+                addh("cpp_ipc_calls", "counter", t)
+                for k, (n, _, _) in stats:
+                    addv('cpp_ipc_calls_total{dest="%s"}' % (k,), str(int(n)))
+
+                t = "time spent on those calls (incl. waiting for a free thread)"
+                addh("cpp_ipc_seconds", "counter", t)
+                for k, (_, td, _) in stats:
+                    addv('cpp_ipc_seconds_total{dest="%s"}' % (k,), "%.3f" % (td,))
+
+                t = "slowest call since last restart"
+                addh("cpp_ipc_max_seconds", "gauge", t)
+                for k, (_, _, td) in stats:
+                    addv('cpp_ipc_max_seconds{dest="%s"}' % (k,), "%.3f" % (td,))
+
+        t = "number of log messages dropped due to a full log queue (--log-q)"
+        v = str(self.hsrv.broker.ask("get_log_drops").get())
+        addc("cpp_log_dropped", v, t)
+
         if not args.nos_vst:
             x = self.hsrv.broker.ask("up2k.get_state", True, "")
             vs = json.loads(x.get())
@@ -124,6 +161,26 @@ class Metrics(object):
             except:
                 pass
 
+            x = self.hsrv.broker.ask("up2k.get_lock_stats")
+            stats = x.get()
+            vps = {vol.realpath: vpath for vpath, vol in allvols}
+            lks = []
+            for k, v in sorted(stats.items()):
+                if k in ("main", "reg"):
+                    lks.append(('lock="%s"' % (k,), v))
+                elif k in vps:
+                    lks.append(('lock="vol",vol="/%s"' % (vps[k],), v))
+
+            t = "time spent waiting for up2k locks (main, registry, per-volume)"
+            addh("cpp_lock_wait_seconds", "counter", t)
+            for k, (_, td, _) in lks:
+                addv("cpp_lock_wait_seconds_total{%s}" % (k,), "%.3f" % (td,))
+
+            t = "longest wait for each up2k lock since last restart"
+            addh("cpp_lock_max_wait_seconds", "gauge", t)
+            for k, (_, _, td) in lks:
+                addv("cpp_lock_max_wait_seconds{%s}" % (k,), "%.3f" % (td,))
+
         if not args.nos_hdd:
             addbh("cpp_disk_size_bytes", "total HDD size of volume")
             addbh("cpp_disk_free_bytes", "free HDD space in volume")
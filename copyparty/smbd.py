@@ -12,6 +12,7 @@ from types import SimpleNamespace
 from .__init__ import ANYWIN, EXE, TYPE_CHECKING
 from .authsrv import LEELOO_DALLAS, VFS
 from .bos import bos
+from .up2k import ChunkHasher
 from .util import Daemon, absreal, min_ex, pybin, runhook, vjoin
 
 if True:  # pylint: disable=using-constant-test
@@ -32,6 +33,7 @@ class SMB(object):
         self.asrv = hub.asrv
         self.log = hub.log
         self.files: dict[int, tuple[float, str]] = {}
+        self.u2h: dict[int, ChunkHasher] = {}  # hashers of files being written
         self.noacc = self.args.smba
         self.accs = not self.args.smba
 
@@ -68,6 +70,7 @@ class SMB(object):
         fos.stat = self._stat
         fos.unlink = self._unlink
         fos.utime = self._utime
+        fos.write = self._write
         smbserver.os = fos
 
         # ...and smbserver.os.path
@@ -273,14 +276,42 @@ class SMB(object):
                 oldest = min([x[0] for x in self.files.values()])
                 cutoff = oldest + (now - oldest) / 2
                 self.files = {k: v for k, v in self.files.items() if v[0] > cutoff}
+                self.u2h = {k: v for k, v in self.u2h.items() if k in self.files}
                 info("was tracking %d files, now %d", nf, len(self.files))
 
             vpath = vpath.replace("\\", "/").lstrip("/")
             self.files[ret] = (now, vpath)
+            if "e2d" in vfs.flags:
+                self.u2h[ret] = ChunkHasher()
 
         return ret
 
+    def _write(self, fd: int, buf: bytes) -> int:
+        u2h = self.u2h.get(fd)
+        if not u2h or not u2h.ok:
+            return os.write(fd, buf)
+
+        # smbserver does lseek+write; only sequential writes can be hashed
+        ofs = os.lseek(fd, 0, os.SEEK_CUR)
+        ret = os.write(fd, buf)
+        if ofs and not u2h.sz and buf == b"\0":
+            # set-end-of-file (windows does that before copying);
+            # smbserver writes the last byte, so now we know the size
+            u2h.hint(ofs + 1)
+            return ret
+
+        u2h.update_at(ofs, buf[:ret])
+        return ret
+
     def _close(self, fd: int) -> None:
+        hashes = None
+        u2h = self.u2h.pop(fd, None)
+        if u2h and u2h.ok:
+            try:
+                hashes = u2h.finish(os.fstat(fd).st_size)
+            except:
+                pass
+
         os.close(fd)
         if fd not in self.files:
             return
@@ -298,6 +329,8 @@ class SMB(object):
             "1.7.6.2",
             time.time(),
             "",
+            False,
+            hashes,
         )
 
     def _rename(self, vp1: str, vp2: str) -> None:
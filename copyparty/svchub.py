@@ -2,6 +2,7 @@
 from __future__ import print_function, unicode_literals
 
 import argparse
+import atexit
 import errno
 import gzip
 import logging
@@ -14,6 +15,7 @@ import string
 import sys
 import threading
 import time
+from collections import deque
 from datetime import datetime
 
 # from inspect import currentframe
@@ -44,12 +46,15 @@ from .th_srv import (
 )
 from .up2k import Up2k
 from .util import (
+    CMP_ENCS,
     DEF_EXP,
     DEF_MTE,
     DEF_MTH,
     FFMPEG_URL,
+    HAVE_BROTLI,
     HAVE_PSUTIL,
     HAVE_SQLITE3,
+    HAVE_ZSTD,
     UTC,
     VERSIONS,
     Daemon,
@@ -60,6 +65,7 @@ from .util import (
     alltrace,
     ansi_re,
     build_netmap,
+    cmp_avail,
     load_ipu,
     min_ex,
     mp,
@@ -119,6 +125,14 @@ class SvcHub(object):
         self.httpsrv_up = 0
 
         self.log_mutex = threading.Lock()
+        self.log_dq: Optional[deque[tuple[Any, ...]]] = None
+        self.log_ev = threading.Event()
+        self.log_idle = False
+        self.log_buf: list[str] = []
+        self.log_fbuf: list[str] = []
+        self.log_nbuf = 0
+        self.nlog_drop = 0
+        self.nlog_drop_rep = 0
         self.cday = 0
         self.cmon = 0
         self.tstack = 0.0
@@ -191,10 +205,19 @@ class SvcHub(object):
             self.log("root", t.format(args.j), c=3)
             args.no_fpool = True
 
+        if not ANYWIN and args.reuseport and (
+            MACOS or not hasattr(socket, "SO_REUSEPORT") or args.j == 1
+        ):
+            if args.j != 1:
+                t = "WARNING: ignoring --reuseport; not supported on this platform"
+                self.log("root", t, c=3)
+            args.reuseport = False
+
         for name, arg in (
             ("iobuf", "iobuf"),
             ("s-rd-sz", "s_rd_sz"),
             ("s-wr-sz", "s_wr_sz"),
+            ("hash-rd-sz", "hash_rd_sz"),
         ):
             zi = getattr(args, arg)
             if zi < 32768:
@@ -622,6 +645,8 @@ class SvcHub(object):
             (HAVE_ARGON2, "argon2", "secure password hashing (advanced users only)"),
             (HAVE_HEIF, "pillow-heif", "read .heif images with pillow (rarely useful)"),
             (HAVE_AVIF, "pillow-avif", "read .avif images with pillow (rarely useful)"),
+            (HAVE_ZSTD, "zstd", "compress listings/search-results with zstd"),
+            (HAVE_BROTLI, "brotli", "compress listings/search-results with brotli"),
         ]
         if ANYWIN:
             to_check += [
@@ -723,6 +748,13 @@ class SvcHub(object):
         al.th_covers_set = set(al.th_covers)
         al.th_coversd_set = set(al.th_coversd)
 
+        zsl = [x.strip() for x in al.cmp_enc.lower().split(",")]
+        zsl = [x for x in zsl if x]
+        for zs in zsl:
+            if zs not in CMP_ENCS:
+                raise Exception("invalid --cmp-enc [%s]; expected %s" % (zs, CMP_ENCS))
+        al.cmp_enc = [x for x in zsl if x in cmp_avail()]
+
         for k in "c".split(" "):
             vl = getattr(al, k)
             if not vl:
@@ -913,6 +945,12 @@ class SvcHub(object):
         print(msg, end="")
 
     def run(self) -> None:
+        if self.args.log_q > 0:
+            # startup is done; log from a background thread from now on
+            self.log_dq = deque()
+            Daemon(self._log_thr, "logwriter")
+            atexit.register(self._log_stop)
+
         self.tcpsrv.run()
         if getattr(self.args, "z_chk", 0) and (
             getattr(self.args, "zm", False) or getattr(self.args, "zs", False)
@@ -1126,6 +1164,7 @@ class SvcHub(object):
                 sys.stderr.flush()
 
             self.pr("\033[0m", end="")
+            self._log_stop()
             if self.logf:
                 self.logf.close()
 
@@ -1136,78 +1175,74 @@ class SvcHub(object):
         if not self.logf:
             return
 
-        with self.log_mutex:
-            dt = datetime.now(self.tz)
-            ts = self.log_dfmt % (
-                dt.year,
-                dt.month * 100 + dt.day,
-                (dt.hour * 100 + dt.minute) * 100 + dt.second,
-                dt.microsecond // self.log_div,
-            )
-
-            if c and not self.args.no_ansi:
-                if isinstance(c, int):
-                    msg = "\033[3%sm%s\033[0m" % (c, msg)
-                elif "\033" not in c:
-                    msg = "\033[%sm%s\033[0m" % (c, msg)
-                else:
-                    msg = "%s%s\033[0m" % (c, msg)
-
-            if "\033" in src:
-                src += "\033[0m"
-
-            if "\033" in msg:
-                msg += "\033[0m"
+        self._log(self._fmt_disabled, src, msg, c)
 
-            self.logf.write("@%s [%-21s] %s\n" % (ts, src, msg))
-            if not self.args.no_logflush:
-                self.logf.flush()
+    def _log_enabled(self, src: str, msg: str, c: Union[int, str] = 0) -> None:
+        """handles logging from all components"""
+        self._log(self._fmt_enabled, src, msg, c)
 
-            if dt.day != self.cday or dt.month != self.cmon:
-                self._set_next_day(dt)
+    def _log(self, fmt: Any, src: str, msg: str, c: Union[int, str]) -> None:
+        dq = self.log_dq
+        if dq is None:
+            with self.log_mutex:
+                fmt(time.time(), src, msg, c)
+                self._log_flush()
+            return
 
-    def _set_next_day(self, dt: datetime) -> None:
-        if self.cday and self.logf and self.logf_base_fn != self._logname():
-            self.logf.close()
-            self._setup_logfile("")
+        # no locking here; the writer-thread does the rest
+        if len(dq) >= self.args.log_q:
+            self.nlog_drop += 1
+            return
 
-        self.cday = dt.day
-        self.cmon = dt.month
+        dq.append((fmt, time.time(), src, msg, c))
+        if self.log_idle:
+            self.log_ev.set()
+
+    def _log_thr(self) -> None:
+        dq = self.log_dq
+        while dq is self.log_dq:
+            if not dq:
+                self.log_ev.clear()
+                self.log_idle = True
+                if not dq:
+                    self.log_ev.wait(1)
+                self.log_idle = False
+                continue
 
-    def _log_enabled(self, src: str, msg: str, c: Union[int, str] = 0) -> None:
-        """handles logging from all components"""
+            with self.log_mutex:
+                self._log_drain()
+
+    def _log_drain(self) -> None:
+        """format and write everything in the queue; must hold log_mutex"""
+        dq = self.log_dq
+        if dq:
+            for _ in range(len(dq)):
+                fmt, ts, src, msg, c = dq.popleft()
+                fmt(ts, src, msg, c)
+                if self.log_nbuf > 65536:
+                    self._log_flush()
+
+        ndrop = self.nlog_drop - self.nlog_drop_rep
+        if ndrop:
+            self.nlog_drop_rep += ndrop
+            t = "log queue was full (--log-q); dropped %d messages" % (ndrop,)
+            fmt = self._fmt_disabled if self.args.q else self._fmt_enabled
+            fmt(time.time(), "root", t, 3)
+
+        self._log_flush()
+
+    def _log_stop(self) -> None:
+        """go back to synchronous logging, writing anything still queued"""
         with self.log_mutex:
-            dt = datetime.now(self.tz)
-            if dt.day != self.cday or dt.month != self.cmon:
-                zs = "{}\n" if self.no_ansi else "\033[36m{}\033[0m\n"
-                zs = zs.format(dt.strftime("%Y-%m-%d"))
-                print(zs, end="")
-                self._set_next_day(dt)
-                if self.logf:
-                    self.logf.write(zs)
-
-            fmt = "\033[36m%s \033[33m%-21s \033[0m%s\n"
-            if self.no_ansi:
-                fmt = "%s %-21s %s\n"
-                if "\033" in msg:
-                    msg = ansi_re.sub("", msg)
-                if "\033" in src:
-                    src = ansi_re.sub("", src)
-            elif c:
-                if isinstance(c, int):
-                    msg = "\033[3%sm%s\033[0m" % (c, msg)
-                elif "\033" not in c:
-                    msg = "\033[%sm%s\033[0m" % (c, msg)
-                else:
-                    msg = "%s%s\033[0m" % (c, msg)
-
-            ts = self.log_efmt % (
-                dt.hour,
-                dt.minute,
-                dt.second,
-                dt.microsecond // self.log_div,
-            )
-            msg = fmt % (ts, src, msg)
+            self._log_drain()
+            self.log_dq = None
+            self.log_ev.set()
+
+    def _log_flush(self) -> None:
+        """write buffered lines to stdout/logfile; must hold log_mutex"""
+        if self.log_buf:
+            msg = "".join(self.log_buf)
+            self.log_buf = []
             try:
                 print(msg, end="")
             except UnicodeEncodeError:
@@ -1219,14 +1254,100 @@ class SvcHub(object):
                 if ex.errno != errno.EPIPE:
                     raise
 
+        if self.log_fbuf:
+            msg = "".join(self.log_fbuf)
+            self.log_fbuf = []
             if self.logf:
                 self.logf.write(msg)
                 if not self.args.no_logflush:
                     self.logf.flush()
 
+        self.log_nbuf = 0
+
+    def get_log_drops(self) -> int:
+        return self.nlog_drop
+
+    def _fmt_disabled(self, ts: float, src: str, msg: str, c: Union[int, str]) -> None:
+        dt = datetime.fromtimestamp(ts, self.tz)
+        zs = self.log_dfmt % (
+            dt.year,
+            dt.month * 100 + dt.day,
+            (dt.hour * 100 + dt.minute) * 100 + dt.second,
+            dt.microsecond // self.log_div,
+        )
+
+        if c and not self.args.no_ansi:
+            if isinstance(c, int):
+                msg = "\033[3%sm%s\033[0m" % (c, msg)
+            elif "\033" not in c:
+                msg = "\033[%sm%s\033[0m" % (c, msg)
+            else:
+                msg = "%s%s\033[0m" % (c, msg)
+
+        if "\033" in src:
+            src += "\033[0m"
+
+        if "\033" in msg:
+            msg += "\033[0m"
+
+        msg = "@%s [%-21s] %s\n" % (zs, src, msg)
+        self.log_fbuf.append(msg)
+        self.log_nbuf += len(msg)
+
+        if dt.day != self.cday or dt.month != self.cmon:
+            self._log_flush()
+            self._set_next_day(dt)
+
+    def _set_next_day(self, dt: datetime) -> None:
+        if self.cday and self.logf and self.logf_base_fn != self._logname():
+            self.logf.close()
+            self._setup_logfile("")
+
+        self.cday = dt.day
+        self.cmon = dt.month
+
+    def _fmt_enabled(self, ts: float, src: str, msg: str, c: Union[int, str]) -> None:
+        dt = datetime.fromtimestamp(ts, self.tz)
+        if dt.day != self.cday or dt.month != self.cmon:
+            self._log_flush()
+            zs = "{}\n" if self.no_ansi else "\033[36m{}\033[0m\n"
+            zs = zs.format(dt.strftime("%Y-%m-%d"))
+            print(zs, end="")
+            self._set_next_day(dt)
+            if self.logf:
+                self.logf.write(zs)
+
+        fmt = "\033[36m%s \033[33m%-21s \033[0m%s\n"
+        if self.no_ansi:
+            fmt = "%s %-21s %s\n"
+            if "\033" in msg:
+                msg = ansi_re.sub("", msg)
+            if "\033" in src:
+                src = ansi_re.sub("", src)
+        elif c:
+            if isinstance(c, int):
+                msg = "\033[3%sm%s\033[0m" % (c, msg)
+            elif "\033" not in c:
+                msg = "\033[%sm%s\033[0m" % (c, msg)
+            else:
+                msg = "%s%s\033[0m" % (c, msg)
+
+        zs = self.log_efmt % (
+            dt.hour,
+            dt.minute,
+            dt.second,
+            dt.microsecond // self.log_div,
+        )
+        msg = fmt % (zs, src, msg)
+        self.log_buf.append(msg)
+        self.log_nbuf += len(msg)
+        if self.logf:
+            self.log_fbuf.append(msg)
+
     def pr(self, *a: Any, **ka: Any) -> None:
         try:
             with self.log_mutex:
+                self._log_drain()
                 print(*a, **ka)
         except OSError as ex:
             if ex.errno != errno.EPIPE:
@@ -358,6 +358,11 @@ class TcpSrv(object):
                 self.log("tcpsrv", t.format(port, ip), 1)
                 raise
 
+            if tcp and not ANYWIN and self.args.reuseport:
+                # each mp worker binds its own socket next to this one;
+                # not until now, so the dualstack detection above still works
+                srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+
             bound.append((ip, port))
             srvs.append(srv)
             fno = srv.fileno()
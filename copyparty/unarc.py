@@ -0,0 +1,259 @@
+# coding: utf-8
+from __future__ import print_function, unicode_literals
+
+import tarfile
+import zlib
+
+from .szip import dostime2unix
+from .util import Pebkac, sunpack
+
+if True:  # pylint: disable=using-constant-test
+    import typing
+    from typing import Generator, Optional, Union
+
+    from .util import NamedLogger
+
+
+class BodyReader(object):
+    """file-like reader on top of a request-body generator"""
+
+    def __init__(
+        self, gen: Generator[Union[bytes, memoryview], None, None]
+    ) -> None:
+        self.gen = gen
+        self.buf: Union[bytes, memoryview] = b""
+        self.ofs = 0
+        self.nbyte = 0  # consumed from gen
+
+    def read(self, sz: int = -1) -> bytes:
+        ret = []
+        while sz:
+            if self.ofs >= len(self.buf):
+                if ret:
+                    # the next buf may overwrite this one (recv_mv)
+                    ret = [b"".join(ret)]
+                self.ofs = 0
+                self.buf = next(self.gen, b"")
+                if not self.buf:
+                    break
+                self.nbyte += len(self.buf)
+
+            if sz < 0:
+                zb = self.buf[self.ofs :]
+            else:
+                zb = self.buf[self.ofs : self.ofs + sz]
+                sz -= len(zb)
+
+            self.ofs += len(zb)
+            ret.append(zb)
+
+        return b"".join(ret)
+
+    def unread(self, buf: bytes) -> None:
+        if buf:
+            self.buf = buf + bytes(self.buf[self.ofs :])
+            self.ofs = 0
+
+    def peek(self, sz: int) -> bytes:
+        ret = self.read(sz)
+        self.unread(ret)
+        return ret
+
+    def drain(self) -> int:
+        ret = 0
+        while True:
+            zb = self.read(256 * 1024)
+            if not zb:
+                return ret
+            ret += len(zb)
+
+
+def unarc(
+    log: "NamedLogger", reader: BodyReader
+) -> Generator[tuple[str, float, Optional[Generator[bytes, None, None]]], None, None]:
+    """
+    autodetect the archive format (zip, or tar with optional gz/bz2/xz)
+    and yield (path, lastmod, contents) for each entry as it arrives,
+    contents being None for folders; the contents of each file must be
+    consumed (or discarded) before the next entry is requested
+    """
+    magic = reader.peek(4)
+    if magic == b"PK\x05\x06":
+        # end-of-central-directory right away; an empty zip
+        log("unarc: empty zip file")
+        reader.drain()
+        return
+
+    if magic == b"PK\x03\x04":
+        gen = unzip(log, reader)
+    else:
+        gen = untar(log, reader)
+
+    for ent in gen:
+        yield ent
+
+    reader.drain()
+
+
+def untar(
+    log: "NamedLogger", reader: BodyReader
+) -> Generator[tuple[str, float, Optional[Generator[bytes, None, None]]], None, None]:
+    try:
+        tf = tarfile.open(fileobj=reader, mode="r|*")  # type: ignore
+    except tarfile.TarError as ex:
+        raise Pebkac(400, "not a tar or zip file: %r" % (ex,))
+
+    with tf:
+        while True:
+            try:
+                ti = tf.next()
+            except tarfile.TarError as ex:
+                raise Pebkac(400, "bad tar file: %r" % (ex,))
+
+            if not ti:
+                return
+
+            # stream-mode; nothing to seek back to, so don't hoard members
+            tf.members = []
+
+            if ti.isdir():
+                yield ti.name, ti.mtime, None
+            elif ti.isreg():
+                f = tf.extractfile(ti)
+                assert f  # !rm
+                yield ti.name, ti.mtime, _ftar(f)
+            else:
+                log("unarc: skipping non-file %r (tar type %r)" % (ti.name, ti.type), 3)
+
+
+def _ftar(f: typing.IO[bytes]) -> Generator[bytes, None, None]:
+    try:
+        while True:
+            zb = f.read(256 * 1024)
+            if not zb:
+                return
+            yield zb
+    except (tarfile.TarError, EOFError, OSError) as ex:
+        raise Pebkac(400, "truncated/bad tar file: %r" % (ex,))
+
+
+def unzip(
+    log: "NamedLogger", reader: BodyReader
+) -> Generator[tuple[str, float, Optional[Generator[bytes, None, None]]], None, None]:
+    """
+    reads the local file headers only, so entries must either have
+    their sizes in the header, or be deflated (self-terminating);
+    stops at the central directory (which is discarded)
+    """
+    while True:
+        magic = reader.read(4)
+        if magic in (b"PK\x01\x02", b"PK\x05\x06", b"PK\x06\x06", b""):
+            return
+
+        if magic != b"PK\x03\x04":
+            raise Pebkac(400, "bad zip file; expected a file header")
+
+        hdr = reader.read(26)
+        if len(hdr) < 26:
+            raise Pebkac(400, "truncated zip file")
+
+        _, bits, cmp, dostime, crc, csz, usz, nfn, nex = sunpack(b"<HHH4sLLLHH", hdr)
+        bfn = reader.read(nfn)
+        ext = reader.read(nex)
+        fn = bfn.decode("utf-8" if bits & 0x800 else "cp437", "replace")
+
+        if bits & 1:
+            raise Pebkac(400, "encrypted zip files are not supported: %r" % (fn,))
+
+        try:
+            lastmod = float(dostime2unix(dostime))
+        except:
+            lastmod = 0.0
+
+        z64 = False
+        ofs = 0
+        while ofs + 4 <= len(ext):
+            eid, esz = sunpack(b"<HH", ext[ofs : ofs + 4])
+            ebuf = ext[ofs + 4 : ofs + 4 + esz]
+            ofs += 4 + esz
+            if eid == 1:
+                # zip64; only the fields which overflowed are present
+                z64 = True
+                zi = 0
+                if usz == 0xFFFFFFFF and len(ebuf) >= zi + 8:
+                    usz = sunpack(b"<Q", ebuf[zi : zi + 8])[0]
+                    zi += 8
+                if csz == 0xFFFFFFFF and len(ebuf) >= zi + 8:
+                    csz = sunpack(b"<Q", ebuf[zi : zi + 8])[0]
+            elif eid == 0x5455 and len(ebuf) >= 5 and ord(ebuf[:1]) & 1:
+                lastmod = float(sunpack(b"<l", ebuf[1:5])[0])
+            elif eid == 0xD and len(ebuf) >= 8:
+                lastmod = float(sunpack(b"<L", ebuf[4:8])[0])
+
+        if cmp not in (0, 8):
+            t = "unsupported compression (type %d) in zip file: %r"
+            raise Pebkac(400, t % (cmp, fn))
+
+        if cmp == 0 and bits & 8 and not csz:
+            # size unknown until the data descriptor; only ok if empty
+            if reader.peek(4) != b"PK\x07\x08":
+                t = "cannot stream-extract this zip file; "
+                t += "it has an uncompressed entry without a size: %r"
+                raise Pebkac(400, t % (fn,))
+
+        gen = _fzip(reader, fn, cmp, csz, crc, bits)
+        yield fn, lastmod, (None if fn.endswith("/") else gen)
+
+        for _ in gen:
+            pass  # discard whatever the consumer didn't want
+
+        if bits & 8:
+            # data descriptor; magic is optional
+            zb = reader.read(4)
+            if zb != b"PK\x07\x08":
+                reader.unread(zb)
+            reader.read(20 if z64 else 12)
+
+
+def _fzip(
+    reader: BodyReader, fn: str, cmp: int, csz: int, crc: int, bits: int
+) -> Generator[bytes, None, None]:
+    fcrc = 0
+    if cmp == 0:
+        rem = csz
+        while rem:
+            zb = reader.read(min(rem, 256 * 1024))
+            if not zb:
+                raise Pebkac(400, "truncated zip file: %r" % (fn,))
+            rem -= len(zb)
+            fcrc = zlib.crc32(zb, fcrc)
+            yield zb
+    else:
+        dec = zlib.decompressobj(-15)
+        zb = b""
+        while not dec.eof:
+            if not zb:
+                zb = reader.read(64 * 1024)
+                if not zb:
+                    raise Pebkac(400, "truncated zip file: %r" % (fn,))
+            try:
+                # bounded output; a zipbomb shall not eat all the ram
+                buf = dec.decompress(zb, 1024 * 1024)
+            except zlib.error as ex:
+                raise Pebkac(400, "bad deflate stream in %r: %r" % (fn, ex))
+            zb = dec.unconsumed_tail
+            if buf:
+                fcrc = zlib.crc32(buf, fcrc)
+                yield buf
+
+        reader.unread(dec.unused_data)
+
+    if bits & 8:
+        # crc is in the data descriptor; peek it
+        zb = reader.peek(8)
+        if zb[:4] == b"PK\x07\x08":
+            zb = zb[4:]
+        crc = sunpack(b"<L", zb[:4])[0] if len(zb) >= 4 else fcrc
+
+    if (fcrc & 0xFFFFFFFF) != crc:
+        raise Pebkac(400, "crc32 mismatch in zip file: %r" % (fn,))
@@ -15,6 +15,7 @@ import tempfile
 import threading
 import time
 import traceback
+from collections import deque
 from copy import deepcopy
 
 from queue import Queue
@@ -33,6 +34,7 @@ from .util import (
     MTHash,
     Pebkac,
     ProgressPrinter,
+    StatLock,
     absreal,
     alltrace,
     atomic_move,
@@ -48,6 +50,7 @@ from .util import (
     pathmod,
     quotep,
     rand_name,
+    reflink,
     ren_open,
     rmdirs,
     rmdirs_up,
@@ -60,6 +63,7 @@ from .util import (
     sfsenc,
     spack,
     statdir,
+    ub64dec,
     ub64enc,
     unhumanize,
     vjoin,
@@ -80,9 +84,10 @@ if HAVE_SQLITE3:
 DB_VER = 5
 
 if True:  # pylint: disable=using-constant-test
-    from typing import Any, Optional, Pattern, Union
+    from typing import IO, Any, Iterable, Iterator, Optional, Pattern, Union
 
 if TYPE_CHECKING:
+    from .inotify import Inotify
     from .svchub import SvcHub
 
 zsg = "avif,avifs,bmp,gif,heic,heics,heif,heifs,ico,j2p,j2k,jp2,jpeg,jpg,jpx,png,tga,tif,tiff,webp"
@@ -99,6 +104,117 @@ class Dbw(object):
         self.t = t
 
 
+class IdxPool(object):
+    """
+    helpers for indexing one volume (_build_dir); scanners read folders
+    ahead of the walker, and hashers take the new/changed files, while
+    the walker remains the only thread using the db, collecting
+    finished hashes now and then to insert them in batches
+    """
+
+    def __init__(self, up2k: "Up2k", nthr: int) -> None:
+        self.up2k = up2k
+        self.nthr = nthr
+        self.end = False
+        self.npend = 0  # hash-tasks not yet collected
+        self.hash_q: Queue[Optional[tuple[Any, ...]]] = Queue(nthr * 8)
+        self.done_q: Queue[tuple[tuple[Any, ...], list[str]]] = Queue()
+        self.scan_q: Queue[Optional[str]] = Queue()
+        self.dirs: dict[str, Optional[list[tuple[str, os.stat_result]]]] = {}
+        self.dirs_cond = threading.Condition()
+        self.running = False  # threads are started when first needed
+
+    def _start(self) -> None:
+        self.running = True
+        for n in range(self.nthr):
+            Daemon(self._hasher, "up2k-idx-hash-%d" % (n,))
+            Daemon(self._scanner, "up2k-idx-scan-%d" % (n,))
+
+    def shutdown(self) -> None:
+        self.end = True
+        if not self.running:
+            return
+
+        for _ in range(self.nthr):
+            self.hash_q.put(None)
+            self.scan_q.put(None)
+
+    def prefetch(self, cdirs: list[str]) -> None:
+        if cdirs and not self.running:
+            self._start()
+
+        with self.dirs_cond:
+            for cdir in cdirs:
+                if cdir not in self.dirs:
+                    self.dirs[cdir] = None
+                    self.scan_q.put(cdir)
+
+    def listdir(self, cdir: str) -> Optional[list[tuple[str, os.stat_result]]]:
+        """the prefetched contents of cdir, or None if it wasn't"""
+        with self.dirs_cond:
+            if cdir not in self.dirs:
+                return None
+
+            while self.dirs[cdir] is None:
+                self.dirs_cond.wait()
+
+            return self.dirs.pop(cdir)
+
+    def _scanner(self) -> None:
+        u2k = self.up2k
+        while True:
+            cdir = self.scan_q.get()
+            if cdir is None:
+                return
+
+            ret = []
+            if not self.end:
+                g = statdir(u2k.log_func, not u2k.args.no_scandir, True, cdir)
+                try:
+                    ret = sorted(g)
+                except:
+                    pass  # statdir logs
+
+            with self.dirs_cond:
+                self.dirs[cdir] = ret
+                self.dirs_cond.notify_all()
+
+    def hash(self, db: Dbw, task: tuple[Any, ...]) -> None:
+        """queue a file to hash; task = (rd, fn, abspath, sz, ...)"""
+        if not self.running:
+            self._start()
+
+        self.collect(db, False)
+        self.npend += 1
+        self.hash_q.put(task)
+
+    def collect(self, db: Dbw, wait: bool) -> None:
+        """index the files which are done hashing; wait for all if wait"""
+        while self.npend and (wait or self.done_q.qsize()):
+            task, hashes = self.done_q.get()
+            self.npend -= 1
+            self.up2k._idx_hashed(db, task, hashes)
+
+    def _hasher(self) -> None:
+        u2k = self.up2k
+        while True:
+            task = self.hash_q.get()
+            if task is None:
+                return
+
+            hashes: list[str] = []
+            abspath = task[2]
+            if not self.end:
+                try:
+                    pp = u2k.pp
+                    zs = "a%d, " % (pp.n,) if pp else ""
+                    hashes, _ = u2k._hashlist_from_file(abspath, zs)
+                except Exception as ex:
+                    u2k.log("hash: {} @ [{}]".format(repr(ex), abspath))
+
+            self.done_q.put((task, hashes))
+
+
 class Mpqe(object):
     """pending files to tag-scan"""
 
@@ -118,6 +234,178 @@ class Mpqe(object):
         self.oth_tags = oth_tags
 
 
+class HashList(object):
+    """
+    chunk-hashes of an upload (job hash/need) as 33-byte digests packed
+    into one bytearray, rather than a list of 44-char strings at ~100
+    bytes each; quacks enough like that list for the registry's needs
+    """
+
+    __slots__ = ("buf",)
+
+    def __init__(self, hashes: Iterable[str] = ()) -> None:
+        if isinstance(hashes, HashList):
+            self.buf = bytearray(hashes.buf)
+            return
+
+        hashes = list(hashes)
+        try:
+            zs = "".join(hashes)
+            buf = ub64dec(zs.encode("ascii"))
+            if len(zs) != 44 * len(hashes) or len(buf) != 33 * len(hashes):
+                raise Exception()
+        except:
+            raise Pebkac(400, "at least one hash is not according to spec")
+
+        self.buf = bytearray(buf)
+
+    def __len__(self) -> int:
+        return len(self.buf) // 33
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.tolist())
+
+    def __repr__(self) -> str:
+        return repr(self.tolist())
+
+    def __deepcopy__(self, memo: Any) -> "HashList":
+        return HashList(self)
+
+    def __getitem__(self, n: int) -> str:
+        if n < 0:
+            n += len(self)
+        zb = self.buf[n * 33 : n * 33 + 33]
+        if n < 0 or not zb:
+            raise IndexError("HashList index out of range")
+        return ub64enc(bytes(zb)).decode("ascii")
+
+    def __contains__(self, chash: str) -> bool:
+        return self._find(chash) >= 0
+
+    def _find(self, chash: str) -> int:
+        try:
+            zb = ub64dec(chash.encode("ascii"))
+            if len(chash) != 44 or len(zb) != 33:
+                return -1
+        except:
+            return -1
+
+        buf = self.buf
+        ofs = buf.find(zb)
+        while ofs > 0 and ofs % 33:
+            ofs = buf.find(zb, ofs + 1)
+        return ofs
+
+    def tolist(self) -> list[str]:
+        zs = ub64enc(bytes(self.buf)).decode("ascii")
+        return [zs[n : n + 44] for n in range(0, len(zs), 44)]
+
+    def index(self, chash: str) -> int:
+        ofs = self._find(chash)
+        if ofs < 0:
+            raise ValueError("%s is not in HashList" % (chash,))
+        return ofs // 33
+
+    def remove(self, chash: str) -> None:
+        ofs = self.index(chash) * 33
+        del self.buf[ofs : ofs + 33]
+
+
+class RegMutex(object):
+    """
+    guards Up2k.registry; taking this takes every volume's lock,
+    but code which only touches one volume's uploads (the chunk
+    receiver) can take just that volume's lock with vol(ptop),
+    so uploads into different volumes don't wait for each other
+
+    lock order: Up2k.mutex, RegMutex, then volume locks sorted by
+    ptop (RegMutex does that); never hold two volume locks otherwise
+    """
+
+    def __init__(self) -> None:
+        self.lk = threading.Lock()  # one RegMutex holder at a time
+        self.mutex = threading.Lock()  # guards vols, held
+        self.vols: dict[str, StatLock] = {}
+        self.held: Optional[list[StatLock]] = None
+        self.n = 0  # num acquired
+        self.tw = 0.0  # total wait
+        self.tmax = 0.0  # max wait
+
+    def vol(self, ptop: str) -> StatLock:
+        try:
+            return self.vols[ptop]
+        except KeyError:
+            pass
+
+        with self.mutex:
+            vl = self.vols.get(ptop)
+            if not vl:
+                vl = self.vols[ptop] = StatLock()
+                if self.held is not None:
+                    # RegMutex is held or being taken; include this one
+                    vl.lk.acquire()
+                    self.held.append(vl)
+            return vl
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        t0 = time.time()
+        if timeout < 0:
+            ok = self.lk.acquire(blocking)
+        else:
+            ok = self.lk.acquire(blocking, timeout)
+
+        if not ok:
+            return False
+
+        with self.mutex:
+            self.held = held = []
+            vls = [x[1] for x in sorted(self.vols.items())]
+
+        for vl in vls:
+            if not blocking:
+                ok = vl.lk.acquire(False)
+            elif timeout < 0:
+                ok = vl.lk.acquire()
+            else:
+                ok = vl.lk.acquire(True, max(0, t0 + timeout - time.time()))
+
+            if not ok:
+                self.release()
+                return False
+
+            held.append(vl)
+
+        td = time.time() - t0
+        self.n += 1
+        self.tw += td
+        if self.tmax < td:
+            self.tmax = td
+
+        return True
+
+    def release(self) -> None:
+        with self.mutex:
+            held = self.held or []
+            self.held = None
+
+        for vl in held:
+            vl.lk.release()
+
+        self.lk.release()
+
+    def stats(self) -> dict[str, list[float]]:
+        ret = {k: v.stats() for k, v in list(self.vols.items())}
+        ret["reg"] = [self.n, self.tw, self.tmax]
+        return ret
+
+    def __enter__(self) -> "RegMutex":
+        self.acquire()
+        return self
+
+    def __exit__(self, *a: Any) -> None:
+        self.release()
+
+
 class Up2k(object):
     def __init__(self, hub: "SvcHub") -> None:
         self.hub = hub
@@ -130,14 +418,16 @@ class Up2k(object):
 
         self.gid = 0
         self.stop = False
-        self.mutex = threading.Lock()
+        self.mutex = StatLock()
         self.blocked: Optional[str] = None
         self.pp: Optional[ProgressPrinter] = None
         self.rescan_cond = threading.Condition()
         self.need_rescan: set[str] = set()
         self.db_act = 0.0
+        self.ino: Optional["Inotify"] = None
+        self.ino_mutex = threading.Lock()
 
-        self.reg_mutex = threading.Lock()
+        self.reg_mutex = RegMutex()
         self.registry: dict[str, dict[str, dict[str, Any]]] = {}
         self.flags: dict[str, dict[str, Any]] = {}
         self.droppable: dict[str, list[str]] = {}
@@ -148,17 +438,24 @@ class Up2k(object):
         self.busy_aps: dict[str, int] = {}
         self.dupesched: dict[str, list[tuple[str, str, float]]] = {}
         self.snap_prev: dict[str, Optional[tuple[int, float]]] = {}
+        self.snap_mutex = threading.Lock()
+        self.jnl: dict[str, IO[bytes]] = {}
+        self.jnl_n: dict[str, int] = {}
 
         self.mtag: Optional[MTag] = None
         self.entags: dict[str, set[str]] = {}
         self.mtp_parsers: dict[str, dict[str, MParser]] = {}
         self.pending_tags: list[tuple[set[str], str, str, dict[str, Any]]] = []
-        self.hashq: Queue[
-            tuple[str, str, dict[str, Any], str, str, str, float, str, bool]
-        ] = Queue()
+        # hash_file tasks, grouped by volume (or device); see _hasher
+        self.hashq: dict[str, deque[tuple[Any, ...]]] = {}
+        self.hashq_rr: list[str] = []  # groups with tasks, in round-robin order
+        self.hashq_busy: dict[str, int] = {}  # num workers in each group
+        self.hashq_dev: dict[str, str] = {}  # ptop -> group, if hashq_grp=dev
+        self.hashq_mt = max(1, self.args.hashq_mt)
         self.tagq: Queue[tuple[str, str, str, str, int, str, float]] = Queue()
         self.tag_event = threading.Condition()
         self.hashq_mutex = threading.Lock()
+        self.hashq_cond = threading.Condition(self.hashq_mutex)
         self.n_hashq = 0
         self.n_tagq = 0
         self.mpool_used = False
@@ -192,7 +489,7 @@ class Up2k(object):
         if self.args.hash_mt < 2:
             self.mth: Optional[MTHash] = None
         else:
-            self.mth = MTHash(self.args.hash_mt)
+            self.mth = MTHash(self.args.hash_mt, self.args.hash_rd_sz)
 
         if self.args.no_fastboot:
             self.deferred_init()
@@ -217,6 +514,7 @@ class Up2k(object):
             scan_vols = list(all_vols.keys())
 
         self._rescan(all_vols, scan_vols, True, False)
+        Daemon(self._ino_sync, "up2k-inotify-sync")
 
     def deferred_init(self) -> None:
         all_vols = self.asrv.vfs.all_vols
@@ -242,8 +540,10 @@ class Up2k(object):
 
         Daemon(self._snapshot, "up2k-snapshot")
         if have_e2d:
-            Daemon(self._hasher, "up2k-hasher")
+            for n in range(self.hashq_mt):
+                Daemon(self._hasher, "up2k-hasher-{}".format(n))
             Daemon(self._sched_rescan, "up2k-rescan")
+            Daemon(self._ino_sync, "up2k-inotify-sync")
             if self.mtag:
                 for n in range(max(1, self.args.mtag_mt)):
                     Daemon(self._tagger, "tagger-{}".format(n))
@@ -319,7 +619,7 @@ class Up2k(object):
             tab = self.registry.get(ptop)
             if not tab:
                 continue
-            for job in tab.values():
+            for job in list(tab.values()):
                 ineed = len(job["need"])
                 ihash = len(job["hash"])
                 if ineed == ihash or not ineed:
@@ -346,6 +646,7 @@ class Up2k(object):
                 tab2 = self.registry[ptop]
                 for job in tab2.values():
                     if job["prel"] == dn and job["name"] == fn:
+                        job = self._snap_job(job)
                         return json.dumps(job, separators=(",\n", ": "))
         except:
             pass
@@ -426,7 +727,7 @@ class Up2k(object):
         return json.dumps(ret, separators=(",\n", ": "))
 
     def get_volsize(self, ptop: str) -> tuple[int, int]:
-        with self.reg_mutex:
+        with self.reg_mutex.vol(ptop):
             return self._get_volsize(ptop)
 
     def get_volsizes(self, ptops: list[str]) -> list[tuple[int, int]]:
@@ -437,6 +738,12 @@ class Up2k(object):
 
         return ret
 
+    def get_lock_stats(self) -> dict[str, list[float]]:
+        """[num acquired, total wait, max wait] for main, reg, and each ptop"""
+        ret = self.reg_mutex.stats()
+        ret["main"] = self.mutex.stats()
+        return ret
+
     def _get_volsize(self, ptop: str) -> tuple[int, int]:
         if "e2ds" not in self.flags.get(ptop, {}):
             return (0, 0)
@@ -535,6 +842,9 @@ class Up2k(object):
 
                     timeout = min(timeout, deadline)
 
+            if self.ino:
+                timeout = min(timeout, now + self._ino_tick(now))
+
             if self.db_act > now - self.args.db_act and self.need_rescan:
                 # recent db activity; defer volume rescan
                 act_timeout = self.db_act + self.args.db_act
@@ -564,6 +874,260 @@ class Up2k(object):
                 for v in vols:
                     volage[v] = now
 
+    def _ino_sync(self) -> None:
+        """start/stop watching volumes with the inotify volflag"""
+        with self.ino_mutex:
+            all_vols = list(self.asrv.vfs.all_vols.values())
+            tops: dict[str, tuple[set[str], int]] = {}
+            for vol in all_vols:
+                if "inotify" not in vol.flags or "e2d" not in vol.flags:
+                    continue
+
+                try:
+                    dev = bos.stat(vol.realpath).st_dev if vol.flags.get("xdev") else 0
+                except Exception as ex:
+                    self.log("cannot watch [%s]: %r" % (vol.realpath, ex), 3)
+                    continue
+
+                tops[vol.realpath] = (set(self._idx_excl(vol, all_vols)), dev)
+
+            if not tops and not self.ino:
+                return
+
+            if not self.ino:
+                try:
+                    from .inotify import Inotify
+
+                    self.ino = Inotify(self.log_func, self._ino_wake)
+                except Exception as ex:
+                    t = "cannot watch volumes for changes (inotify is linux-only): %r"
+                    self.log(t % (ex,), 3)
+                    return
+
+            ino = self.ino
+            for top in list(ino.tops):
+                if top not in tops:
+                    ino.unwatch(top)
+                    self.log("stopped watching [%s]" % (top,))
+
+            for top, zt in tops.items():
+                if ino.tops.get(top) == zt:
+                    continue
+
+                ino.unwatch(top)
+                t0 = time.time()
+                n = ino.watch(top, zt[0], zt[1])
+                if n >= 0:
+                    t = "watching %d folders in [%s] for changes (%.2f sec)"
+                    self.log(t % (n, top, time.time() - t0))
+
+    def _ino_wake(self) -> None:
+        with self.rescan_cond:
+            self.rescan_cond.notify_all()
+
+    def _ino_tick(self, now: float) -> float:
+        """reindex the folders where inotify saw changes, if it's time;
+        returns num sec until the next check"""
+        assert self.ino  # !rm
+        wait = self.ino.due(self.args.inotify_cd, now)
+        if wait:
+            return wait
+
+        if self.db_act > now - self.args.db_act:
+            # uploads and such are already indexed; let them finish
+            return self.db_act + self.args.db_act - now
+
+        with self.mutex:
+            if self.pp:
+                return 1
+
+            dirty, overflow = self.ino.take()
+            for vp, vol in self.asrv.vfs.all_vols.items():
+                if vol.realpath in overflow:
+                    self.need_rescan.add(vp)
+                    dirty.pop(vol.realpath, None)
+
+            if overflow:
+                # rewatch any volumes which ran out of watches
+                Daemon(self._ino_sync, "up2k-inotify-sync")
+
+            if not dirty:
+                return 9001
+
+            self.pp = ProgressPrinter(self.log, self.args)
+
+        Daemon(self._ino_reindex, "up2k-inotify", (dirty,))
+        return 9001
+
+    def _ino_reindex(self, dirty: dict[str, dict[str, bool]]) -> None:
+        """reindex just the folders which inotify has seen changes in;
+        dirty = {volume-abspath: {rd: recursive}}"""
+        try:
+            all_vols = list(self.asrv.vfs.all_vols.values())
+            for top, rds in dirty.items():
+                vol = next((x for x in all_vols if x.realpath == top), None)
+                if vol and not self.stop:
+                    self._ino_reindex_vol(vol, all_vols, rds)
+        except:
+            self.log("inotify reindex failed:\n" + min_ex(), 1)
+        finally:
+            with self.mutex:
+                self.pp = None
+
+    def _ino_reindex_vol(
+        self, vol: VFS, all_vols: list[VFS], rds: dict[str, bool]
+    ) -> None:
+        top = vol.realpath
+        flags = vol.flags
+        rei = flags.get("noidx")
+        reh = flags.get("nohash")
+        n4g = bool(flags.get("noforget"))
+        ffat = "fat32" in flags
+        dev = bos.stat(top).st_dev if flags.get("xdev") else 0
+        xvol = bool(flags.get("xvol"))
+        dirsz = not self.args.no_dirsz
+
+        # skip folders which are inside a recursive one,
+        # and do the deepest ones first so the parents can
+        # trust the folder-sizes of their subfolders
+        todo = []
+        for rd, deep in rds.items():
+            zs = rd
+            while zs:
+                zs = zs.rsplit("/", 1)[0] if "/" in zs else ""
+                if rds.get(zs):
+                    break
+            else:
+                todo.append((rd.count("/") + 1 if rd else 0, rd, deep))
+
+        todo.sort(reverse=True)
+
+        t0 = time.time()
+        n_add = n_rm = 0
+        with self.mutex:
+            with self.reg_mutex:
+                reg = self.register_vpath(top, flags)
+
+            assert reg and self.pp  # !rm
+            cur, db_path = reg
+            db = Dbw(cur, 0, time.time())
+            excl = self._idx_excl(vol, all_vols)
+            sexcl = set(excl)
+            # cheap until there's something to hash; see IdxPool._start
+            nthr = flags.get("idxmt") or 1
+            ipool = IdxPool(self, nthr) if nthr > 1 else None
+            try:
+                for _, rd, deep in todo:
+                    if self.stop:
+                        break
+
+                    cdir = os.path.join(top, rd) if rd else top
+                    if rd and (cdir in sexcl or (rei and rei.search(cdir))):
+                        continue
+
+                    # db_add bumps the parents for each new file it indexes
+                    # (not from ipool); count that as already done below
+                    prd = rd.rsplit("/", 1)[0] if "/" in rd else ""
+                    ds0 = self._ino_ds(db, rd)
+                    pds0 = self._ino_ds(db, prd)
+                    if bos.path.isdir(cdir):
+                        zi, _, _ = self._build_dir(
+                            db,
+                            top,
+                            sexcl,
+                            cdir,
+                            absreal(cdir),
+                            rei,
+                            reh,
+                            n4g,
+                            ffat,
+                            [],
+                            bos.stat(cdir),
+                            dev,
+                            xvol,
+                            ipool,
+                            deep,
+                        )
+                        n_add += max(0, zi)
+                        if ipool:
+                            ipool.collect(db, True)
+                        if deep and rd and not n4g:
+                            n_rm += self._ino_forget(db, top, rd, False)
+                    elif rd and not n4g:
+                        n_rm += self._ino_forget(db, top, rd, True)
+                    else:
+                        continue
+
+                    ds1 = self._ino_ds(db, rd)
+                    pds1 = self._ino_ds(db, prd)
+                    zt = (
+                        ds1[0] - ds0[0] - (pds1[0] - pds0[0]),
+                        ds1[1] - ds0[1] - (pds1[1] - pds0[1]),
+                    )
+                    if dirsz and rd and zt != (0, 0):
+                        # and the parents of this folder
+                        q = "update ds set sz=sz+?, nf=nf+? where rd=?"
+                        zs = rd
+                        while zs:
+                            zs = zs.rsplit("/", 1)[0] if "/" in zs else ""
+                            db.c.execute(q, zt + (zs,))
+            except Exception as ex:
+                t = "failed to reindex [{}]:\n{}"
+                self.log(t.format(top, min_ex()), c=1)
+                if db_ex_chk(self.log, ex, db_path):
+                    self.hub.log_stacks()
+            finally:
+                if ipool:
+                    ipool.shutdown()
+
+            if n_add or n_rm:
+                self._set_tagscan(db.c, True)
+
+            db.c.connection.commit()
+
+        t = "reindexed %d folders in [%s] in %.2f sec; %d new, %d deleted files"
+        self.log(t % (len(todo), top, time.time() - t0, n_add, n_rm))
+
+        if (n_add or n_rm) and "e2ts" in flags and not self.stop:
+            self._build_tags_index(vol)
+
+    def _ino_ds(self, db: Dbw, rd: str) -> tuple[int, int]:
+        """recursive size and num files in folder rd, according to the db"""
+        q = "select sz, nf from ds where rd=? limit 1"
+        try:
+            return db.c.execute(q, (rd,)).fetchone() or (0, 0)
+        except:
+            return (0, 0)  # mojibake rd
+
+    def _ino_forget(self, db: Dbw, top: str, rd: str, gone: bool) -> int:
+        """forget the subfolders of rd which are no longer on disk,
+        and rd itself if gone; returns num files forgotten"""
+        zt = (rd, rd + "/", rd + "0")
+        rm = set([rd]) if gone else set()
+        for q in (
+            "select distinct rd from up where rd=? or (rd>? and rd<?)",
+            "select d from dh where d=? or (d>? and d<?)",
+            "select rd from ds where rd=? or (rd>? and rd<?)",
+        ):
+            for (drd,) in db.c.execute(q, zt):
+                if drd not in rm and not bos.path.isdir(djoin(top, drd)):
+                    rm.add(drd)
+
+        n_rm = 0
+        q = "select count(w) from up where rd = ?"
+        for drd in rm:
+            n_rm += next(db.c.execute(q, (drd,)))[0]
+            db.c.execute("delete from dh where d = ?", (drd,))
+            db.c.execute("delete from ds where rd = ?", (drd,))
+            db.c.execute("delete from up where rd = ?", (drd,))
+
+        if rm:
+            t = "forgetting {} deleted dirs, {} files"
+            self.log(t.format(len(rm), n_rm))
+
+        db.n += len(rm)
+        return n_rm
+
     def _check_lifetimes(self) -> float:
         now = time.time()
         timeout = now + 9001
@@ -1059,16 +1623,24 @@ class Up2k(object):
         drp = None
         emptylist = []
         snap = os.path.join(histpath, "up2k.snap")
-        if bos.path.exists(snap):
-            with gzip.GzipFile(snap, "rb") as f:
-                j = f.read().decode("utf-8")
+        jnls = [os.path.join(histpath, x) for x in ("up2k.jnl.1", "up2k.jnl")]
+        jnls = [x for x in jnls if bos.path.exists(x)]
+        if bos.path.exists(snap) or jnls:
+            reg2 = {}
+            if bos.path.exists(snap):
+                with gzip.GzipFile(snap, "rb") as f:
+                    j = f.read().decode("utf-8")
+
+                reg2 = json.loads(j)
+                try:
+                    drp = reg2["droppable"]
+                    reg2 = reg2["registry"]
+                except:
+                    pass
 
-            reg2 = json.loads(j)
-            try:
-                drp = reg2["droppable"]
-                reg2 = reg2["registry"]
-            except:
-                pass
+            njnl = 0
+            for jnl in jnls:
+                njnl += self._jnl_replay(jnl, reg2)
 
             if reg2 and "dwrk" not in reg2[next(iter(reg2))]:
                 for job in reg2.values():
@@ -1080,10 +1652,8 @@ class Up2k(object):
                 if "done" in job:
                     job["need"] = job["hash"] = emptylist
                 else:
-                    if "need" not in job:
-                        job["need"] = []
-                    if "hash" not in job:
-                        job["hash"] = []
+                    job["need"] = HashList(job.get("need") or [])
+                    job["hash"] = HashList(job.get("hash") or [])
 
                 fp = djoin(ptop, job["prel"], job["name"])
                 if bos.path.exists(fp):
@@ -1105,8 +1675,12 @@ class Up2k(object):
                 drp = [k for k, v in reg.items() if not v["need"]]
             else:
                 drp = [x for x in drp if x in reg]
+                if njnl:
+                    zs = set(drp)
+                    drp += [k for k, v in reg.items() if not v["need"] and k not in zs]
 
-            t = "loaded snap {} |{}| ({})".format(snap, len(reg.keys()), len(drp or []))
+            t = "loaded snap {} |{}| ({}) +{} from journal"
+            t = t.format(snap, len(reg.keys()), len(drp or []), njnl)
             ta = [t] + self._vis_reg_progress(reg)
             self.log("\n".join(ta))
 
@@ -1217,31 +1791,24 @@ class Up2k(object):
             db = Dbw(cur, 0, time.time())
             self.pp.n = next(db.c.execute("select count(w) from up"))[0]
 
-            excl = [
-                vol.realpath + "/" + d.vpath[len(vol.vpath) :].lstrip("/")
-                for d in all_vols
-                if d != vol and (d.vpath.startswith(vol.vpath + "/") or not vol.vpath)
-            ]
-            excl += [absreal(x) for x in excl]
-            excl += list(self.asrv.vfs.histtab.values())
-            if WINDOWS:
-                excl = [x.replace("/", "\\") for x in excl]
-            else:
-                # ~/.wine/dosdevices/z:/ and such
-                excl.extend(("/dev", "/proc", "/run", "/sys"))
-
+            excl = self._idx_excl(vol, all_vols)
             if self.args.re_dirsz:
                 db.c.execute("delete from ds")
                 db.n += 1
 
             rtop = absreal(top)
             n_add = n_rm = 0
+            ipool = None
             try:
                 if dir_is_empty(self.log_func, not self.args.no_scandir, rtop):
                     t = "volume /%s at [%s] is empty; will not be indexed as this could be due to an offline filesystem"
                     self.log(t % (vol.vpath, rtop), 6)
                     return True, False
 
+                nthr = vol.flags.get("idxmt") or 1
+                if nthr > 1:
+                    ipool = IdxPool(self, nthr)
+
                 n_add, _, _ = self._build_dir(
                     db,
                     top,
@@ -1256,7 +1823,10 @@ class Up2k(object):
                     cst,
                     dev,
                     bool(vol.flags.get("xvol")),
+                    ipool,
                 )
+                if ipool:
+                    ipool.collect(db, True)
                 if not n4g:
                     n_rm = self._drop_lost(db.c, top, excl)
             except Exception as ex:
@@ -1264,6 +1834,9 @@ class Up2k(object):
                 self.log(t.format(top, min_ex()), c=1)
                 if db_ex_chk(self.log, ex, db_path):
                     self.hub.log_stacks()
+            finally:
+                if ipool:
+                    ipool.shutdown()
 
             if db.n:
                 self.log("commit {} new files".format(db.n))
@@ -1301,6 +1874,23 @@ class Up2k(object):
 
             return True, bool(n_add or n_rm or do_vac)
 
+    def _idx_excl(self, vol: VFS, all_vols: list[VFS]) -> list[str]:
+        """abspaths inside the volume which must not be indexed"""
+        excl = [
+            vol.realpath + "/" + d.vpath[len(vol.vpath) :].lstrip("/")
+            for d in all_vols
+            if d != vol and (d.vpath.startswith(vol.vpath + "/") or not vol.vpath)
+        ]
+        excl += [absreal(x) for x in excl]
+        excl += list(self.asrv.vfs.histtab.values())
+        if WINDOWS:
+            excl = [x.replace("/", "\\") for x in excl]
+        else:
+            # ~/.wine/dosdevices/z:/ and such
+            excl.extend(("/dev", "/proc", "/run", "/sys"))
+
+        return excl
+
     def _build_dir(
         self,
         db: Dbw,
@@ -1316,7 +1906,11 @@ class Up2k(object):
         cst: os.stat_result,
         dev: int,
         xvol: bool,
+        ipool: Optional[IdxPool],
+        deep: bool = True,
     ) -> tuple[int, int, int]:
+        gl = ipool.listdir(cdir) if ipool else None
+
         if xvol and not rcdir.startswith(top):
             self.log("skip xvol: [{}] -> [{}]".format(cdir, rcdir), 6)
             return 0, 0, 0
@@ -1331,6 +1925,8 @@ class Up2k(object):
         seen = seen + [rcdir]
         unreg: list[str] = []
         files: list[tuple[int, int, str]] = []
+        subdirs: list[tuple[str, str, os.stat_result]] = []
+        dst: list[Any] = [0, "", ""]  # files hashing in ipool, drd, dhash
         fat32 = True
         cv = ""
 
@@ -1347,8 +1943,10 @@ class Up2k(object):
         rds = rd + "/" if rd else ""
         cdirs = cdir + os.sep
 
-        g = statdir(self.log_func, not self.args.no_scandir, True, cdir)
-        gl = sorted(g)
+        if gl is None:
+            g = statdir(self.log_func, not self.args.no_scandir, True, cdir)
+            gl = sorted(g)
+
         partials = set([x[0] for x in gl if "PARTIAL" in x[0]])
         for iname, inf in gl:
             if self.stop:
@@ -1388,28 +1986,7 @@ class Up2k(object):
                     # abandoned or foreign, skip
                     continue
                 # self.log(" dir: {}".format(abspath))
-                try:
-                    i1, i2, i3 = self._build_dir(
-                        db,
-                        top,
-                        excl,
-                        abspath,
-                        rap,
-                        rei,
-                        reh,
-                        n4g,
-                        fat32,
-                        seen,
-                        inf,
-                        dev,
-                        xvol,
-                    )
-                    tfa += i1
-                    tnf += i2
-                    rsz += i3
-                except:
-                    t = "failed to index subdir [{}]:\n{}"
-                    self.log(t.format(abspath, min_ex()), c=1)
+                subdirs.append((abspath, rap, inf))
             elif not stat.S_ISREG(inf.st_mode):
                 self.log("skip type-{:x} file [{}]".format(inf.st_mode, abspath))
             else:
@@ -1447,21 +2024,56 @@ class Up2k(object):
                 ):
                     cv = iname
 
-        if not self.args.no_dirsz:
-            tnf += len(files)
-            q = "select sz, nf from ds where rd=? limit 1"
+        gl = []
+        for n, (abspath, rap, inf) in enumerate(subdirs):
+            if not deep:
+                # just this folder (inotify); subfolder totals from the db
+                zs = rds + abspath[len(cdirs) :]
+                q = "select sz, nf from ds where rd=? limit 1"
+                try:
+                    zi1, zi2 = db.c.execute(q, (zs,)).fetchone() or (0, 0)
+                    rsz += zi1
+                    tnf += zi2
+                except:
+                    pass  # mojibake rd
+                continue
+            if ipool:
+                # keep the scanners a few folders ahead
+                zsl = [x[0] for x in subdirs[n + 1 : n + 1 + ipool.nthr * 2]]
+                ipool.prefetch(zsl)
             try:
-                db_sz, db_nf = db.c.execute(q, (rd,)).fetchone() or (-1, -1)
-                if rsz != db_sz or tnf != db_nf:
-                    db.c.execute("delete from ds where rd=?", (rd,))
-                    db.c.execute("insert into ds values (?,?,?)", (rd, rsz, tnf))
-                    db.n += 1
+                i1, i2, i3 = self._build_dir(
+                    db,
+                    top,
+                    excl,
+                    abspath,
+                    rap,
+                    rei,
+                    reh,
+                    n4g,
+                    fat32,
+                    seen,
+                    inf,
+                    dev,
+                    xvol,
+                    ipool,
+                )
+                tfa += i1
+                tnf += i2
+                rsz += i3
             except:
-                pass  # mojibake rd
+                t = "failed to index subdir [{}]:\n{}"
+                self.log(t.format(abspath, min_ex()), c=1)
+
+            if self.stop:
+                return -1, 0, 0
+
+        if not self.args.no_dirsz:
+            tnf += len(files)
 
         # folder of 1000 files = ~1 MiB RAM best-case (tiny filenames);
         # free up stuff we're done with before dhashing
-        gl = []
+        subdirs = []
         partials.clear()
         if not self.args.no_dhash:
             if len(files) < 9000:
@@ -1482,6 +2094,7 @@ class Up2k(object):
                 c = db.c.execute(sql, (drd, dhash))
 
             if c.fetchone():
+                self._set_ds(db, rd, rsz, tnf)
                 return tfa, tnf, rsz
 
         if cv and rd:
@@ -1496,6 +2109,23 @@ class Up2k(object):
             except Exception as ex:
                 self.log("cover {}/{} failed: {}".format(rd, cv, ex), 6)
 
+        # everything the db knows about this folder, in one go
+        q = "select fn, w, mt, sz, ip, at from up where rd = ?"
+        try:
+            c = db.c.execute(q, (rd,))
+        except:
+            c = db.c.execute(q, ("//" + w8b64enc(rd),))
+
+        db_files: dict[str, list[tuple[Any, ...]]] = {}
+        for zt in c:
+            fn = zt[0]
+            if fn.startswith("//"):
+                fn = w8b64dec(fn[2:])
+            try:
+                db_files[fn].append(zt[1:])
+            except KeyError:
+                db_files[fn] = [zt[1:]]
+
         seen_files = set([x[2] for x in files])  # for dropcheck
         for sz, lmod, fn in files:
             if self.stop:
@@ -1505,13 +2135,7 @@ class Up2k(object):
             abspath = cdirs + fn
             nohash = reh.search(abspath) if reh else False
 
-            sql = "select w, mt, sz, ip, at from up where rd = ? and fn = ?"
-            try:
-                c = db.c.execute(sql, (rd, fn))
-            except:
-                c = db.c.execute(sql, s3enc(self.mem_cur, rd, fn))
-
-            in_db = list(c.fetchall())
+            in_db = db_files.get(fn)
             if in_db:
                 self.pp.n -= 1
                 dw, dts, dsz, ip, at = in_db[0]
@@ -1548,6 +2172,13 @@ class Up2k(object):
                 if sz > 1024 * 1024:
                     self.log("file: {}".format(abspath))
 
+                if ipool:
+                    # indexed when it's done; see _idx_hashed
+                    dst[0] += 1
+                    ipool.hash(db, (rd, fn, abspath, sz, lmod, dw, ip, at, dst))
+                    tfa += 1
+                    continue
+
                 try:
                     hashes, _ = self._hashlist_from_file(
                         abspath, "a{}, ".format(self.pp.n)
@@ -1561,25 +2192,25 @@ class Up2k(object):
 
                 wark = up2k_wark_from_hashlist(self.salt, sz, hashes)
 
-            if dw and dw != wark:
-                ip = ""
-                at = 0
-
-            # skip upload hooks by not providing vflags
-            self.db_add(db.c, {}, rd, fn, lmod, sz, "", "", wark, wark, "", "", ip, at)
-            db.n += 1
+            self._idx_add(db, {}, rd, fn, lmod, sz, wark, dw, ip, at)
             tfa += 1
-            td = time.time() - db.t
-            if db.n >= 4096 or td >= 60:
-                self.log("commit {} new files".format(db.n))
-                db.c.connection.commit()
-                db.n = 0
-                db.t = time.time()
 
-        if not self.args.no_dhash:
+        # after the files; replaces what db_add added for each of them
+        self._set_ds(db, rd, rsz, tnf)
+
+        if self.args.no_dhash:
+            pass
+        elif dst[0]:
+            # still hashing; the last file to finish will set the dhash
+            dst[1] = drd  # type: ignore
+            dst[2] = dhash  # type: ignore
+        else:
             db.c.execute("delete from dh where d = ?", (drd,))  # type: ignore
             db.c.execute("insert into dh values (?,?)", (drd, dhash))  # type: ignore
 
+        if ipool:
+            ipool.collect(db, False)
+
         if self.stop:
             return -1, 0, 0
 
@@ -1615,14 +2246,7 @@ class Up2k(object):
             return tfa, tnf, rsz
 
         # drop missing files
-        q = "select fn from up where rd = ?"
-        try:
-            c = db.c.execute(q, (rd,))
-        except:
-            c = db.c.execute(q, ("//" + w8b64enc(rd),))
-
-        hits = [w8b64dec(x[2:]) if x.startswith("//") else x for (x,) in c]
-        rm_files = [x for x in hits if x not in seen_files]
+        rm_files = [x for x in db_files if x not in seen_files]
         n_rm = len(rm_files)
         for fn in rm_files:
             self.db_rm(db.c, rd, fn, 0)
@@ -1632,6 +2256,66 @@ class Up2k(object):
 
         return tfa, tnf, rsz
 
+    def _set_ds(self, db: Dbw, rd: str, rsz: int, tnf: int) -> None:
+        """store the recursive size and num files of a folder"""
+        if self.args.no_dirsz:
+            return
+
+        q = "select sz, nf from ds where rd=? limit 1"
+        try:
+            db_sz, db_nf = db.c.execute(q, (rd,)).fetchone() or (-1, -1)
+            if rsz != db_sz or tnf != db_nf:
+                db.c.execute("delete from ds where rd=?", (rd,))
+                db.c.execute("insert into ds values (?,?,?)", (rd, rsz, tnf))
+                db.n += 1
+        except:
+            pass  # mojibake rd
+
+    def _idx_add(
+        self,
+        db: Dbw,
+        vf: dict[str, Any],
+        rd: str,
+        fn: str,
+        lmod: int,
+        sz: int,
+        wark: str,
+        dw: str,
+        ip: str,
+        at: float,
+    ) -> None:
+        if dw and dw != wark:
+            ip = ""
+            at = 0
+
+        # skip upload hooks by not providing (real) vflags
+        self.db_add(db.c, vf, rd, fn, lmod, sz, "", "", wark, wark, "", "", ip, at)
+        db.n += 1
+        td = time.time() - db.t
+        if db.n >= 4096 or td >= 60:
+            self.log("commit {} new files".format(db.n))
+            db.c.connection.commit()
+            db.n = 0
+            db.t = time.time()
+
+    def _idx_hashed(self, db: Dbw, task: tuple[Any, ...], hashes: list[str]) -> None:
+        """a file from _build_dir is done hashing in the IdxPool"""
+        rd, fn, _, sz, lmod, dw, ip, at, dst = task
+        if self.stop:
+            return
+
+        if hashes:
+            wark = up2k_wark_from_hashlist(self.salt, sz, hashes)
+            # this may arrive after _build_dir wrote the folder sizes,
+            # which already include this file; don't count it again
+            vf = {"nodirsz": True}
+            self._idx_add(db, vf, rd, fn, lmod, sz, wark, dw, ip, at)
+
+        dst[0] -= 1
+        if not dst[0] and dst[1]:
+            db.c.execute("delete from dh where d = ?", (dst[1],))
+            db.c.execute("insert into dh values (?,?)", (dst[1], dst[2]))
+
     def _drop_lost(self, cur: "sqlite3.Cursor", top: str, excl: list[str]) -> int:
         rm = []
         n_rm = 0
@@ -2789,6 +3473,23 @@ class Up2k(object):
 
         return ret
 
+    def handle_json_batch(
+        self, cjs: list[dict[str, Any]], busy_aps: dict[str, int]
+    ) -> list[dict[str, Any]]:
+        """handle_json for each of cjs; a pebkac only fails that one file"""
+        ret: list[dict[str, Any]] = []
+        for cj in cjs:
+            try:
+                ret.append(self.handle_json(cj, busy_aps))
+            except Pebkac as ex:
+                ret.append({"error": str(ex), "status": ex.code})
+                if ex.code == 503:
+                    # mutex timeout; no point in waiting for the others too
+                    ret += [ret[-1]] * (len(cjs) - len(ret))
+                    break
+
+        return ret
+
     def _handle_json(self, cj: dict[str, Any], depth: int = 1) -> dict[str, Any]:
         if depth > 16:
             raise Pebkac(500, "too many xbu relocs, giving up")
@@ -2938,6 +3639,7 @@ class Up2k(object):
             if job and wark in reg:
                 # self.log("pop " + wark + "  " + job["name"] + " handle_json db", 4)
                 del reg[wark]
+                self._jnl(cj["ptop"], "d", wark)
 
             if lost:
                 c2 = None
@@ -2975,6 +3677,7 @@ class Up2k(object):
                             t = "forgetting deleted partial upload at {}"
                             self.log(t.format(path))
                             del reg[wark]
+                            self._jnl(cj["ptop"], "d", wark)
                         break
 
                 inc_ap = djoin(cj["ptop"], cj["prel"], cj["name"])
@@ -2990,6 +3693,7 @@ class Up2k(object):
                     )
                     self.log(t)
                     del reg[wark]
+                    self._jnl(cj["ptop"], "d", wark)
 
                 elif inc_ap != orig_ap and not data_ok and "done" in reg[wark]:
                     self.log("asserting contents of %s" % (orig_ap,))
@@ -2999,6 +3703,7 @@ class Up2k(object):
                         t = "will not dedup (fs index desync): fs=%s, idx=%s, file: %s"
                         self.log(t % (wark2, wark, orig_ap))
                         del reg[wark]
+                        self._jnl(cj["ptop"], "d", wark)
 
             if job or wark in reg:
                 job = job or reg[wark]
@@ -3053,6 +3758,7 @@ class Up2k(object):
                             )
 
                         job = deepcopy(job)
+                        job.pop("cidx", None)
                         job["wark"] = wark
                         job["dwrk"] = dwark
                         job["at"] = cj.get("at") or now
@@ -3131,7 +3837,9 @@ class Up2k(object):
                             cur.connection.commit()
                 elif wark in reg:
                     # checks out, but client may have hopped IPs
-                    job["addr"] = cj["addr"]
+                    if job["addr"] != cj["addr"]:
+                        job["addr"] = cj["addr"]
+                        self._jnl(job["ptop"], "n", wark, job)
 
             if not job:
                 ap1 = djoin(cj["ptop"], cj["prel"])
@@ -3158,8 +3866,7 @@ class Up2k(object):
                     "dwrk": dwark,
                     "t0": now,
                     "sprs": sprs,
-                    "hash": deepcopy(cj["hash"]),
-                    "need": [],
+                    "hash": HashList(cj["hash"]),
                     "busy": {},
                 }
                 # client-provided, sanitized by _get_wark: name, size, lmod
@@ -3174,11 +3881,13 @@ class Up2k(object):
                 # one chunk may occur multiple times in a file;
                 # filter to unique values for the list of missing chunks
                 # (preserve order to reduce disk thrashing)
+                need = []
                 lut = set()
                 for k in cj["hash"]:
                     if k not in lut:
-                        job["need"].append(k)
+                        need.append(k)
                         lut.add(k)
+                job["need"] = HashList(need)
 
                 try:
                     ret = self._new_upload(job, vfs, depth)
@@ -3186,6 +3895,7 @@ class Up2k(object):
                         return ret  # xbu recursed
                 except:
                     self.registry[job["ptop"]].pop(job["wark"], None)
+                    self._jnl(job["ptop"], "d", job["wark"])
                     raise
 
             purl = "{}/{}".format(job["vtop"], job["prel"]).strip("/")
@@ -3197,7 +3907,7 @@ class Up2k(object):
                 "size": job["size"],
                 "lmod": job["lmod"],
                 "sprs": job.get("sprs", sprs),
-                "hash": job["need"],
+                "hash": list(job["need"]),
                 "dwrk": dwark,
                 "wark": wark,
             }
@@ -3299,6 +4009,7 @@ class Up2k(object):
             return
 
         linked = False
+        cloned = False  # reflink; a full file which shares its extents
         try:
             if not flags.get("dedup"):
                 raise Exception("dedup is disabled in config")
@@ -3333,7 +4044,14 @@ class Up2k(object):
                 wunlink(self.log, dst, flags)
 
             try:
-                if "hardlink" in flags:
+                if "reflink" in flags:
+                    reflink(absreal(src), dst)
+                    cloned = True
+            except Exception as ex:
+                self.log("cannot reflink: " + repr(ex))
+
+            try:
+                if "hardlink" in flags and not cloned:
                     os.link(fsenc(absreal(src)), fsenc(dst))
                     linked = True
             except Exception as ex:
@@ -3341,7 +4059,7 @@ class Up2k(object):
                 if "hardlinkonly" in flags:
                     raise Exception("symlink-fallback disabled in cfg")
 
-            if not linked:
+            if not linked and not cloned:
                 if ANYWIN:
                     Path(ldst).symlink_to(lsrc)
                     if not bos.path.exists(dst):
@@ -3374,7 +4092,7 @@ class Up2k(object):
     def handle_chunks(
         self, ptop: str, wark: str, chashes: list[str]
     ) -> tuple[list[str], int, list[list[int]], str, float, bool]:
-        with self.mutex, self.reg_mutex:
+        with self.reg_mutex.vol(ptop):
             self.db_act = self.vol_act[ptop] = time.time()
             job = self.registry[ptop].get(wark)
             if not job:
@@ -3385,22 +4103,24 @@ class Up2k(object):
             if "t0c" not in job:
                 job["t0c"] = time.time()
 
+            hashes = job["hash"]
+            hidx, nset = self._cidx(job)
+
             if len(chashes) > 1 and len(chashes[1]) < 44:
                 # first hash is full-length; expand remaining ones
-                uniq = []
-                lut = set()
-                for chash in job["hash"]:
-                    if chash not in lut:
-                        uniq.append(chash)
-                        lut.add(chash)
                 try:
-                    nchunk = uniq.index(chashes[0])
+                    nchunk = hidx[chashes[0]][0]
                 except:
                     raise Pebkac(400, "unknown chunk0 [%s]" % (chashes[0]))
                 expanded = [chashes[0]]
                 for prefix in chashes[1:]:
+                    # next chunk which is not a repeat of an earlier one
                     nchunk += 1
-                    chash = uniq[nchunk]
+                    while nchunk < len(hashes) and hidx[hashes[nchunk]][0] != nchunk:
+                        nchunk += 1
+                    if nchunk >= len(hashes):
+                        raise Pebkac(400, "stitched chunks go past the end of the file")
+                    chash = hashes[nchunk]
                     if not chash.startswith(prefix):
                         t = "next sibling chunk does not start with expected prefix [%s]: [%s]"
                         raise Pebkac(400, t % (prefix, chash))
@@ -3408,18 +4128,18 @@ class Up2k(object):
                 chashes = expanded
 
             for chash in chashes:
-                if chash not in job["need"]:
+                if chash not in nset:
                     msg = "chash = {} , need:\n".format(chash)
                     msg += "\n".join(job["need"])
                     self.log(msg)
                     t = "already got that (%s) but thanks??"
-                    if chash not in job["hash"]:
+                    if chash not in hidx:
                         t = "unknown chunk wtf: %s"
                     raise Pebkac(400, t % (chash,))
 
                 if chash in job["busy"]:
-                    nh = len(job["hash"])
-                    idx = job["hash"].index(chash)
+                    nh = len(hashes)
+                    idx = hidx[chash][0]
                     t = "that chunk is already being written to:\n  {}\n  {} {}/{}\n  {}"
                     raise Pebkac(400, t.format(wark, chash, idx, nh, job["name"]))
 
@@ -3429,7 +4149,7 @@ class Up2k(object):
             coffsets = []
             nchunks = []
             for chash in chashes:
-                nchunk = [n for n, v in enumerate(job["hash"]) if v == chash]
+                nchunk = hidx.get(chash)
                 if not nchunk:
                     raise Pebkac(400, "unknown chunk %s" % (chash))
 
@@ -3461,26 +4181,24 @@ class Up2k(object):
     def fast_confirm_chunks(
         self, ptop: str, wark: str, chashes: list[str]
     ) -> tuple[int, str]:
-        if not self.mutex.acquire(False):
-            return -1, ""
-        if not self.reg_mutex.acquire(False):
-            self.mutex.release()
+        vl = self.reg_mutex.vol(ptop)
+        if not vl.acquire(False):
             return -1, ""
         try:
             return self._confirm_chunks(ptop, wark, chashes, chashes)
         finally:
-            self.reg_mutex.release()
-            self.mutex.release()
+            vl.release()
 
     def confirm_chunks(
         self, ptop: str, wark: str, written: list[str], locked: list[str]
     ) -> tuple[int, str]:
-        with self.mutex, self.reg_mutex:
+        with self.reg_mutex.vol(ptop):
             return self._confirm_chunks(ptop, wark, written, locked)
 
     def _confirm_chunks(
         self, ptop: str, wark: str, written: list[str], locked: list[str]
     ) -> tuple[int, str]:
+        """mutex(vol) me"""
         if True:
             self.db_act = self.vol_act[ptop] = time.time()
             try:
@@ -3494,12 +4212,16 @@ class Up2k(object):
             for chash in locked:
                 job["busy"].pop(chash, None)
 
+            nset = self._cidx(job)[1]
             try:
                 for chash in written:
                     job["need"].remove(chash)
+                    nset.discard(chash)
             except Exception as ex:
                 return -2, "confirm_chunk, chash(%s) %r" % (chash, ex)  # type: ignore
 
+            self._jnl(ptop, "c", wark, written)
+
             ret = len(job["need"])
             if ret > 0:
                 return ret, src
@@ -3565,12 +4287,15 @@ class Up2k(object):
         z2.append(upt)
         if self.idx_wark(vflags, *z2):
             del self.registry[ptop][wark]
+            self._jnl(ptop, "d", wark)
         else:
             for k in "host tnam busy sprs poke t0c".split():
                 del job[k]
+            job.pop("cidx", None)
             job["t0"] = int(job["t0"])
             job["hash"] = []
             job["done"] = 1
+            self._jnl(ptop, "n", wark, job)
             self.regdrop(ptop, wark)
 
         if wake_sr:
@@ -3594,8 +4319,30 @@ class Up2k(object):
         if cur:
             cur.connection.commit()
 
+    def _cidx(self, job: dict[str, Any]) -> tuple[dict[str, list[int]], set[str]]:
+        """
+        mutex(vol) me;
+        lookup tables for job hash/need; chunk-hash to chunk-numbers,
+        and the set of needed chunk-hashes -- built on first use and
+        kept in sync with need, but never saved (see _snap_reg)
+        """
+        try:
+            return job["cidx"]
+        except KeyError:
+            pass
+
+        hidx: dict[str, list[int]] = {}
+        for n, chash in enumerate(job["hash"]):
+            try:
+                hidx[chash].append(n)
+            except KeyError:
+                hidx[chash] = [n]
+
+        ret = job["cidx"] = (hidx, set(job["need"]))
+        return ret
+
     def regdrop(self, ptop: str, wark: str) -> None:
-        """mutex(main,reg) me"""
+        """mutex(vol) me"""
         olds = self.droppable[ptop]
         if wark:
             olds.append(wark)
@@ -3608,6 +4355,7 @@ class Up2k(object):
         self.log(t.format(ptop, len(olds), n))
         for k in olds[:n]:
             self.registry[ptop].pop(k, None)
+            self._jnl(ptop, "d", k)
         self.droppable[ptop] = olds[n:]
 
     def idx_wark(
@@ -3626,6 +4374,7 @@ class Up2k(object):
         ip: str,
         at: float,
         skip_xau: bool = False,
+        commit: bool = True,
     ) -> bool:
         cur = self.cur.get(ptop)
         if not cur:
@@ -3650,7 +4399,8 @@ class Up2k(object):
                 at,
                 skip_xau,
             )
-            cur.connection.commit()
+            if commit:
+                cur.connection.commit()
         except Exception as ex:
             x = self.register_vpath(ptop, {})
             assert x  # !rm
@@ -3740,6 +4490,7 @@ class Up2k(object):
                 self.log(t, 1)
                 wunlink(self.log, dst, vflags)
                 self.registry[ptop].pop(wark, None)
+                self._jnl(ptop, "d", wark)
                 raise Pebkac(403, t)
 
         xiu = vflags.get("xiu")
@@ -4384,6 +5135,7 @@ class Up2k(object):
                     self.log(t.format(wark, p))
                 assert wark
                 del reg[wark]
+                self._jnl(ptop, "d", wark)
 
         return has_dupes
 
@@ -4543,13 +5295,14 @@ class Up2k(object):
         ret = []
         suffix = " MB, {}".format(path)
         with open(fsenc(path), "rb", self.args.iobuf) as f:
-            if self.mth and fsz >= 1024 * 512:
+            # mth is busy if another hasher-thread has it; do it here instead
+            if self.mth and fsz >= 1024 * 512 and not self.mth.omutex.locked():
                 tlt = self.mth.hash(f, fsz, csz, self.pp, prefix, suffix)
                 ret = [x[0] for x in tlt]
                 fsz = 0
 
             while fsz > 0:
-                # same as `hash_at` except for `imutex` / bufsz
+                # same as `hash_at` except for pread / bufsz
                 if self.stop:
                     return [], st
 
@@ -4692,6 +5445,8 @@ class Up2k(object):
         finally:
             f.close()
 
+        self._jnl(job["ptop"], "n", job["wark"], job)
+
         if not job["hash"]:
             self._finish_upload(job["ptop"], job["wark"])
 
@@ -4711,15 +5466,29 @@ class Up2k(object):
                 self.do_snapshot()
 
     def do_snapshot(self) -> None:
-        with self.mutex, self.reg_mutex:
-            for k, reg in self.registry.items():
-                self._snap_reg(k, reg)
+        with self.snap_mutex:
+            snaps = []
+            with self.mutex, self.reg_mutex:
+                for k, reg in self.registry.items():
+                    x = self._snap_reg(k, reg)
+                    if x:
+                        snaps.append(x)
+
+            for x in snaps:
+                self._snap_write(*x)
 
-    def _snap_reg(self, ptop: str, reg: dict[str, dict[str, Any]]) -> None:
+    def _snap_reg(
+        self, ptop: str, reg: dict[str, dict[str, Any]]
+    ) -> Optional[tuple[str, list[str], dict[str, dict[str, Any]]]]:
+        """
+        mutex(main,reg) me;
+        drops abandoned uploads, then switches to a new journal and
+        returns a copy of reg for _snap_write to save without the lock
+        """
         now = time.time()
         histpath = self.asrv.vfs.histtab.get(ptop)
         if not histpath:
-            return
+            return None
 
         idrop = self.args.snap_drop * 60
         rm = [x for x in reg.values() if x["need"] and now - x["poke"] >= idrop]
@@ -4742,6 +5511,7 @@ class Up2k(object):
             self.log("\n".join([t] + vis))
             for job in rm:
                 del reg[job["wark"]]
+                self._jnl(ptop, "d", job["wark"])
                 try:
                     # remove the filename reservation
                     path = djoin(job["ptop"], job["prel"], job["name"])
@@ -4759,15 +5529,18 @@ class Up2k(object):
                     pass
 
         if self.args.nw or self.args.no_snap:
-            return
+            return None
 
         path = os.path.join(histpath, "up2k.snap")
         if not reg:
-            if ptop not in self.snap_prev or self.snap_prev[ptop] is not None:
+            zs = self.snap_prev.get(ptop, 0)
+            if zs is not None or self.jnl_n.get(ptop):
                 self.snap_prev[ptop] = None
-                if bos.path.exists(path):
-                    bos.unlink(path)
-            return
+                self._jnl_rotate(ptop, histpath)
+                for fp in (path, path[:-4] + "jnl.1"):
+                    if bos.path.exists(fp):
+                        bos.unlink(fp)
+            return None
 
         newest = float(
             max(x["t0"] if "done" in x else x["poke"] for _, x in reg.items())
@@ -4775,14 +5548,34 @@ class Up2k(object):
             else 0
         )
         etag = (len(reg), newest)
-        if etag == self.snap_prev.get(ptop):
-            return
+        if etag == self.snap_prev.get(ptop) and not self.jnl_n.get(ptop):
+            return None
 
+        self.snap_prev[ptop] = etag
+        self._jnl_rotate(ptop, histpath)
+
+        # copy what the uploaders may change while _snap_write is busy
+        reg2 = {}
+        for k, job in reg.items():
+            job = reg2[k] = {k2: v2 for k2, v2 in job.items() if k2 != "cidx"}
+            if "busy" in job:
+                job["busy"] = dict(job["busy"])
+            if job["need"]:
+                job["need"] = HashList(job["need"])
+
+        return path, list(self.droppable[ptop]), reg2
+
+    def _snap_write(
+        self, path: str, drp: list[str], reg: dict[str, dict[str, Any]]
+    ) -> None:
+        t0 = time.time()
+        histpath = os.path.dirname(path)
         if bos.makedirs(histpath):
             hidedir(histpath)
 
         path2 = "{}.{}".format(path, os.getpid())
-        body = {"droppable": self.droppable[ptop], "registry": reg}
+        reg = {k: self._snap_job(x) if x["hash"] else x for k, x in reg.items()}
+        body = {"droppable": drp, "registry": reg}
         j = json.dumps(body, sort_keys=True, separators=(",\n", ": ")).encode("utf-8")
         # j = re.sub(r'"(need|hash)": \[\],\n', "", j)  # bytes=slow, utf8=hungry
         j = j.replace(b'"need": [],\n', b"")  # surprisingly optimal
@@ -4792,8 +5585,121 @@ class Up2k(object):
 
         atomic_move(self.log, path2, path, VF_CAREFUL)
 
-        self.log("snap: %s |%d| %.2fs" % (path, len(reg), time.time() - now))
-        self.snap_prev[ptop] = etag
+        # the snap now has everything from the previous journal
+        jnl = path[:-4] + "jnl.1"
+        if bos.path.exists(jnl):
+            bos.unlink(jnl)
+
+        self.log("snap: %s |%d| %.2fs" % (path, len(reg), time.time() - t0))
+
+    def _snap_job(self, job: dict[str, Any]) -> dict[str, Any]:
+        """json-friendly copy of job; hashlists as lists, no lookup tables"""
+        ret = {k: v for k, v in job.items() if k != "cidx"}
+        for k in ("hash", "need"):
+            if ret.get(k):
+                ret[k] = list(ret[k])
+        return ret
+
+    def _jnl(self, ptop: str, act: str, wark: str, x: Any = None) -> None:
+        """
+        mutex(vol) me;
+        append a registry change to up2k.jnl in the volume's histpath;
+        act n = new/changed job x, c = chunks x received, d = job gone
+        """
+        if self.args.nw or self.args.no_snap:
+            return
+
+        f = self.jnl.get(ptop)
+        if not f:
+            histpath = self.asrv.vfs.histtab.get(ptop)
+            if not histpath:
+                return
+
+            if bos.makedirs(histpath):
+                hidedir(histpath)
+
+            try:
+                f = open(os.path.join(histpath, "up2k.jnl"), "ab", 0)
+            except Exception as ex:
+                self.log("cannot open upload journal: %r" % (ex,), 3)
+                return
+            self.jnl[ptop] = f
+
+        if act == "n":
+            x = self._snap_job(x)
+
+        # leading newline so a line cut short by a crash stays separate
+        zs = "\n" + json.dumps([act, wark, x], separators=(",", ":"))
+        try:
+            f.write(zs.encode("utf-8"))
+            self.jnl_n[ptop] = self.jnl_n.get(ptop, 0) + 1
+        except Exception as ex:
+            self.log("failed to write upload journal: %r" % (ex,), 3)
+
+    def _jnl_rotate(self, ptop: str, histpath: str) -> None:
+        """mutex(main,reg) me; move up2k.jnl to up2k.jnl.1 before a snap"""
+        f = self.jnl.pop(ptop, None)
+        if f:
+            f.close()
+
+        self.jnl_n[ptop] = 0
+        jnl = os.path.join(histpath, "up2k.jnl")
+        if not bos.path.exists(jnl):
+            return
+
+        jnl1 = jnl + ".1"
+        if not bos.path.exists(jnl1):
+            bos.rename(jnl, jnl1)
+            return
+
+        # previous snap failed; keep both
+        with open(jnl1, "ab") as f1, open(jnl, "rb") as f2:
+            shutil.copyfileobj(f2, f1)
+        bos.unlink(jnl)
+
+    def _jnl_replay(self, path: str, reg: dict[str, dict[str, Any]]) -> int:
+        """apply the up2k.jnl at path onto reg (as loaded from up2k.snap)"""
+        n = nbad = 0
+        rxd: dict[str, set[str]] = {}
+        with open(path, "rb") as f:
+            for ln in f:
+                if not ln.strip():
+                    continue
+                try:
+                    act, wark, x = json.loads(ln.decode("utf-8"))
+                except:
+                    nbad += 1
+                    continue
+
+                n += 1
+                if act == "n":
+                    reg[wark] = x
+                    rxd.pop(wark, None)
+                elif act == "c":
+                    try:
+                        rxd[wark].update(x)
+                    except KeyError:
+                        rxd[wark] = set(x)
+                elif act == "d":
+                    reg.pop(wark, None)
+                    rxd.pop(wark, None)
+
+        # poke and t0c are not journaled; chunks arrived just now as far
+        # as snap_drop and the upload-progress listing are concerned
+        now = time.time()
+        for wark, chashes in rxd.items():
+            job = reg.get(wark)
+            if job and job.get("need"):
+                job["need"] = [x for x in job["need"] if x not in chashes]
+                job["poke"] = now
+                if "t0c" not in job:
+                    job["t0c"] = now
+
+        if nbad:
+            t = "ignored %d damaged lines in %s (server crash?)"
+            self.log(t % (nbad, path), 3)
+
+        return n
 
     def _tagger(self) -> None:
         with self.mutex:
@@ -4846,73 +5752,190 @@ class Up2k(object):
             self.log("tagged {} ({}+{})".format(abspath, ntags1, len(tags) - ntags1))
 
     def _hasher(self) -> None:
-        with self.hashq_mutex:
-            self.n_hashq += 1
-
+        """
+        one of --hashq-mt workers; takes a few tasks at a time from the
+        next group (volume/device) in round-robin order, so one busy
+        volume can't starve the others, and indexes each batch with a
+        single db commit
+        """
         while True:
-            with self.hashq_mutex:
-                self.n_hashq -= 1
-            # self.log("hashq {}".format(self.n_hashq))
+            with self.hashq_cond:
+                grp, tasks = self._hashq_take()
+                while not grp:
+                    self.hashq_cond.wait()
+                    grp, tasks = self._hashq_take()
+
+            try:
+                self._hash_batch(tasks)
+            except Exception as ex:
+                self.log("failed to hash %d files: %r" % (len(tasks), ex), 1)
+            finally:
+                with self.hashq_cond:
+                    self.hashq_busy[grp] -= 1
+                    self.n_hashq -= len(tasks)
+                    self.hashq_cond.notify()
 
-            task = self.hashq.get()
-            if len(task) != 9:
-                raise Exception("invalid hash task")
+            if self.stop:
+                return
+
+    def _hashq_take(self) -> tuple[str, list[tuple[Any, ...]]]:
+        """
+        grab a batch from the next group and mark the group as busy;
+        caller must hold hashq_mutex and release the group when done
+        """
+        grp = self._hashq_pick()
+        if not grp:
+            return "", []
+
+        # share the backlog with the other workers
+        q = self.hashq[grp]
+        n = min(64, (len(q) + self.hashq_mt - 1) // self.hashq_mt)
+        tasks = [q.popleft() for _ in range(n)]
+        if not q:
+            del self.hashq[grp]
+            self.hashq_rr.remove(grp)
+
+        self.hashq_busy[grp] = self.hashq_busy.get(grp, 0) + 1
+        return grp, tasks
+
+    def _hashq_pick(self) -> str:
+        """next group with tasks which can take another worker"""
+        gmt = self.args.hashq_gmt
+        for n, grp in enumerate(self.hashq_rr):
+            if gmt and self.hashq_busy.get(grp, 0) >= gmt:
+                continue
+
+            # to the back of the line
+            self.hashq_rr.append(self.hashq_rr.pop(n))
+            return grp
+
+        return ""
+
+    def _hashq_grp(self, ptop: str) -> str:
+        if self.args.hashq_grp != "dev":
+            return ptop
+
+        try:
+            return self.hashq_dev[ptop]
+        except:
+            pass
+
+        try:
+            ret = "dev:%d" % (bos.stat(ptop).st_dev,)
+        except:
+            ret = ptop
+
+        self.hashq_dev[ptop] = ret
+        return ret
+
+    def _hash_batch(self, tasks: list[tuple[Any, ...]]) -> None:
+        ok: dict[str, bool] = {}
+        with self.mutex, self.reg_mutex:
+            for task in tasks:
+                ptop = task[0]
+                if ptop not in ok:
+                    ok[ptop] = bool(self.register_vpath(ptop, task[2]))
+
+        # hash without holding any locks
+        done = []
+        for task in tasks:
+            if self.stop:
+                return
+
+            if not ok[task[0]]:
+                continue
 
             try:
-                if not self._hash_t(task) and self.stop:
-                    return
+                x = self._hash_t(task)
+                if x:
+                    done.append(x)
             except Exception as ex:
                 self.log("failed to hash %s: %s" % (task, ex), 1)
 
+        if not done:
+            return
+
+        # one file at a time, since idx_wark may run xau hooks;
+        # uploaders shouldn't have to wait for all of them
+        curs = set()
+        for task, inf, wark in done:
+            ptop, vtop, _, rd, fn, ip, at, usr, skip_xau, _ = task
+            with self.mutex, self.reg_mutex:
+                try:
+                    self.idx_wark(
+                        self.flags[ptop],
+                        rd,
+                        fn,
+                        inf.st_mtime,
+                        inf.st_size,
+                        ptop,
+                        vtop,
+                        wark,
+                        wark,
+                        "",
+                        usr,
+                        ip,
+                        at,
+                        skip_xau,
+                        False,
+                    )
+                    curs.add(self.cur[ptop])
+                except Exception as ex:
+                    self.log("failed to index %s: %s" % (task, ex), 1)
+
+        # but commit them all at once
+        with self.mutex:
+            for cur in curs:
+                cur.connection.commit()
+
+        if any(x[0][6] and time.time() - x[0][6] > 30 for x in done):
+            with self.rescan_cond:
+                self.rescan_cond.notify_all()
+
+        if self.fx_backlog:
+            self.do_fx_backlog()
+
     def _hash_t(
-        self, task: tuple[str, str, dict[str, Any], str, str, str, float, str, bool]
-    ) -> bool:
-        ptop, vtop, flags, rd, fn, ip, at, usr, skip_xau = task
+        self,
+        task: tuple[
+            str,
+            str,
+            dict[str, Any],
+            str,
+            str,
+            str,
+            float,
+            str,
+            bool,
+            Optional[list[str]],
+        ],
+    ) -> Optional[tuple[tuple[Any, ...], os.stat_result, str]]:
+        ptop, vtop, flags, rd, fn, ip, at, usr, skip_xau, hashes = task
         # self.log("hashq {} pop {}/{}/{}".format(self.n_hashq, ptop, rd, fn))
-        with self.mutex, self.reg_mutex:
-            if not self.register_vpath(ptop, flags):
-                return True
-
         abspath = djoin(ptop, rd, fn)
-        self.log("hashing " + abspath)
         inf = bos.stat(abspath)
+        csz = up2k_chunksize(inf.st_size)
+        if hashes and len(hashes) != (inf.st_size + csz - 1) // csz:
+            self.log("hashed during upload, but size changed; rehashing", 3)
+            hashes = None
+
+        if not hashes:
+            self.log("hashing " + abspath)
+
         if not inf.st_size:
             wark = up2k_wark_from_metadata(
                 self.salt, inf.st_size, int(inf.st_mtime), rd, fn
             )
+        elif hashes:
+            wark = up2k_wark_from_hashlist(self.salt, inf.st_size, hashes)
         else:
             hashes, _ = self._hashlist_from_file(abspath)
             if not hashes:
-                return False
+                return None
 
             wark = up2k_wark_from_hashlist(self.salt, inf.st_size, hashes)
 
-        with self.mutex, self.reg_mutex:
-            self.idx_wark(
-                self.flags[ptop],
-                rd,
-                fn,
-                inf.st_mtime,
-                inf.st_size,
-                ptop,
-                vtop,
-                wark,
-                wark,
-                "",
-                usr,
-                ip,
-                at,
-                skip_xau,
-            )
-
-        if at and time.time() - at > 30:
-            with self.rescan_cond:
-                self.rescan_cond.notify_all()
-
-        if self.fx_backlog:
-            self.do_fx_backlog()
-
-        return True
+        return task, inf, wark
 
     def hash_file(
         self,
@@ -4925,23 +5948,33 @@ class Up2k(object):
         at: float,
         usr: str,
         skip_xau: bool = False,
+        hashes: Optional[list[str]] = None,
     ) -> None:
+        """hashes: from a ChunkHasher, if the uploader had one running"""
         if "e2d" not in flags:
             return
 
-        if self.n_hashq > 1024:
+        nmax = 1024 * self.hashq_mt
+        if self.n_hashq > nmax:
             t = "%d files in hashq; taking a nap"
             self.log(t % (self.n_hashq,), 6)
 
-            for _ in range(self.n_hashq // 1024):
+            for _ in range(self.n_hashq // nmax):
                 time.sleep(0.1)
-                if self.n_hashq < 1024:
+                if self.n_hashq < nmax:
                     break
 
-        zt = (ptop, vtop, flags, rd, fn, ip, at, usr, skip_xau)
-        with self.hashq_mutex:
-            self.hashq.put(zt)
+        zt = (ptop, vtop, flags, rd, fn, ip, at, usr, skip_xau, hashes)
+        grp = self._hashq_grp(ptop)
+        with self.hashq_cond:
+            try:
+                self.hashq[grp].append(zt)
+            except KeyError:
+                self.hashq[grp] = deque([zt])
+                self.hashq_rr.append(grp)
+
             self.n_hashq += 1
+            self.hashq_cond.notify()
 
     def do_fx_backlog(self):
         with self.mutex, self.reg_mutex:
@@ -5035,6 +6068,106 @@ def up2k_chunksize(filesize: int) -> int:
             stepsize *= mul
 
 
+class ChunkTier(object):
+    """the chunk-hashes at one chunksize, for ChunkHasher"""
+
+    __slots__ = ("csz", "nmax", "rem", "hashobj", "hashes", "ok")
+
+    def __init__(self, csz: int) -> None:
+        self.csz = csz
+        self.nmax = 4096 if csz >= 32 * 1024 * 1024 else 256
+        self.rem = csz  # until end of current chunk
+        self.hashobj = hashlib.sha512()
+        self.hashes: list[str] = []
+        self.ok = True
+
+    def update(self, buf: Union[bytes, memoryview]) -> None:
+        while buf:
+            zb = buf[: self.rem]
+            buf = buf[len(zb) :]
+            self.hashobj.update(zb)
+            self.rem -= len(zb)
+            if self.rem:
+                continue
+
+            digest = self.hashobj.digest()[:33]
+            self.hashes.append(ub64enc(digest).decode("ascii"))
+            self.hashobj = hashlib.sha512()
+            self.rem = self.csz
+            if len(self.hashes) > self.nmax:
+                self.ok = False
+                return
+
+    def finish(self) -> list[str]:
+        if self.rem != self.csz:
+            digest = self.hashobj.digest()[:33]
+            self.hashes.append(ub64enc(digest).decode("ascii"))
+
+        return self.hashes
+
+
+class ChunkHasher(object):
+    """
+    up2k chunk-hashes of a file as it is being written, so a finished
+    non-up2k upload can be indexed without reading it back; gives up
+    if the writes are not sequential, or if the final size turns out
+    to need another chunksize than the ones picked from the size hint
+
+    fsz: expected filesize; upto: fsz is just an upper bound (the body
+    of a multipart post), so also hash at the smallest chunksize and
+    carry on with the larger one if the file outgrows it
+    """
+
+    def __init__(self, fsz: int = -1, upto: bool = False) -> None:
+        self.sz = 0
+        self.ok = True
+        self.tiers: list[ChunkTier] = []
+        self.hint(fsz, upto)
+
+    def hint(self, fsz: int, upto: bool = False) -> None:
+        """set the expected filesize; only before anything was hashed"""
+        if self.sz:
+            return
+
+        cszs = [up2k_chunksize(max(fsz, 0))]
+        if upto and cszs[0] != up2k_chunksize(0):
+            cszs.insert(0, up2k_chunksize(0))
+
+        self.tiers = [ChunkTier(x) for x in cszs]
+
+    def update(self, buf: Union[bytes, memoryview]) -> None:
+        if not self.ok:
+            return
+
+        self.sz += len(buf)
+        for tier in self.tiers:
+            tier.update(buf)
+
+        if not self.tiers[0].ok:
+            # too big for this chunksize; no point in continuing
+            self.tiers = [x for x in self.tiers if x.ok]
+            self.ok = bool(self.tiers)
+
+    def update_at(self, ofs: int, buf: Union[bytes, memoryview]) -> None:
+        if ofs != self.sz:
+            self.ok = False
+
+        self.update(buf)
+
+    def finish(self, fsz: int) -> Optional[list[str]]:
+        """the hashlist, if the file is exactly fsz bytes of what was hashed"""
+        if not self.ok or not fsz or fsz != self.sz:
+            return None
+
+        self.ok = False
+        csz = up2k_chunksize(fsz)
+        for tier in self.tiers:
+            if tier.csz == csz:
+                return tier.finish()
+
+        return None
+
+
 def up2k_wark_from_hashlist(salt: str, filesize: int, hashes: list[str]) -> str:
     """server-reproducible file identifier, independent of name or location"""
     values = [salt, str(filesize)] + hashes
@@ -26,6 +26,7 @@ import sys
 import threading
 import time
 import traceback
+import zlib
 from collections import Counter
 
 from ipaddress import IPv4Address, IPv4Network, IPv6Address, IPv6Network
@@ -129,6 +130,36 @@ try:
 except:
     HAVE_PSUTIL = False
 
+try:
+    if os.environ.get("PRTY_NO_ZSTD"):
+        raise Exception()
+
+    try:
+        from compression import zstd  # type: ignore  # py3.14+
+
+        def zstd_enc(buf: bytes, lv: int) -> bytes:
+            return zstd.compress(buf, lv)
+
+    except ImportError:
+        import zstandard
+
+        def zstd_enc(buf: bytes, lv: int) -> bytes:
+            return zstandard.ZstdCompressor(level=lv).compress(buf)
+
+    HAVE_ZSTD = True
+except:
+    HAVE_ZSTD = False
+
+try:
+    if os.environ.get("PRTY_NO_BROTLI"):
+        raise Exception()
+
+    import brotli
+
+    HAVE_BROTLI = True
+except:
+    HAVE_BROTLI = False
+
 if True:  # pylint: disable=using-constant-test
     import types
     from collections.abc import Callable, Iterable
@@ -155,7 +186,7 @@ if TYPE_CHECKING:
 
     from .authsrv import VFS
     from .broker_util import BrokerCli
-    from .up2k import Up2k
+    from .up2k import ChunkHasher, Up2k
 
 FAKE_MP = False
 
@@ -191,6 +222,10 @@ except:
     HAVE_IPV6 = False
 
 
+HAVE_PWRITE = hasattr(os, "pwrite")  # not on windows / py2
+HAVE_PREAD = hasattr(os, "pread")
+
+
 try:
     struct.unpack(b">i", b"idgi")
     spack = struct.pack  # type: ignore
@@ -266,6 +301,7 @@ IMPLICATIONS = [
     ["e2v", "e2d"],
     ["hardlink_only", "hardlink"],
     ["hardlink", "dedup"],
+    ["reflink", "dedup"],
     ["tftpvv", "tftpv"],
     ["smbw", "smb"],
     ["smb1", "smb"],
@@ -620,6 +656,52 @@ class Cooldown(object):
             return ret
 
 
+class StatLock(object):
+    """threading.Lock which keeps track of time spent waiting for it"""
+
+    def __init__(self) -> None:
+        self.lk = threading.Lock()
+        self.n = 0  # num acquired
+        self.tw = 0.0  # total wait
+        self.tmax = 0.0  # max wait
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        if self.lk.acquire(False):
+            self.n += 1
+            return True
+
+        if not blocking:
+            return False
+
+        t0 = time.time()
+        if timeout < 0:
+            ok = self.lk.acquire()
+        else:
+            ok = self.lk.acquire(True, timeout)
+
+        if ok:
+            td = time.time() - t0
+            self.n += 1
+            self.tw += td
+            if self.tmax < td:
+                self.tmax = td
+
+        return ok
+
+    def release(self) -> None:
+        self.lk.release()
+
+    def stats(self) -> list[float]:
+        return [self.n, self.tw, self.tmax]
+
+    def __enter__(self) -> "StatLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *a: Any) -> None:
+        self.lk.release()
+
+
 class HLog(logging.Handler):
     def __init__(self, log_func: "RootLogger") -> None:
         logging.Handler.__init__(self)
@@ -738,6 +820,54 @@ class _Unrecv(object):
         self.s = s
         self.log = log
         self.buf: bytes = b""
+        self.rbuf: Optional[bytearray] = None
+        self.rmv: Optional[memoryview] = None
+        self.recv_into = None if PY2 else getattr(s, "recv_into", None)
+
+    def drop_rbuf(self) -> None:
+        self.rbuf = self.rmv = None
+
+    def recv_mv(self, nbytes: int, spins: int = 1) -> Union[bytes, memoryview]:
+        """
+        like recv, but reads into a reusable buffer; the returned
+        memoryview is only valid until the next recv_mv
+        """
+        if self.buf or not self.recv_into:
+            return self.recv(nbytes, spins)
+
+        mv = self.rmv
+        if not mv or len(mv) < nbytes:
+            self.rbuf = bytearray(nbytes)
+            mv = self.rmv = memoryview(self.rbuf)
+
+        return mv[: self.recv_to(mv[:nbytes], spins)]
+
+    def recv_to(self, mv: memoryview, spins: int = 1) -> int:
+        """recv into mv (up to its length); returns num bytes"""
+        if self.buf or not self.recv_into:
+            zb = self.recv(len(mv), spins)
+            n = len(zb)
+            mv[:n] = zb
+            return n
+
+        while True:
+            try:
+                n = self.recv_into(mv, len(mv))
+                break
+            except socket.timeout:
+                spins -= 1
+                if spins <= 0:
+                    n = 0
+                    break
+                continue
+            except:
+                n = 0
+                break
+
+        if not n:
+            raise UnrecvEOF("client stopped sending data")
+
+        return n
 
     def recv(self, nbytes: int, spins: int = 1) -> bytes:
         if self.buf:
@@ -818,6 +948,17 @@ class _LUnrecv(object):
 
         return ret
 
+    def recv_mv(self, nbytes: int, spins: int = 1) -> bytes:
+        return self.recv(nbytes, spins)
+
+    def recv_to(self, mv: memoryview, spins: int = 1) -> int:
+        zb = self.recv(len(mv), spins)
+        mv[: len(zb)] = zb
+        return len(zb)
+
+    def drop_rbuf(self) -> None:
+        pass
+
     def recv_ex(self, nbytes: int, raise_on_trunc: bool = True) -> bytes:
         """read an exact number of bytes"""
         try:
@@ -1011,9 +1152,11 @@ class ProgressPrinter(threading.Thread):
 
 
 class MTHash(object):
-    def __init__(self, cores: int):
+    def __init__(self, cores: int, bufsz: int = 1024 * 1024 * 12):
         self.pp: Optional[ProgressPrinter] = None
         self.f: Optional[typing.BinaryIO] = None
+        self.fn: Union[str, bytes] = ""
+        self.bufsz = bufsz
         self.sz = 0
         self.csz = 0
         self.stop = False
@@ -1039,6 +1182,9 @@ class MTHash(object):
             self.f = f
             self.sz = fsz
             self.csz = chunksz
+            if not HAVE_PREAD:
+                zs = getattr(f, "name", "")
+                self.fn = zs if isinstance(zs, (str, bytes)) else ""
 
             chunks: dict[int, tuple[str, int, int]] = {}
             nchunks = int(math.ceil(fsz / chunksz))
@@ -1066,6 +1212,7 @@ class MTHash(object):
                 ret.append(chunks[n])
 
             self.f = None
+            self.fn = ""
             self.csz = 0
             self.sz = 0
             return ret
@@ -1089,17 +1236,41 @@ class MTHash(object):
 
         assert f  # !rm
         hashobj = hashlib.sha512()
-        while chunk_rem > 0:
-            with self.imutex:
-                f.seek(ofs)
-                buf = f.read(min(chunk_rem, 1024 * 1024 * 12))
+        if HAVE_PREAD:
+            # positional reads on the shared fd; no lock, no seek
+            fd = f.fileno()
+            while chunk_rem > 0:
+                buf = os.pread(fd, min(chunk_rem, self.bufsz), ofs)
+                if not buf:
+                    raise Exception("EOF at " + str(ofs))
+
+                hashobj.update(buf)
+                chunk_rem -= len(buf)
+                ofs += len(buf)
+        elif self.fn:
+            # no pread (windows, py2); a private fd for each chunk instead
+            with open(self.fn, "rb", 0) as f2:
+                f2.seek(ofs)
+                while chunk_rem > 0:
+                    buf = f2.read(min(chunk_rem, self.bufsz))
+                    if not buf:
+                        raise Exception("EOF at " + str(ofs))
+
+                    hashobj.update(buf)
+                    chunk_rem -= len(buf)
+                    ofs += len(buf)
+        else:
+            while chunk_rem > 0:
+                with self.imutex:
+                    f.seek(ofs)
+                    buf = f.read(min(chunk_rem, self.bufsz))
 
-            if not buf:
-                raise Exception("EOF at " + str(ofs))
+                if not buf:
+                    raise Exception("EOF at " + str(ofs))
 
-            hashobj.update(buf)
-            chunk_rem -= len(buf)
-            ofs += len(buf)
+                hashobj.update(buf)
+                chunk_rem -= len(buf)
+                ofs += len(buf)
 
         bdig = hashobj.digest()[:33]
         udig = ub64enc(bdig).decode("ascii")
@@ -1795,13 +1966,13 @@ def get_boundary(headers: dict[str, str]) -> str:
 
 def read_header(sr: Unrecv, t_idle: int, t_tot: int) -> list[str]:
     t0 = time.time()
-    ret = b""
+    ret = bytearray()
     while True:
         if time.time() - t0 >= t_tot:
             return []
 
         try:
-            ret += sr.recv(1024, t_idle // 2)
+            buf = sr.recv_mv(4096, t_idle // 2)
         except:
             if not ret:
                 return []
@@ -1812,7 +1983,11 @@ def read_header(sr: Unrecv, t_idle: int, t_tot: int) -> list[str]:
                 log=ret.decode("utf-8", "replace"),
             )
 
-        ofs = ret.find(b"\r\n\r\n")
+        # only scan the new data (and the 3 bytes before it)
+        ofs = max(0, len(ret) - 3)
+        ret += buf
+        ofs = ret.find(b"\r\n\r\n", ofs)
+
         if ofs < 0:
             if len(ret) > 1024 * 32:
                 raise Pebkac(400, "header 2big")
@@ -1820,7 +1995,7 @@ def read_header(sr: Unrecv, t_idle: int, t_tot: int) -> list[str]:
                 continue
 
         if len(ret) > ofs + 4:
-            sr.unrecv(ret[ofs + 4 :])
+            sr.unrecv(bytes(ret[ofs + 4 :]))
 
         return ret[:ofs].decode("utf-8", "surrogateescape").lstrip("\r\n").split("\r\n")
 
@@ -1896,12 +2071,70 @@ MONTHS = "Jan Feb Mar Apr May Jun Jul Aug Sep Oct Nov Dec".split()
 RFC2822 = "%s, %02d %s %04d %02d:%02d:%02d GMT"
 
 
+_DATE_NOW = (0, "")
+
+
 def formatdate(ts: Optional[float] = None) -> str:
+    global _DATE_NOW
+    if ts is None:
+        # current time; same string for every response within a second
+        now = int(time.time())
+        zt = _DATE_NOW
+        if zt[0] == now:
+            return zt[1]
+
+        ret = formatdate(now)
+        _DATE_NOW = (now, ret)
+        return ret
+
     # gmtime ~= datetime.fromtimestamp(ts, UTC).timetuple()
     y, mo, d, h, mi, s, wd, _, _ = time.gmtime(ts)
     return RFC2822 % (WKDAYS[wd], d, MONTHS[mo - 1], y, h, mi, s)
 
 
+CMP_ENCS = ["zstd", "br", "gzip"]
+
+RE_CMP_NO = re.compile(r"^(?:image|audio|video)/|zip|zstd|compress|xz|rar|woff")
+
+
+def cmp_avail() -> list[str]:
+    """available response-compressors, best first"""
+    ret = []
+    for enc, have in zip(CMP_ENCS, [HAVE_ZSTD, HAVE_BROTLI, True]):
+        if have:
+            ret.append(enc)
+    return ret
+
+
+def cmp_pick(accept_enc: str, encs: list[str]) -> str:
+    """first of encs which the client accepts, or blank if none"""
+    ok = set()
+    for zs in accept_enc.lower().split(","):
+        zsl = zs.split(";")
+        zs = zsl[0].strip()
+        if len(zsl) > 1 and re.match(r"q=0(\.0*)?$", zsl[1].strip()):
+            continue
+        ok.add(zs)
+
+    for enc in encs:
+        if enc in ok:
+            return enc
+
+    return ""
+
+
+def cmp_buf(enc: str, buf: bytes, lv: int) -> bytes:
+    if enc == "zstd":
+        return zstd_enc(buf, lv)
+
+    if enc == "br":
+        return brotli.compress(buf, quality=min(lv, 11))
+
+    # wbits 31 = gzip container
+    zco = zlib.compressobj(min(lv, 9), zlib.DEFLATED, 31)
+    return zco.compress(buf) + zco.flush()
+
+
 def gencookie(k: str, v: str, r: str, tls: bool, dur: int = 0, txt: str = "") -> str:
     v = v.replace("%", "%25").replace(";", "%3B")
     if dur:
@@ -2492,6 +2725,65 @@ def wunlink(log: "NamedLogger", abspath: str, flags: dict[str, Any]) -> bool:
     return _fs_mvrm(log, abspath, "", False, flags)
 
 
+# linux/fs.h; btrfs, xfs, bcachefs (and some nfs/cifs) support these
+FICLONE = 0x40049409
+FICLONERANGE = 0x4020940D
+
+
+def reflink(src: str, dst: str) -> None:
+    """
+    create dst as a copy-on-write clone of src (ioctl FICLONE);
+    raises if the filesystem (or os) can't, leaving no dst behind
+    """
+    if not sys.platform.startswith("linux"):
+        raise OSError(errno.ENOSYS, "reflink is linux-only")
+
+    fd = os.open(fsenc(dst), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    try:
+        with open(fsenc(src), "rb") as fi:
+            fcntl.ioctl(fd, FICLONE, fi.fileno())
+    except:
+        os.close(fd)
+        os.unlink(fsenc(dst))
+        raise
+
+    os.close(fd)
+
+
+def clone_range(fd: int, sofs: int, dofs: int, sz: int) -> str:
+    """
+    copy sz bytes within the open file fd from sofs to dofs in-kernel;
+    shares the extents (FICLONERANGE) if possible, else copy_file_range.
+    returns the method used, or blank if both failed (caller must copy)
+    """
+    if not sys.platform.startswith("linux"):
+        return ""
+
+    try:
+        zb = struct.pack(b"=qQQQ", fd, sofs, sz, dofs)
+        fcntl.ioctl(fd, FICLONERANGE, zb)
+        return "reflink"
+    except:
+        pass
+
+    if not hasattr(os, "copy_file_range"):
+        return ""
+
+    try:
+        while sz:
+            zi = os.copy_file_range(fd, fd, sz, sofs, dofs)
+            if not zi:
+                return ""
+
+            sofs += zi
+            dofs += zi
+            sz -= zi
+
+        return "copy_file_range"
+    except:
+        return ""
+
+
 def get_df(abspath: str) -> tuple[Optional[int], Optional[int]]:
     try:
         # some fuses misbehave
@@ -2564,14 +2856,15 @@ def shut_socket(log: "NamedLogger", sck: socket.socket, timeout: int = 3) -> Non
 
 def read_socket(
     sr: Unrecv, bufsz: int, total_size: int
-) -> Generator[bytes, None, None]:
+) -> Generator[Union[bytes, memoryview], None, None]:
+    # each yielded buffer is only valid until the next one is requested
     remains = total_size
     while remains > 0:
         if bufsz > remains:
             bufsz = remains
 
         try:
-            buf = sr.recv(bufsz)
+            buf = sr.recv_mv(bufsz)
         except OSError:
             t = "client d/c during binary post after {} bytes, {} bytes remaining"
             raise Pebkac(400, t.format(total_size - remains, remains))
@@ -2580,17 +2873,19 @@ def read_socket(
         yield buf
 
 
-def read_socket_unbounded(sr: Unrecv, bufsz: int) -> Generator[bytes, None, None]:
+def read_socket_unbounded(
+    sr: Unrecv, bufsz: int
+) -> Generator[Union[bytes, memoryview], None, None]:
     try:
         while True:
-            yield sr.recv(bufsz)
+            yield sr.recv_mv(bufsz)
     except:
         return
 
 
 def read_socket_chunked(
     sr: Unrecv, bufsz: int, log: Optional["NamedLogger"] = None
-) -> Generator[bytes, None, None]:
+) -> Generator[Union[bytes, memoryview], None, None]:
     err = "upload aborted: expected chunk length, got [{}] |{}| instead"
     while True:
         buf = b""
@@ -2721,10 +3016,11 @@ def yieldfile(fn: str, bufsz: int) -> Generator[bytes, None, None]:
 
 
 def hashcopy(
-    fin: Generator[bytes, None, None],
+    fin: Generator[Union[bytes, memoryview], None, None],
     fout: Union[typing.BinaryIO, typing.IO[Any]],
     slp: float = 0,
     max_sz: int = 0,
+    u2h: Optional["ChunkHasher"] = None,
 ) -> tuple[int, str, str]:
     hashobj = hashlib.sha512()
     tlen = 0
@@ -2734,6 +3030,8 @@ def hashcopy(
             continue
 
         hashobj.update(buf)
+        if u2h:
+            u2h.update(buf)
         fout.write(buf)
         if slp:
             time.sleep(slp)
@@ -2743,6 +3041,91 @@ def hashcopy(
     return tlen, hashobj.hexdigest(), digest_b64
 
 
+class HashPw(object):
+    """
+    pipelined hashcopy into an fd (os.pwrite); receives straight into
+    one of two buffers while a helper thread hashes and writes the
+    other one; one of these per connection, reused for each chunk
+    """
+
+    def __init__(self, bufsz: int = 1024 * 1024) -> None:
+        self.bufsz = bufsz
+        self.free: Queue[memoryview] = Queue()
+        self.work: Queue[Optional[tuple[Any, ...]]] = Queue()
+        for _ in range(2):
+            self.free.put(memoryview(bytearray(bufsz)))
+
+        self.thr = Daemon(self._worker, "hashcopy_pw")
+
+    def close(self) -> None:
+        self.work.put(None)
+
+    def _worker(self) -> None:
+        while True:
+            zt = self.work.get()
+            if not zt:
+                return
+
+            mv, n, fd, ofs, hashobj, slp, err = zt
+            if not err:
+                wmv = mv[:n]
+                try:
+                    hashobj.update(wmv)
+                    while wmv:
+                        zi = os.pwrite(fd, wmv, ofs)
+                        ofs += zi
+                        wmv = wmv[zi:]
+                    if slp:
+                        time.sleep(slp)
+                except Exception as ex:
+                    err.append(ex)
+
+            self.free.put(mv)
+
+    def copy(
+        self, sr: Unrecv, nbytes: int, fd: int, ofs: int, slp: float = 0
+    ) -> tuple[int, str, str]:
+        """receive nbytes from sr into fd at ofs; returns like hashcopy"""
+        hashobj = hashlib.sha512()
+        err: list[Exception] = []
+        tlen = 0
+        mv = None
+        try:
+            while tlen < nbytes:
+                mv = self.free.get()
+                if err:
+                    raise err[0]
+
+                want = min(self.bufsz, nbytes - tlen)
+                n = 0
+                try:
+                    while n < want:
+                        n += sr.recv_to(mv[n:want])
+                except OSError:
+                    tlen += n
+                    t = "client d/c during binary post after {} bytes, {} bytes remaining"
+                    raise Pebkac(400, t.format(tlen, nbytes - tlen))
+
+                self.work.put((mv, n, fd, ofs + tlen, hashobj, slp, err))
+                mv = None
+                tlen += n
+        finally:
+            if mv is not None:
+                self.free.put(mv)
+
+            # wait for the helper to finish this chunk
+            zl = [self.free.get() for _ in range(2)]
+            for mv in zl:
+                self.free.put(mv)
+
+        if err:
+            raise err[0]
+
+        digest_b64 = ub64enc(hashobj.digest()[:33]).decode("ascii")
+
+        return tlen, hashobj.hexdigest(), digest_b64
+
+
 def sendfile_py(
     log: "NamedLogger",
     lower: int,
@@ -1652,6 +1652,10 @@ function up2k_init(subtle) {
             if (nhs + nup < parallel_uploads)
                 return true;
 
+            // lots of tiny files; hash ahead so they can share handshakes
+            if (nhs < 64 && st.bytes.hashed - st.bytes.finished < 1024 * 1024 * 16)
+                return true;
+
             if (!uc.az)
                 return nhs < 2;
 
@@ -2239,298 +2243,357 @@ function up2k_init(subtle) {
         if (t.done)
             return console.log('done; skip hs', t.name, t);
 
-        st.busy.handshake.push(t);
-        t.keepalive = undefined;
-        t.t_busied = me;
+        // more files for the same folder? handshake them all at once
+        var ts = [t],
+            ncids = t.hash.length;
+
+        if (!t.srch && !keepalive)
+            while (ts.length < 64 && st.todo.handshake.length) {
+                var t2 = st.todo.handshake[0];
+                if (t2.done || t2.srch || t2.keepalive || t2.purl !== t.purl ||
+                    t2.cooldown > me || t2.n - st.car > 64 ||
+                    ncids + t2.hash.length > 4096)
+                    break;
+
+                ncids += t2.hash.length;
+                ts.push(st.todo.handshake.shift());
+            }
+
+        var tmo = 42000,
+            reqs = [];
+
+        for (var a = 0; a < ts.length; a++) {
+            var t2 = ts[a];
+            st.busy.handshake.push(t2);
+            t2.keepalive = undefined;
+            t2.t_busied = me;
+
+            if (!t2.srch && !t2.t_handshake)
+                pvis.seth(t2.n, 2, L.u_hs);
+
+            var req = {
+                "name": t2.name,
+                "size": t2.size,
+                "lmod": t2.lmod,
+                "life": st.lifetime,
+                "hash": t2.hash
+            };
+            if (t2.srch)
+                req.srch = 1;
+            else if (t2.rand)
+                req.rand = true;
+            else if (t2.umod)
+                req.umod = true;
+
+            reqs.push(req);
+            if (!t2.srch && !t2.t_uploaded)
+                tmo += t2.size / (1048 * 20);  // safededup 20M/s hdd
+        }
 
         if (keepalive)
             console.log("sending keepalive handshake", t.name, t);
 
-        if (!t.srch && !t.t_handshake)
-            pvis.seth(t.n, 2, L.u_hs);
+        if (ts.length > 1)
+            console.log("batch handshake", ts.length, t.purl);
 
         var xhr = new XMLHttpRequest();
         xhr.onerror = xhr.ontimeout = function () {
-            if (t.t_busied != me)  // t.done ok
-                return console.log('zombie handshake onerror', t.name, t);
-
-            if (!toast.visible)
-                toast.warn(9.98, L.u_eneths + "\n\nfile: " + t.name, t);
-
-            console.log('handshake onerror, retrying', t.name, t);
-            apop(st.busy.handshake, t);
-            st.todo.handshake.unshift(t);
-            t.cooldown = Date.now() + 5000 + Math.floor(Math.random() * 3000);
-            t.keepalive = keepalive;
+            for (var a = 0; a < ts.length; a++)
+                hs_neterr(ts[a], me, keepalive);
         };
         var orz = function (e) {
-            if (t.t_busied != me || t.done)
-                return console.log('zombie handshake onload', t.name, t);
+            if (ts.length == 1)
+                return hs_rsp(t, me, keepalive, xhr);
 
-            if (xhr.status == 200) {
-                try {
-                    var response = JSON.parse(xhr.responseText);
-                }
-                catch (ex) {
-                    apop(st.busy.handshake, t);
-                    st.todo.handshake.unshift(t);
-                    t.cooldown = Date.now() + 5000 + Math.floor(Math.random() * 3000);
-                    var txt = t.t_uploading ? L.u_ehsfin : t.srch ? L.u_ehssrch : L.u_ehsinit;
-                    return toast.err(0, txt + '\n\n' + L.badreply + ':\n\n' + unpre(xhr.responseText));
-                }
+            var rsps = null;
+            try {
+                rsps = JSON.parse(xhr.responseText);
+                if (rsps.length !== ts.length)
+                    rsps = null;
+            }
+            catch (ex) { }
+
+            for (var a = 0; a < ts.length; a++) {
+                var rsp = rsps && rsps[a];
+                if (xhr.status != 200)
+                    hs_rsp(ts[a], me, false, xhr);
+                else if (!rsp)
+                    hs_rsp(ts[a], me, false, { "status": 200, "responseText": "" });
+                else if (rsp.error)
+                    hs_rsp(ts[a], me, false, { "status": rsp.status, "responseText": rsp.error });
+                else
+                    hs_rsp(ts[a], me, false, xhr, rsp);
+            }
+        };
+        xhr.onload = function (e) {
+            try { orz(e); } catch (ex) { vis_exh(ex + '', 'up2k.js', '', '', ex); }
+        };
 
-                t.t_handshake = Date.now();
-                if (keepalive) {
-                    apop(st.busy.handshake, t);
-                    tasker();
-                    return;
-                }
+        xhr.open('POST', t.purl, true);
+        xhr.responseType = 'text';
+        xhr.timeout = Math.floor(tmo);
+        xhr.send(JSON.stringify(ts.length > 1 ? reqs : reqs[0]));
+    }
 
-                if (toast.tag === t)
-                    toast.ok(5, L.u_fixed);
+    function hs_neterr(t, me, keepalive) {
+        if (t.t_busied != me)  // t.done ok
+            return console.log('zombie handshake onerror', t.name, t);
 
-                if (!response.name) {
-                    var msg = '',
-                        smsg = '';
+        if (!toast.visible)
+            toast.warn(9.98, L.u_eneths + "\n\nfile: " + t.name, t);
 
-                    if (!response || !response.hits || !response.hits.length) {
-                        smsg = '404';
-                        msg = (L.u_s404 + ' <a href="#" onclick="fsearch_explain(' +
-                            (has(perms, 'write') ? '0' : '1') + ')" class="fsearch_explain">(' + L.u_expl + ')</a>');
-                    }
-                    else {
-                        smsg = 'found';
-                        var msg = [];
-                        for (var a = 0, aa = Math.min(20, response.hits.length); a < aa; a++) {
-                            var hit = response.hits[a],
-                                tr = unix2iso(hit.ts),
-                                tu = unix2iso(t.lmod),
-                                diff = parseInt(t.lmod) - parseInt(hit.ts),
-                                cdiff = (Math.abs(diff) <= 2) ? '3c0' : 'f0b',
-                                sdiff = '<span style="color:#' + cdiff + '">diff ' + diff;
-
-                            msg.push(linksplit(hit.rp).join(' / ') + '<br /><small>' + tr + ' (srv), ' + tu + ' (You), ' + sdiff + '</small></span>');
-                        }
-                        msg = msg.join('<br />\n');
-                    }
-                    pvis.seth(t.n, 2, msg);
-                    pvis.seth(t.n, 1, smsg);
-                    pvis.move(t.n, smsg == '404' ? 'ng' : 'ok');
-                    apop(st.busy.handshake, t);
-                    st.bytes.finished += t.size;
-                    t.done = true;
-                    t.fobj = null;
-                    tasker();
-                    return;
-                }
+        console.log('handshake onerror, retrying', t.name, t);
+        apop(st.busy.handshake, t);
+        st.todo.handshake.unshift(t);
+        t.cooldown = Date.now() + 5000 + Math.floor(Math.random() * 3000);
+        t.keepalive = keepalive;
+    }
 
-                t.sprs = response.sprs;
+    function hs_rsp(t, me, keepalive, xhr, response) {
+        if (t.t_busied != me || t.done)
+            return console.log('zombie handshake onload', t.name, t);
 
-                var fk = response.fk,
-                    rsp_purl = url_enc(response.purl),
-                    rename = rsp_purl !== t.purl || response.name !== t.name;
+        if (xhr.status == 200) {
+            try {
+                if (!response)
+                    response = JSON.parse(xhr.responseText);
+            }
+            catch (ex) {
+                apop(st.busy.handshake, t);
+                st.todo.handshake.unshift(t);
+                t.cooldown = Date.now() + 5000 + Math.floor(Math.random() * 3000);
+                var txt = t.t_uploading ? L.u_ehsfin : t.srch ? L.u_ehssrch : L.u_ehsinit;
+                return toast.err(0, txt + '\n\n' + L.badreply + ':\n\n' + unpre(xhr.responseText));
+            }
 
-                if (rename || fk) {
-                    if (rename)
-                        console.log("server-rename [" + t.purl + "] [" + t.name + "] to [" + rsp_purl + "] [" + response.name + "]");
+            t.t_handshake = Date.now();
+            if (keepalive) {
+                apop(st.busy.handshake, t);
+                tasker();
+                return;
+            }
 
-                    t.purl = rsp_purl;
-                    t.name = response.name;
+            if (toast.tag === t)
+                toast.ok(5, L.u_fixed);
 
-                    var url = t.purl + uricom_enc(t.name);
-                    if (fk) {
-                        t.fk = fk;
-                        url += '?k=' + fk;
-                    }
+            if (!response.name) {
+                var msg = '',
+                    smsg = '';
 
-                    pvis.seth(t.n, 0, linksplit(url).join(' / '));
+                if (!response || !response.hits || !response.hits.length) {
+                    smsg = '404';
+                    msg = (L.u_s404 + ' <a href="#" onclick="fsearch_explain(' +
+                        (has(perms, 'write') ? '0' : '1') + ')" class="fsearch_explain">(' + L.u_expl + ')</a>');
                 }
-
-                var chunksize = get_chunksize(t.size),
-                    cdr_idx = Math.ceil(t.size / chunksize) - 1,
-                    cdr_sz = (t.size % chunksize) || chunksize,
-                    cbd = [];
-
-                for (var a = 0; a <= cdr_idx; a++) {
-                    cbd.push(a == cdr_idx ? cdr_sz : chunksize);
+                else {
+                    smsg = 'found';
+                    var msg = [];
+                    for (var a = 0, aa = Math.min(20, response.hits.length); a < aa; a++) {
+                        var hit = response.hits[a],
+                            tr = unix2iso(hit.ts),
+                            tu = unix2iso(t.lmod),
+                            diff = parseInt(t.lmod) - parseInt(hit.ts),
+                            cdiff = (Math.abs(diff) <= 2) ? '3c0' : 'f0b',
+                            sdiff = '<span style="color:#' + cdiff + '">diff ' + diff;
+
+                        msg.push(linksplit(hit.rp).join(' / ') + '<br /><small>' + tr + ' (srv), ' + tu + ' (You), ' + sdiff + '</small></span>');
+                    }
+                    msg = msg.join('<br />\n');
                 }
+                pvis.seth(t.n, 2, msg);
+                pvis.seth(t.n, 1, smsg);
+                pvis.move(t.n, smsg == '404' ? 'ng' : 'ok');
+                apop(st.busy.handshake, t);
+                st.bytes.finished += t.size;
+                t.done = true;
+                t.fobj = null;
+                tasker();
+                return;
+            }
 
-                t.postlist = [];
-                t.wark = response.wark;
-                var missing = response.hash;
-                for (var a = 0; a < missing.length; a++) {
-                    var idx = t.hash.indexOf(missing[a]);
-                    if (idx < 0)
-                        return modal.alert('wtf negative index for hash "{0}" in task:\n{1}'.format(
-                            missing[a], JSON.stringify(t)));
-
-                    t.postlist.push(idx);
-                    cbd[idx] = 0;
-                }
+            t.sprs = response.sprs;
 
-                pvis.setat(t.n, cbd);
-                pvis.prog(t, 0, cbd[0]);
-
-                var done = true,
-                    msg = 'done';
-
-                if (t.postlist.length) {
-                    var arr = st.todo.upload,
-                        sort = arr.length && arr[arr.length - 1].nfile > t.n;
-
-                    if (!t.stitch_sz) {
-                        // keep all connections busy
-                        var bpc = (st.bytes.total - st.bytes.finished) / (parallel_uploads || 1),
-                            ocs = 1024 * 1024,
-                            stp = 1024 * 512,
-                            ccs = ocs;
-                        while (ccs < bpc) {
-                            ocs = ccs;
-                            ccs += stp; if (ccs < bpc) ocs = ccs;
-                            ccs += stp; stp *= 2;
-                        }
-                        ocs = Math.floor(ocs / 1024 / 1024);
-                        t.stitch_sz = Math.min(ocs, stitch_tgt);
-                    }
+            var fk = response.fk,
+                rsp_purl = url_enc(response.purl),
+                rename = rsp_purl !== t.purl || response.name !== t.name;
 
-                    for (var a = 0; a < t.postlist.length; a++) {
-                        var nparts = [], tbytes = 0, stitch = t.stitch_sz;
-                        if (t.nojoin && t.nojoin - t.postlist.length < 6)
-                            stitch = 1;
-
-                        --a;
-                        for (var b = 0; b < stitch; b++) {
-                            nparts.push(t.postlist[++a]);
-                            tbytes += chunksize;
-                            if (tbytes + chunksize > stitch * 1024 * 1024 || t.postlist[a + 1] - t.postlist[a] !== 1)
-                                break;
-                        }
-                        arr.push({
-                            'nfile': t.n,
-                            'nparts': nparts
-                        });
-                    }
-                    t.nojoin = 0;
+            if (rename || fk) {
+                if (rename)
+                    console.log("server-rename [" + t.purl + "] [" + t.name + "] to [" + rsp_purl + "] [" + response.name + "]");
 
-                    msg = null;
-                    done = false;
+                t.purl = rsp_purl;
+                t.name = response.name;
 
-                    if (sort)
-                        arr.sort(function (a, b) {
-                            return a.nfile < b.nfile ? -1 :
-                            /*  */ a.nfile > b.nfile ? 1 :
-                            /*  */ a.nparts[0] < b.nparts[0] ? -1 : 1;
-                        });
+                var url = t.purl + uricom_enc(t.name);
+                if (fk) {
+                    t.fk = fk;
+                    url += '?k=' + fk;
                 }
 
-                if (msg)
-                    pvis.seth(t.n, 1, msg);
+                pvis.seth(t.n, 0, linksplit(url).join(' / '));
+            }
 
-                apop(st.busy.handshake, t);
+            var chunksize = get_chunksize(t.size),
+                cdr_idx = Math.ceil(t.size / chunksize) - 1,
+                cdr_sz = (t.size % chunksize) || chunksize,
+                cbd = [];
 
-                if (done) {
-                    t.done = true;
-                    t.fobj = null;
-                    st.bytes.finished += t.size - t.bytes_uploaded;
-                    var spd1 = (t.size / ((t.t_hashed - t.t_hashing) / 1000.)) / (1024 * 1024.),
-                        spd2 = (t.size / ((t.t_uploaded - t.t_uploading) / 1000.)) / (1024 * 1024.);
+            for (var a = 0; a <= cdr_idx; a++) {
+                cbd.push(a == cdr_idx ? cdr_sz : chunksize);
+            }
 
-                    pvis.seth(t.n, 2, 'hash {0}, up {1} MB/s'.format(
-                        f2f(spd1, 2), !isNum(spd2) ? '--' : f2f(spd2, 2)));
+            t.postlist = [];
+            t.wark = response.wark;
+            var missing = response.hash;
+            for (var a = 0; a < missing.length; a++) {
+                var idx = t.hash.indexOf(missing[a]);
+                if (idx < 0)
+                    return modal.alert('wtf negative index for hash "{0}" in task:\n{1}'.format(
+                        missing[a], JSON.stringify(t)));
+
+                t.postlist.push(idx);
+                cbd[idx] = 0;
+            }
 
-                    pvis.move(t.n, 'ok');
-                    if (!pvis.ctr.bz && !pvis.ctr.q)
-                        uptoast();
+            pvis.setat(t.n, cbd);
+            pvis.prog(t, 0, cbd[0]);
+
+            var done = true,
+                msg = 'done';
+
+            if (t.postlist.length) {
+                var arr = st.todo.upload,
+                    sort = arr.length && arr[arr.length - 1].nfile > t.n;
+
+                if (!t.stitch_sz) {
+                    // keep all connections busy
+                    var bpc = (st.bytes.total - st.bytes.finished) / (parallel_uploads || 1),
+                        ocs = 1024 * 1024,
+                        stp = 1024 * 512,
+                        ccs = ocs;
+                    while (ccs < bpc) {
+                        ocs = ccs;
+                        ccs += stp; if (ccs < bpc) ocs = ccs;
+                        ccs += stp; stp *= 2;
+                    }
+                    ocs = Math.floor(ocs / 1024 / 1024);
+                    t.stitch_sz = Math.min(ocs, stitch_tgt);
                 }
-                else {
-                    if (t.t_uploaded)
-                        chill(t);
 
-                    t.t_uploaded = undefined;
+                for (var a = 0; a < t.postlist.length; a++) {
+                    var nparts = [], tbytes = 0, stitch = t.stitch_sz;
+                    if (t.nojoin && t.nojoin - t.postlist.length < 6)
+                        stitch = 1;
+
+                    --a;
+                    for (var b = 0; b < stitch; b++) {
+                        nparts.push(t.postlist[++a]);
+                        tbytes += chunksize;
+                        if (tbytes + chunksize > stitch * 1024 * 1024 || t.postlist[a + 1] - t.postlist[a] !== 1)
+                            break;
+                    }
+                    arr.push({
+                        'nfile': t.n,
+                        'nparts': nparts
+                    });
                 }
-                tasker();
+                t.nojoin = 0;
+
+                msg = null;
+                done = false;
+
+                if (sort)
+                    arr.sort(function (a, b) {
+                        return a.nfile < b.nfile ? -1 :
+                        /*  */ a.nfile > b.nfile ? 1 :
+                        /*  */ a.nparts[0] < b.nparts[0] ? -1 : 1;
+                    });
+            }
+
+            if (msg)
+                pvis.seth(t.n, 1, msg);
+
+            apop(st.busy.handshake, t);
+
+            if (done) {
+                t.done = true;
+                t.fobj = null;
+                st.bytes.finished += t.size - t.bytes_uploaded;
+                var spd1 = (t.size / ((t.t_hashed - t.t_hashing) / 1000.)) / (1024 * 1024.),
+                    spd2 = (t.size / ((t.t_uploaded - t.t_uploading) / 1000.)) / (1024 * 1024.);
+
+                pvis.seth(t.n, 2, 'hash {0}, up {1} MB/s'.format(
+                    f2f(spd1, 2), !isNum(spd2) ? '--' : f2f(spd2, 2)));
+
+                pvis.move(t.n, 'ok');
+                if (!pvis.ctr.bz && !pvis.ctr.q)
+                    uptoast();
             }
             else {
-                pvis.seth(t.n, 1, "ERROR");
-                pvis.seth(t.n, 2, L.u_ehstmp, t);
-
-                var err = "",
-                    cls = "ERROR",
-                    rsp = unpre(xhr.responseText),
-                    ofs = rsp.lastIndexOf('\nURL: ');
-
-                if (ofs !== -1)
-                    rsp = rsp.slice(0, ofs);
-
-                if (rsp.indexOf('rate-limit ') !== -1) {
-                    var penalty = rsp.replace(/.*rate-limit /, "").split(' ')[0];
-                    console.log("rate-limit: " + penalty);
-                    t.cooldown = Date.now() + parseFloat(penalty) * 1000;
-                    apop(st.busy.handshake, t);
-                    st.todo.handshake.unshift(t);
-                    return;
-                }
+                if (t.t_uploaded)
+                    chill(t);
 
-                var err_pend = rsp.indexOf('partial upload exists at a different') + 1,
-                    err_srcb = rsp.indexOf('source file busy; please try again') + 1,
-                    err_plug = rsp.indexOf('upload blocked by x') + 1,
-                    err_dupe = rsp.indexOf('upload rejected, file already exists') + 1;
+                t.t_uploaded = undefined;
+            }
+            tasker();
+        }
+        else {
+            pvis.seth(t.n, 1, "ERROR");
+            pvis.seth(t.n, 2, L.u_ehstmp, t);
 
-                if (err_pend || err_srcb || err_plug || err_dupe) {
-                    err = rsp;
-                    ofs = err.indexOf('\n/');
-                    if (ofs !== -1) {
-                        err = err.slice(0, ofs + 1) + linksplit(err.slice(ofs + 2).trimEnd()).join(' / ');
-                    }
-                    if (!t.rechecks && (err_pend || err_srcb)) {
-                        t.rechecks = 0;
-                        t.want_recheck = true;
-                        err = L.u_dupdefer;
-                        cls = 'defer';
-                    }
-                }
-                if (rsp.indexOf('server HDD is full') + 1)
-                    return toast.err(0, L.u_ehsdf + "\n\n" + rsp.replace(/.*; /, ''));
+            var err = "",
+                cls = "ERROR",
+                rsp = unpre(xhr.responseText),
+                ofs = rsp.lastIndexOf('\nURL: ');
 
-                if (err != "") {
-                    if (!t.t_uploading)
-                        st.bytes.finished += t.size;
+            if (ofs !== -1)
+                rsp = rsp.slice(0, ofs);
 
-                    pvis.seth(t.n, 1, cls);
-                    pvis.seth(t.n, 2, err);
-                    pvis.move(t.n, 'ng');
+            if (rsp.indexOf('rate-limit ') !== -1) {
+                var penalty = rsp.replace(/.*rate-limit /, "").split(' ')[0];
+                console.log("rate-limit: " + penalty);
+                t.cooldown = Date.now() + parseFloat(penalty) * 1000;
+                apop(st.busy.handshake, t);
+                st.todo.handshake.unshift(t);
+                return;
+            }
 
-                    apop(st.busy.handshake, t);
-                    tasker();
-                    return;
+            var err_pend = rsp.indexOf('partial upload exists at a different') + 1,
+                err_srcb = rsp.indexOf('source file busy; please try again') + 1,
+                err_plug = rsp.indexOf('upload blocked by x') + 1,
+                err_dupe = rsp.indexOf('upload rejected, file already exists') + 1;
+
+            if (err_pend || err_srcb || err_plug || err_dupe) {
+                err = rsp;
+                ofs = err.indexOf('\n/');
+                if (ofs !== -1) {
+                    err = err.slice(0, ofs + 1) + linksplit(err.slice(ofs + 2).trimEnd()).join(' / ');
+                }
+                if (!t.rechecks && (err_pend || err_srcb)) {
+                    t.rechecks = 0;
+                    t.want_recheck = true;
+                    err = L.u_dupdefer;
+                    cls = 'defer';
                 }
-                err = t.t_uploading ? L.u_ehsfin : t.srch ? L.u_ehssrch : L.u_ehsinit;
-                xhrchk(xhr, err + "\n\nfile: " + t.name + "\n\nerror ", "404, target folder not found", "warn", t);
             }
-        }
-        xhr.onload = function (e) {
-            try { orz(e); } catch (ex) { vis_exh(ex + '', 'up2k.js', '', '', ex); }
-        };
+            if (rsp.indexOf('server HDD is full') + 1)
+                return toast.err(0, L.u_ehsdf + "\n\n" + rsp.replace(/.*; /, ''));
 
-        var req = {
-            "name": t.name,
-            "size": t.size,
-            "lmod": t.lmod,
-            "life": st.lifetime,
-            "hash": t.hash
-        };
-        if (t.srch)
-            req.srch = 1;
-        else if (t.rand)
-            req.rand = true;
-        else if (t.umod)
-            req.umod = true;
+            if (err != "") {
+                if (!t.t_uploading)
+                    st.bytes.finished += t.size;
 
-        xhr.open('POST', t.purl, true);
-        xhr.responseType = 'text';
-        xhr.timeout = 42000 + (t.srch || t.t_uploaded ? 0 :
-            (t.size / (1048 * 20))); // safededup 20M/s hdd
-        xhr.send(JSON.stringify(req));
+                pvis.seth(t.n, 1, cls);
+                pvis.seth(t.n, 2, err);
+                pvis.move(t.n, 'ng');
+
+                apop(st.busy.handshake, t);
+                tasker();
+                return;
+            }
+            err = t.t_uploading ? L.u_ehsfin : t.srch ? L.u_ehssrch : L.u_ehsinit;
+            xhrchk(xhr, err + "\n\nfile: " + t.name + "\n\nerror ", "404, target folder not found", "warn", t);
+        }
     }
 
     /////
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# coding: utf-8
+from __future__ import print_function, unicode_literals
+
+"""
+accept: new-connection-per-request benchmark; each request opens a fresh
+tcp connection, so this measures how quickly the server accepts and
+answers new clients (accept latency) rather than keepalive throughput
+
+usage: start copyparty in one terminal, for example
+  python3 -m copyparty -q -j4 -p 3923 -v /dev/shm/accept::r
+then run this in another:
+  python3 scripts/bench/accept.py [URL] [NUM_THREADS] [SECONDS]
+
+then restart copyparty with --reuseport and run it again to compare
+the shared listening socket (default) against one socket per process
+"""
+
+import socket
+import sys
+import threading
+import time
+
+try:
+    from urllib.parse import urlsplit
+except:
+    from urlparse import urlsplit  # type: ignore
+
+
+def worker(host, port, req, t_end, ret, n):
+    lats = []
+    while time.time() < t_end:
+        t0 = time.time()
+        sck = socket.create_connection((host, port))
+        sck.sendall(req)
+        buf = sck.recv(65536)
+        lats.append(time.time() - t0)
+        while buf:
+            buf = sck.recv(65536)
+
+        sck.close()
+
+    ret[n] = lats
+
+
+def main():
+    url = sys.argv[1] if len(sys.argv) > 1 else "http://127.0.0.1:3923/?ls"
+    nthr = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    nsec = float(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    u = urlsplit(url)
+    host = u.hostname
+    port = u.port or 80
+    path = u.path or "/"
+    if u.query:
+        path += "?" + u.query
+
+    req = "GET %s HTTP/1.1\r\nHost: %s\r\nConnection: close\r\n\r\n"
+    req = (req % (path, u.netloc)).encode("utf-8")
+
+    ret = [[]] * nthr
+    t0 = time.time()
+    t_end = t0 + nsec
+    thrs = []
+    for n in range(nthr):
+        a = (host, port, req, t_end, ret, n)
+        thr = threading.Thread(target=worker, args=a)
+        thr.daemon = True
+        thr.start()
+        thrs.append(thr)
+
+    for thr in thrs:
+        thr.join()
+
+    td = time.time() - t0
+    lats = sorted([x for y in ret for x in y])
+    nreq = len(lats)
+    p50 = lats[nreq // 2] * 1000
+    p99 = lats[int(nreq * 0.99)] * 1000
+    t = "%d requests from %d threads in %.2f sec = %.1f req/s; latency (connect to first byte) p50 %.2f ms, p99 %.2f ms"
+    print(t % (nreq, nthr, td, nreq / td, p50, p99))
+
+
+if __name__ == "__main__":
+    main()
+
+
+##
+## some results:
+
+# req/s, p50, p99  (copyparty, pythonver, distro/os)  // comment
+
+#  1040, 10.7, 46  @ 1-core VM  (py 3.11.7, linux 6.x)  // ?ls, 16 thr, -j4 --reuseport
+#  1045,  9.2, 52  @ 1-core VM  (py 3.11.7, linux 6.x)  // ?ls, 16 thr, -j4
+#    (the client shares the single core with the server, so this box can't
+#     show a difference; with a shared socket, new connections go to whichever
+#     process is waiting in accept, which tends to pile them onto one process,
+#     while reuseport spreads them evenly -- so try it on a many-core box)
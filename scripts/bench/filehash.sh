@@ -11,6 +11,12 @@ set -euo pipefail
 # * anything less and it takes your number of cores
 #
 # can be adjusted with --hash-mt (but alpine caps out at 5)
+#
+# to see how it scales, give it a list of thread-counts to try;
+#   MT="1 2 4 8" ./filehash.sh copyparty-sfx.py --hash-rd-sz=1048576
+# and to include the filesystem, set TD to a folder on that disk
+# (the testfile is still read once before starting, so it will be
+# served from the page cache unless it is larger than your ram)
 
 fsize=256
 nfiles=128
@@ -32,8 +38,13 @@ totalsize=$((fsize*nfiles))
 
 # try to use /dev/shm to avoid hitting filesystems at all,
 # otherwise fallback to mktemp which probably uses /tmp
-td=/dev/shm/cppbenchtmp
-mkdir $td || td=$(mktemp -d)
+if [ "${TD:-}" ]; then
+	td="$TD/cppbenchtmp"
+	mkdir "$td"
+else
+	td=/dev/shm/cppbenchtmp
+	mkdir $td || td=$(mktemp -d)
+fi
 trap "rm -rf $td" INT TERM EXIT
 cd $td
 
@@ -48,13 +59,27 @@ for n in $(seq 2 $nfiles); do MSYS=winsymlinks:nativestrict ln -s 1 $n; done
 echo warming up cache
 cat 1 >/dev/null
 
-echo ok lets go
-$pybin "$sfx" -p39204 -e2dsa --dbd=yolo --exit=idx -lo=t -q "$@" && err= || err=$?
-[ $win ] && [ $err = 15 ] && err=  # sigterm doesn't hook on windows, ah whatever
-[ $err ] && echo ERROR $err && exit $err
+run() {
+	rm -rf .hist t
+	$pybin "$sfx" -p39204 -e2dsa --dbd=yolo --exit=idx -lo=t -q "$@" && err= || err=$?
+	[ $win ] && [ $err = 15 ] && err=  # sigterm doesn't hook on windows, ah whatever
+	[ $err ] && echo ERROR $err && exit $err
+	true
+}
+
+if [ -z "${MT:-}" ]; then
+	echo ok lets go
+	run "$@"
 
-echo and the results are...
-LC_ALL=C $awk '/1 volumes in / {s=$(NF-1); printf "speed: %.1f MiB/s  (time=%.2fs)\n", '$totalsize'/s, s}' <t
+	echo and the results are...
+	LC_ALL=C $awk '/1 volumes in / {s=$(NF-1); printf "speed: %.1f MiB/s  (time=%.2fs)\n", '$totalsize'/s, s}' <t
+else
+	echo "threads  GB/s   time"
+	for n in $MT; do
+		run "$@" --hash-mt=$n >/dev/null 2>&1
+		LC_ALL=C $awk '/1 volumes in / {s=$(NF-1); printf "%7d  %5.2f  %.2fs\n", '$n', '$totalsize'/s/1024, s}' <t
+	done
+fi
 
 echo deleting $td and exiting
 
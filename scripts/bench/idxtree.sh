@@ -0,0 +1,67 @@
+#!/bin/bash
+set -euo pipefail
+
+# check how many files per second copyparty is able to index on
+# startup (-e2dsa) when given a big tree of smallish files, and how
+# that scales with the number of indexing threads (--idx-mt)
+#
+# by default the tree goes in /dev/shm so this only measures cpu/db
+# overhead; set TD to a folder on the disk you actually care about,
+# and drop caches between runs if you want to include the seeks:
+#   TD=/mnt/hdd MT="1 2 4 8" ./idxtree.sh copyparty-sfx.py
+#
+# the tree is 64 x 64 folders with 16 files each (64k files);
+# adjust with NDIR and NFILE
+
+ndir=${NDIR:-64}
+nfile=${NFILE:-16}
+fsize=${FSIZE:-8192}
+mt=${MT:-"1 2 4 8"}
+pybin=$(command -v python3 || command -v python)
+
+[ $# -ge 1 ] || {
+	echo 'need arg 1: path to copyparty-sfx.py'
+	echo ' (remaining args will be passed on to copyparty)'
+	exit 1
+}
+sfx="$1"
+shift
+sfx="$(realpath "$sfx" || readlink -e "$sfx" || echo "$sfx")"
+awk=$(command -v gawk || command -v awk)
+nfiles=$((ndir*ndir*nfile))
+
+if [ "${TD:-}" ]; then
+	td="$TD/cppbenchtmp"
+	mkdir "$td"
+else
+	td=/dev/shm/cppbenchtmp
+	mkdir $td || td=$(mktemp -d)
+fi
+trap "rm -rf $td" INT TERM EXIT
+cd $td
+
+echo creating $nfiles files in $((ndir*ndir)) folders in $td
+head -c $fsize /dev/urandom >src
+$pybin - "$ndir" "$nfile" <<'EOF'
+import os, sys
+ndir, nfile = int(sys.argv[1]), int(sys.argv[2])
+with open("src", "rb") as f:
+    buf = f.read()
+for d1 in range(ndir):
+    for d2 in range(ndir):
+        d = "t/%d/%d" % (d1, d2)
+        os.makedirs(d)
+        for n in range(nfile):
+            with open("%s/%d" % (d, n), "wb") as f:
+                # unique contents, so no two files are dupes
+                f.write(buf + b"%d/%d" % (d1 * ndir + d2, n))
+EOF
+
+echo "threads  files/s   time"
+for n in $mt; do
+	rm -rf t/.hist log
+	$pybin "$sfx" -p39205 -v t::r:c,e2dsa --dbd=yolo --exit=idx -lo=log -q --idx-mt=$n "$@" >/dev/null 2>&1 || true
+	LC_ALL=C $awk '/1 volumes in / {s=$(NF-1); printf "%7d  %7.0f  %.2fs\n", '$n', '$nfiles'/s, s}' <log
+done
+
+echo deleting $td and exiting
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# coding: utf-8
+from __future__ import print_function, unicode_literals
+
+"""
+tinyrsp: requests/sec on tiny responses over keepalive connections;
+measures the per-request overhead of the http server (header parsing,
+response building, syscalls) rather than disk or network throughput
+
+usage: start copyparty in one terminal, for example
+  python3 -m copyparty -q -p 3923 -v /dev/shm/tinyrsp::r
+then run this in another:
+  python3 scripts/bench/tinyrsp.py [URL] [NUM_CONNECTIONS] [SECONDS]
+
+the default URL is a folder listing (?ls) which returns ~200 bytes of json;
+compare with copyparty --s-wr-cmb=0 to see the effect of sending the
+headers and body in separate syscalls
+"""
+
+import socket
+import sys
+import threading
+import time
+
+try:
+    from urllib.parse import urlsplit
+except:
+    from urlparse import urlsplit  # type: ignore
+
+
+def worker(host, port, req, t_end, ret, n):
+    sck = socket.create_connection((host, port))
+    sck.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    nreq = 0
+    buf = b""
+    while time.time() < t_end:
+        sck.sendall(req)
+        while True:
+            ofs = buf.find(b"\r\n\r\n")
+            if ofs >= 0:
+                break
+            buf += sck.recv(65536)
+
+        hdrs = buf[:ofs].decode("latin-1").lower().split("\r\n")
+        clen = [x for x in hdrs if x.startswith("content-length:")]
+        clen = int(clen[0].split(":")[1]) if clen else 0
+        end = ofs + 4 + clen
+        while len(buf) < end:
+            buf += sck.recv(65536)
+
+        buf = buf[end:]
+        nreq += 1
+
+    sck.close()
+    ret[n] = nreq
+
+
+def main():
+    url = sys.argv[1] if len(sys.argv) > 1 else "http://127.0.0.1:3923/?ls"
+    ncon = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    nsec = float(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    u = urlsplit(url)
+    host = u.hostname
+    port = u.port or 80
+    path = u.path or "/"
+    if u.query:
+        path += "?" + u.query
+
+    req = "GET %s HTTP/1.1\r\nHost: %s\r\nConnection: keep-alive\r\n\r\n"
+    req = (req % (path, u.netloc)).encode("utf-8")
+
+    ret = [0] * ncon
+    t0 = time.time()
+    t_end = t0 + nsec
+    thrs = []
+    for n in range(ncon):
+        a = (host, port, req, t_end, ret, n)
+        thr = threading.Thread(target=worker, args=a)
+        thr.daemon = True
+        thr.start()
+        thrs.append(thr)
+
+    for thr in thrs:
+        thr.join()
+
+    td = time.time() - t0
+    nreq = sum(ret)
+    t = "%d requests over %d connections in %.2f sec = %.1f req/s"
+    print(t % (nreq, ncon, td, nreq / td))
+
+
+if __name__ == "__main__":
+    main()
+
+
+##
+## some results:
+
+# req/s  (copyparty, pythonver, distro/os)  // comment
+
+#  2520 @ 4-core VM  (py 3.11.7, linux 6.x)  // ?ls, 4 conns, default
+#  2050 @ 4-core VM  (py 3.11.7, linux 6.x)  // ?ls, 4 conns, --s-wr-cmb=0
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# coding: utf-8
+from __future__ import print_function, unicode_literals
+
+"""
+u2chunks: up2k chunk-bookkeeping benchmark; feeds every chunk of one
+huge upload through Up2k.handle_chunks + confirm_chunks (no disk io,
+no http) to see how the per-chunk cost scales with the number of chunks
+
+usage (from the root of the repo):
+  python3 scripts/bench/u2chunks.py [NUM_CHUNKS] [ORDER]
+
+ORDER is "seq" (default; like up2k.js) or "rnd" (like many parallel
+connections finishing out of order)
+"""
+
+import base64
+import hashlib
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, ".")
+
+from copyparty.up2k import Up2k  # noqa: E402
+
+
+class Args(object):
+    nw = False
+    reg_cap = 38400
+
+
+def mkup2k():
+    up2k = Up2k.__new__(Up2k)
+    up2k.args = Args()
+    up2k.log = lambda *a, **ka: None
+    up2k.db_act = 0.0
+    up2k.vol_act = {}
+    up2k.registry = {}
+    up2k.droppable = {}
+    up2k.mutex = threading.Lock()
+    try:
+        from copyparty.up2k import RegMutex
+
+        up2k.reg_mutex = RegMutex()
+    except ImportError:
+        up2k.reg_mutex = threading.Lock()
+
+    return up2k
+
+
+def main():
+    nchunks = int(sys.argv[1]) if len(sys.argv) > 1 else 4096
+    order = sys.argv[2] if len(sys.argv) > 2 else "seq"
+
+    hashes = []
+    for n in range(nchunks):
+        zb = hashlib.sha512(str(n).encode("ascii")).digest()[:33]
+        hashes.append(base64.urlsafe_b64encode(zb).decode("ascii"))
+
+    ptop = "/nonexistent"
+    wark = "w" * 44
+    up2k = mkup2k()
+    job = {
+        "ptop": ptop,
+        "prel": "",
+        "name": "f",
+        "tnam": "f.PARTIAL",
+        "wark": wark,
+        "size": nchunks * 1024 * 1024,
+        "lmod": 1,
+        "sprs": True,
+        "hash": hashes,
+        "need": list(hashes),
+        "busy": {},
+    }
+    up2k.registry[ptop] = {wark: job}
+    up2k.droppable[ptop] = []
+
+    todo = list(hashes)
+    if order == "rnd":
+        random.seed(1)
+        random.shuffle(todo)
+
+    t0 = time.time()
+    for chash in todo:
+        up2k.handle_chunks(ptop, wark, [chash])
+        up2k.confirm_chunks(ptop, wark, [chash], [chash])
+    td = time.time() - t0
+
+    if job["need"]:
+        raise Exception("%d chunks still needed" % (len(job["need"]),))
+
+    t = "%d chunks (%s) in %.3f sec = %.1f us/chunk"
+    print(t % (nchunks, order, td, td * 1e6 / nchunks))
+
+
+if __name__ == "__main__":
+    main()
+
+
+##
+## some results:
+
+# chunks, order, us/chunk  (pythonver, distro/os)  // comment
+
+#   4096, seq,  231  (py 3.11.7, linux 6.x)  // before
+#   4096, seq,   17  (py 3.11.7, linux 6.x)  // after
+#   4096, rnd,  263  (py 3.11.7, linux 6.x)  // before
+#   4096, rnd,   35  (py 3.11.7, linux 6.x)  // after
+#  32768, seq, 1953  (py 3.11.7, linux 6.x)  // before
+#  32768, seq,   22  (py 3.11.7, linux 6.x)  // after
+#  32768, rnd, 2465  (py 3.11.7, linux 6.x)  // before
+#  32768, rnd,  235  (py 3.11.7, linux 6.x)  // after
+#    (what remains in rnd is the list.remove on need, which has to stay
+#     a list in upload order since it is also the handshake response)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# coding: utf-8
+from __future__ import print_function, unicode_literals
+
+"""
+u2reg: memory usage of the up2k registry; builds a synthetic registry
+of unfinished uploads (like a server with lots of abandoned uploads)
+and prints how much RSS it took, and how long a snapshot takes
+
+usage (from the root of the repo, linux only):
+  python3 scripts/bench/u2reg.py [NUM_JOBS] [NUM_CHUNKS] [list]
+
+the optional 3rd arg "list" stores hash/need as plain lists of strings,
+which is what the registry did before HashList
+"""
+
+import base64
+import hashlib
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, ".")
+
+from copyparty.up2k import HashList, Up2k  # noqa: E402
+
+
+def rss():
+    with open("/proc/self/statm", "rb") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def main():
+    njobs = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    nchunks = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    packed = not (len(sys.argv) > 3 and sys.argv[3] == "list")
+
+    def mkhash(n):
+        zb = hashlib.sha512(str(n).encode("ascii")).digest()[:33]
+        return base64.urlsafe_b64encode(zb).decode("ascii")
+
+    rss0 = rss()
+    reg = {}
+    for nj in range(njobs):
+        # fresh strings for each job, like when parsed from the client
+        hashes = [mkhash(nj * nchunks + n) for n in range(nchunks)]
+        need = hashes[nchunks // 4 :]
+        wark = mkhash(-nj)
+        job = {
+            "wark": wark,
+            "dwrk": wark,
+            "t0": time.time(),
+            "sprs": True,
+            "hash": HashList(hashes) if packed else hashes,
+            "need": HashList(need) if packed else need,
+            "busy": {},
+            "vtop": "up",
+            "ptop": "/srv/up",
+            "prel": "some/folder",
+            "name": "file%d.bin" % (nj,),
+            "size": nchunks * 1024 * 1024,
+            "lmod": 1700000000,
+            "host": "example.com",
+            "user": "*",
+            "addr": "127.0.0.1",
+            "poke": time.time(),
+        }
+        reg[wark] = job
+
+    mem = rss() - rss0
+
+    t0 = time.time()
+    up2k = Up2k.__new__(Up2k)
+    snap = {k: up2k._snap_job(x) for k, x in reg.items()}
+    j = json.dumps(snap, sort_keys=True, separators=(",\n", ": "))
+    td = time.time() - t0
+
+    t = "%d jobs, %d chunks each (%s): %.1f MiB RSS, %.2f sec to json %.1f MiB"
+    zs = "HashList" if packed else "list"
+    print(t % (njobs, nchunks, zs, mem / 1048576.0, td, len(j) / 1048576.0))
+
+
+if __name__ == "__main__":
+    main()
+
+
+##
+## some results:
+
+# jobs, chunks, MiB RSS, snap sec  (pythonver, distro/os)  // comment
+
+# 10000,   64,  76.8, 0.89  (py 3.11.7, linux 6.x)  // list
+# 10000,   64,  49.3, 1.09  (py 3.11.7, linux 6.x)  // HashList
+#  1000, 1024, 109.3, 0.72  (py 3.11.7, linux 6.x)  // list
+#  1000, 1024,  57.8, 1.36  (py 3.11.7, linux 6.x)  // HashList
+#    (here need shares its strings with hash, as it does for new uploads;
+#     after a restart they are separate strings, so list takes even more)
@@ -2,6 +2,7 @@
 # coding: utf-8
 from __future__ import print_function, unicode_literals
 
+import hashlib
 import json
 import os
 import shutil
@@ -11,6 +12,8 @@ from itertools import product
 
 from copyparty.authsrv import AuthSrv
 from copyparty.httpcli import HttpCli
+from copyparty.up2k import up2k_wark_from_hashlist
+from copyparty.util import ub64enc
 from tests import util as tu
 from tests.util import Cfg
 
@@ -95,6 +98,133 @@ class TestDedup(unittest.TestCase):
                 h, b = self.curl("%s/%s" % ("d", fn))
                 self.assertEqual(b, f[0])
 
+    def test_batch(self):
+        f1, f2 = self.files
+        self.conn = None
+        self.fstab = None
+        self.args = Cfg(v=[".::A"], a=[], e2d=True)
+        self.reset()
+        self.cinit()
+
+        def mkhs(fn, fi):
+            return {"name": fn, "size": 3, "lmod": 1234567890, "hash": [fi[1]]}
+
+        # two new files and a broken one
+        msg = [mkhs("f1", f1), mkhs("f2", f2), {"name": "f3"}]
+        h, b = self.post_json("d", msg)
+        self.assertIn(" 200 OK", h)
+        hs = json.loads(b)
+        self.assertEqual(len(hs), 3)
+        for ret, fi in zip(hs[:2], (f1, f2)):
+            self.assertEqual(ret["wark"], fi[2])
+            self.assertEqual(ret["hash"], [fi[1]])
+            self.put_chunk("d", fi[2], fi[1], fi[0])
+        self.assertEqual(hs[2]["status"], 400)
+
+        # dupes of both into another folder; nothing to upload
+        msg = [mkhs("f3", f1), mkhs("f4", f2)]
+        hs = json.loads(self.post_json("d2", msg)[1])
+        for ret, (fn, fi) in zip(hs, (("f3", f1), ("f4", f2))):
+            self.assertEqual(ret["hash"], [])
+            h, b = self.curl("d2/" + fn)
+            self.assertEqual(b, fi[0])
+
+        # single handshakes still work
+        sfn, hs = self.do_post_hs("d", "f5", f1, False)
+        self.assertEqual(hs["hash"], [])
+
+        # too many handshakes, or too many chunks, in one batch
+        msg = [mkhs("x%d" % (n,), f1) for n in range(257)]
+        h, b = self.post_json("d3", msg)
+        self.assertIn(" 400 Bad Request", h)
+        self.assertIn("max 256", b)
+        msg = [mkhs("y%d" % (n,), f1) for n in range(2)]
+        msg[0]["hash"] *= 4096
+        h, b = self.post_json("d3", msg)
+        self.assertIn(" 400 Bad Request", h)
+        self.assertIn("max 4096", b)
+        self.assertFalse(os.path.exists("d3"))
+
+        # 256 is fine
+        msg = [mkhs("z%d" % (n,), f1) for n in range(256)]
+        hs = json.loads(self.post_json("d3", msg)[1])
+        self.assertEqual(len(hs), 256)
+        self.assertEqual(hs[255]["hash"], [])
+
+    def test_repeats(self):
+        # chunks [A, Z, Z, B, Z, C] where Z is all-zero
+        self.conn = None
+        self.fstab = None
+        self.args = Cfg(v=[".::A"], a=[], e2d=True)
+        self.reset()
+        self.cinit()
+
+        csz = 1024 * 1024
+        zbs = [tu.randbytes(csz), b"\0" * csz, tu.randbytes(csz), tu.randbytes(99)]
+        a, z, b, c = [self.chash(x) for x in zbs]
+        zb = b"".join(zbs[x] for x in (0, 1, 1, 2, 1, 3))
+        hashes = [a, z, z, b, z, c]
+        wark = up2k_wark_from_hashlist(self.args.warksalt, len(zb), hashes)
+
+        msg = {"name": "r", "size": len(zb), "lmod": 1234567890, "hash": hashes}
+        hs = json.loads(self.post_json("d", msg)[1])
+        self.assertEqual(hs["wark"], wark)
+        self.assertEqual(hs["hash"], [a, z, b, c])
+
+        # b's next sibling is c (z is a repeat), but not next to it
+        h, b2 = self.post_chunks("d", wark, [b, c[:5]], zbs[2] + zbs[3])
+        self.assertIn(" 400 Bad Request", h)
+        zs = "gap of %d bytes between offsets %d and %d"
+        self.assertIn(zs % (csz, 3 * csz, 5 * csz), b2)
+
+        h, b2 = self.post_chunks("d", wark, [c, a[:5]], zbs[3] + zbs[0])
+        self.assertIn("past the end of the file", b2)
+
+        # and a's next sibling is z
+        h, b2 = self.post_chunks("d", wark, [a, b[:5]], zbs[0] + zbs[2])
+        self.assertIn("does not start with expected prefix", b2)
+        h, b2 = self.post_chunks("d", wark, [a, z[:5]], zbs[0] + zbs[1])
+        self.assertEqual(b2, "thank")
+
+        # z was written to all three places at once
+        h, b2 = self.post_chunks("d", wark, [z], zbs[1])
+        self.assertIn("already got that", b2)
+        hs = json.loads(self.post_json("d", msg)[1])
+        self.assertEqual(hs["hash"], [b, c])
+
+        for chash, n in ((c, 3), (b, 2)):
+            h, b2 = self.post_chunks("d", wark, [chash], zbs[n])
+            self.assertEqual(b2, "thank")
+
+        h, b2 = self.curl("d/r", True)
+        self.assertEqual(b2, zb)
+
+        # dupe of the finished file, indexed under the same wark
+        msg["name"] = "r2"
+        hs = json.loads(self.post_json("d", msg)[1])
+        self.assertEqual((hs["wark"], hs["hash"]), (wark, []))
+        h, b2 = self.curl("d/r2", True)
+        self.assertEqual(b2, zb)
+
+    def test_u2pipe(self):
+        # the pipelined chunk receiver (default, but not in the other tests)
+        f1, f2 = self.files
+        self.conn = None
+        self.fstab = None
+        self.args = Cfg(v=[".::A"], a=[], e2d=True, no_u2pipe=False)
+        self.reset()
+        self.cinit()
+
+        sfn, hs = self.do_post_hs("d", "f1", f1, True)
+        self.do_post_data("d", "f1", f1, True, sfn, hs)
+        hpw = self.conn.hpw
+        self.assertTrue(hpw)
+
+        sfn, hs = self.do_post_hs("d", "f2", f2, True)
+        self.do_post_data("d", "f2", f2, True, sfn, hs)
+        self.assertIs(self.conn.hpw, hpw)
+        hpw.close()
+
     def test(self):
         quick = True  # sufficient for regular smoketests
         # quick = False
@@ -201,10 +331,13 @@ class TestDedup(unittest.TestCase):
         return sfn
 
     def handshake(self, dn, fn, fi, replace=False):
-        hdr = "POST /%s/ HTTP/1.1\r\nConnection: close\r\nContent-Type: text/plain\r\nContent-Length: %d\r\n\r\n"
         msg = {"name": fn, "size": 3, "lmod": 1234567890, "life": 0, "hash": [fi[1]]}
         if replace:
             msg["replace"] = True
+        return self.post_json(dn, msg)
+
+    def post_json(self, dn, msg):
+        hdr = "POST /%s/ HTTP/1.1\r\nConnection: close\r\nContent-Type: text/plain\r\nContent-Length: %d\r\n\r\n"
         buf = json.dumps(msg).encode("utf-8")
         buf = (hdr % (dn, len(buf))).encode("utf-8") + buf
         # print("HS -->", buf)
@@ -230,6 +363,18 @@ class TestDedup(unittest.TestCase):
         ret = self.conn.s._reply.decode("utf-8").split("\r\n\r\n", 1)
         self.assertEqual(ret[1], "thank")
 
+    def post_chunks(self, dn, wark, chashes, data):
+        ctxt = chashes[0]
+        if len(chashes) > 1:
+            ctxt += ",%d,%s" % (len(chashes[1]), "".join(chashes[1:]))
+        hdr = "POST /%s/ HTTP/1.1\r\nConnection: close\r\nContent-Type: application/octet-stream\r\nContent-Length: %d\r\nX-Up2k-Hash: %s\r\nX-Up2k-Wark: %s\r\n\r\n"
+        buf = (hdr % (dn, len(data), ctxt, wark)).encode("utf-8") + data
+        HttpCli(self.conn.setbuf(buf)).run()
+        return self.conn.s._reply.decode("utf-8", "replace").split("\r\n\r\n", 1)
+
+    def chash(self, buf):
+        return ub64enc(hashlib.sha512(buf).digest()[:33]).decode("ascii")
+
     def curl(self, url, binary=False, meth=None):
         h = "%s /%s HTTP/1.1\r\nConnection: close\r\n\r\n"
         h = h % (meth or "GET", url)
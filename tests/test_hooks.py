@@ -2,6 +2,7 @@
 # coding: utf-8
 from __future__ import print_function, unicode_literals
 
+import json
 import os
 import shutil
 import tempfile
@@ -65,6 +66,35 @@ class TestHooks(unittest.TestCase):
                     h, b = self.curl(url_dl)
                     self.assertEqual(b, "ok %s\n" % (url_up))
 
+    def test_bup_args(self):
+        # ?replace and xbu get the name from before ?rand, like they always did
+        self.reset()
+        os.mkdir("c")
+        with open("c/a.png", "wb") as f:
+            f.write(b"old")
+        self.makehook("import sys; open('log', 'a').write(sys.argv[1] + '\\n')")
+        zs = ["j,c1,h.py"]
+        self.args = Cfg(v=["c:c:A"], a=["o:o"], e2d=True, xbu=zs, xau=zs)
+        self.asrv = AuthSrv(self.args, self.log)
+
+        h, b = self.bup("c/?replace&rand=4/a.png")
+        self.assertIn("201 Created", h)
+        fns = os.listdir("c")
+        self.assertEqual(len(fns), 1)
+        fn = fns[0]
+        self.assertRegex(fn, r"^[^.]{4}\.png$")
+        with open("c/" + fn, "rb") as f:
+            self.assertEqual(f.read(), b"ok c/?replace&rand=4/a.png\n")
+
+        with open("log", "rb") as f:
+            jbu, jau = [json.loads(x) for x in f.read().decode("utf-8").split("\n")[:2]]
+        self.assertEqual(jbu["ap"], os.path.abspath("c/a.png"))
+        self.assertEqual(jbu["vp"], "c/" + fn)
+        self.assertEqual(jbu["mt"], jbu["at"])
+        self.assertEqual(jau["ap"], os.path.abspath("c/" + fn))
+        self.assertEqual(jau["vp"], "c/" + fn)
+        self.assertEqual(jau["mt"], jau["at"])
+
     def makehook(self, hs):
         with open("h.py", "wb") as f:
             f.write(hs.encode("utf-8"))
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# coding: utf-8
+from __future__ import print_function, unicode_literals
+
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import unittest
+
+from copyparty.authsrv import AuthSrv
+from copyparty.up2k import Up2k
+from copyparty.util import Daemon, ProgressPrinter
+from tests import util as tu
+from tests.util import Cfg
+
+
+class TestIdx(unittest.TestCase):
+    def __init__(self, *a, **ka):
+        super(TestIdx, self).__init__(*a, **ka)
+        self.is_dut = True
+
+    def setUp(self):
+        self.td = tu.get_ramdisk()
+        td = os.path.join(self.td, "vfs")
+        os.mkdir(td)
+        os.chdir(td)
+
+    def tearDown(self):
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(self.td)
+
+    def test_idx_mt(self):
+        sizes = [0, 1, 70000, 1024 * 1024 + 7]
+        for d1 in ("", "a", "a/b", "a/b/c", "d", "d/e", "f"):
+            if d1:
+                os.makedirs(d1)
+            for n, sz in enumerate(sizes):
+                with open(os.path.join(d1, "f%d" % (n,)), "wb") as f:
+                    f.write(tu.randbytes(sz))
+
+        zl = self.index(1)
+        self.chk_ds(zl)
+        self.assertEqual(zl, self.index(4))
+
+        # rescan with changes; same as a fresh index of the new tree?
+        with open("a/b/f2", "wb") as f:
+            f.write(b"changed")
+        os.utime("a/b/f2", (1600000000, 1600000000))
+        os.unlink("d/f3")
+        with open("d/e/new", "wb") as f:
+            f.write(tu.randbytes(99999))
+
+        zl = self.index(4, False)
+        self.chk_ds(zl)
+        self.assertEqual(zl, self.index(1))
+        self.assertEqual(len(zl[0]), 7 * len(sizes))
+        self.assertEqual(zl[2][0][2], 7 * len(sizes))  # ds, num files
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "inotify")
+    def test_inotify(self):
+        self.run_inotify(2)
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "inotify")
+    def test_inotify_st(self):
+        # no IdxPool; db_add bumps the folder sizes as it goes
+        self.run_inotify(1)
+
+    def run_inotify(self, nthr):
+        from copyparty.inotify import Inotify
+
+        for d1 in ("a", "a/b", "a/b/c", "d", "d/e", "f"):
+            os.makedirs(d1)
+            for n in range(3):
+                with open(os.path.join(d1, "f%d" % (n,)), "wb") as f:
+                    f.write(tu.randbytes(n * 999))
+
+        up2k = self.mkup2k(nthr)
+        vol = self.asrv.vfs.all_vols[""]
+        excl = set(up2k._idx_excl(vol, [vol]))
+        ino = Inotify(self.log, lambda: None)
+        self.assertEqual(ino.watch(vol.realpath, excl, 0), 7)
+
+        with open("a/b/f2", "ab") as f:
+            f.write(b"more")
+        os.unlink("d/f1")
+        os.makedirs("g/h")
+        with open("g/h/new", "wb") as f:
+            f.write(b"hello")
+        shutil.rmtree("a/b/c")
+        os.rename("d/e", "e2")
+        with open("e2/f9", "wb") as f:
+            f.write(b"in a moved folder")
+
+        for _ in range(50):
+            time.sleep(0.1)
+            if ino.due(0.2, time.time()) < 1:
+                break
+        dirty, overflow = ino.take()
+        self.assertEqual(overflow, set())
+        rds = dirty[vol.realpath]
+        self.assertNotIn("f", rds)
+        self.assertNotIn("a", rds)
+        self.assertTrue(rds["g"] and rds["a/b/c"] and rds["d/e"] and rds["e2"])
+        self.assertFalse(rds["a/b"] or rds["d"] or rds[""])
+
+        # subfolders of new folders are watched too
+        with open("g/h/new2", "wb") as f:
+            f.write(b"world")
+        time.sleep(0.2)
+        self.assertEqual(list(ino.take()[0][vol.realpath]), ["g/h"])
+        rds["g/h"] = False
+
+        up2k.pp = ProgressPrinter(self.log, self.args)
+        up2k._ino_reindex(dirty)
+        self.assertIsNone(up2k.pp)
+        zl = self.dump()
+        up2k.shutdown()
+        self.chk_ds(zl)
+        self.assertEqual(zl, self.index(1))
+        self.assertEqual(zl[2][0][2], 6 * 3 - 4 + 3)  # ds, num files
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "inotify")
+    def test_inotify_rewatch(self):
+        os.makedirs("a/b")
+        self.args = Cfg(v=[".::r:c,inotify"], a=[], e2dsa=True)
+        self.asrv = AuthSrv(self.args, self.log)
+        up2k = Up2k(self)
+        up2k._ino_sync()
+        ino = up2k.ino
+        top = self.asrv.vfs.realpath
+        self.assertEqual(len(ino.wds), 3)
+
+        # out of watches while adding a new folder; same as _evt
+        with ino.mutex:
+            ino._unwatch(top)
+            ino.overflow.add(top)
+        self.assertEqual(ino.wds, {})
+
+        # rescanned and watched again
+        up2k._ino_tick(time.time())
+        self.assertEqual(up2k.need_rescan, set([""]))
+        for _ in range(50):
+            if len(ino.wds) == 3:
+                break
+            time.sleep(0.05)
+        self.assertEqual(len(ino.wds), 3)
+        up2k.shutdown()
+
+    def test_hashq(self):
+        up2k = self.mkup2k(1)
+        up2k.hashq_mt = 2
+        flags = {"e2d": True}
+        for ptop, n in (("a", 200), ("b", 3), ("c", 3)):
+            for _ in range(n):
+                up2k.hash_file(ptop, ptop, flags, "", "f", "", 0, "")
+
+        # round-robin between volumes, each batch half of the backlog
+        zl = [up2k._hashq_take() for _ in range(7)]
+        zs = "".join(grp for grp, _ in zl)
+        self.assertEqual(zs, "abcabca")
+        self.assertEqual([len(x) for _, x in zl], [64, 2, 2, 64, 1, 1, 36])
+        self.assertEqual(up2k.hashq_rr, ["a"])
+        self.assertEqual(up2k.hashq_busy, {"a": 3, "b": 2, "c": 2})
+
+        # --hashq-gmt; a busy volume must wait, the others go ahead
+        up2k.hashq_busy = {}
+        up2k.args.hashq_gmt = 1
+        up2k.hash_file("b", "b", flags, "", "f", "", 0, "")
+        self.assertEqual(up2k._hashq_take()[0], "a")
+        self.assertEqual(up2k._hashq_take()[0], "b")
+        self.assertEqual(up2k._hashq_take(), ("", []))
+        up2k.hashq_busy["a"] -= 1
+        self.assertEqual(up2k._hashq_take()[0], "a")
+        up2k.shutdown()
+
+    def test_hashq_fair(self):
+        for d, nf in (("a", 150), ("b", 2)):
+            os.mkdir(d)
+            for n in range(nf):
+                with open(os.path.join(d, "f%d" % (n,)), "wb") as f:
+                    f.write(tu.randbytes(n))
+
+        self.args = Cfg(v=["a:a:r:c,e2d", "b:b:r:c,e2d"], a=[], hashq_mt=1)
+        self.asrv = AuthSrv(self.args, self.log)
+        up2k = Up2k(self)
+        for d, nf in (("a", 150), ("b", 2)):
+            ptop = os.path.abspath(d)
+            for n in range(nf):
+                fn = "f%d" % (n,)
+                up2k.hash_file(ptop, d, up2k.flags[ptop], "", fn, "", 0, "")
+
+        order = []
+        hash_batch = up2k._hash_batch
+
+        def rec(tasks):
+            order.append((os.path.basename(tasks[0][0]), len(tasks)))
+            hash_batch(tasks)
+
+        up2k._hash_batch = rec
+        Daemon(up2k._hasher, "hasher")
+        for _ in range(100):
+            if not up2k.n_hashq:
+                break
+            time.sleep(0.05)
+
+        # the two files in b didn't have to wait for all of a
+        self.assertEqual(order, [("a", 64), ("b", 2), ("a", 64), ("a", 22)])
+        with up2k.mutex:
+            for d, n in (("a", 150), ("b", 2)):
+                cur = up2k.cur[os.path.abspath(d)]
+                zi = cur.execute("select count(*) from up").fetchone()[0]
+                self.assertEqual(zi, n)
+        up2k.shutdown()
+
+    def chk_ds(self, zl):
+        """folder sizes (ds) must match the files (up) below each folder"""
+        ups, _, dss = zl
+        self.assertTrue(dss)
+        for rd, sz, nf in dss:
+            pfx = rd + "/"
+            zl2 = [x for x in ups if not rd or x[0] == rd or x[0].startswith(pfx)]
+            self.assertEqual((sz, nf), (sum(x[3] for x in zl2), len(zl2)), rd)
+
+    def index(self, nthr, fresh=True):
+        if fresh:
+            shutil.rmtree(".hist", True)
+
+        self.mkup2k(nthr).shutdown()
+        return self.dump()
+
+    def mkup2k(self, nthr):
+        self.args = Cfg(v=[".::r"], a=[], e2dsa=True, idx_mt=nthr)
+        self.asrv = AuthSrv(self.args, self.log)
+        return Up2k(self)
+
+    def dump(self):
+        db = sqlite3.connect(os.path.join(".hist", "up2k.db"))
+        ret = []
+        for q in (
+            "select rd, fn, w, sz, mt from up order by rd, fn",
+            "select * from dh order by d",
+            "select * from ds order by rd",
+        ):
+            ret.append(db.execute(q).fetchall())
+        db.close()
+        return ret
+
+    def log(self, src, msg, c=0):
+        print(msg)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# coding: utf-8
+from __future__ import print_function, unicode_literals
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from copyparty.authsrv import AuthSrv
+from copyparty.httpcli import HttpCli
+from copyparty.util import ub64enc
+from tests import util as tu
+from tests.util import Cfg
+
+
+class TestJnl(unittest.TestCase):
+    maxDiff = None
+    """up2k.snap + up2k.jnl.1 + up2k.jnl must give back the registry"""
+
+    def setUp(self):
+        self.td = tu.get_ramdisk()
+        td = os.path.join(self.td, "vfs")
+        os.mkdir(td)
+        os.chdir(td)
+
+        self.args = Cfg(v=[".::A"], a=[], e2d=True, no_snap=False, snap_drop=1)
+        self.asrv = AuthSrv(self.args, self.log)
+        self.conn = tu.VHttpConn(self.args, self.asrv, self.log, b"", True)
+        self.up2k = self.conn.hsrv.hub.up2k
+        self.ptop = os.path.abspath(".")
+        self.hist = os.path.join(self.ptop, ".hist")
+
+        # 2 chunks each
+        self.files = {}
+        for fn in ("f1", "f2", "f3"):
+            buf = tu.randbytes(1024 * 1024 + 7)
+            cbufs = [buf[: 1024 * 1024], buf[1024 * 1024 :]]
+            chashes = [self.chash(x) for x in cbufs]
+            self.files[fn] = (buf, cbufs, chashes)
+
+    def tearDown(self):
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(self.td)
+
+    def test_jnl(self):
+        f1, f2, f3 = [self.files[x] for x in ("f1", "f2", "f3")]
+        w1 = self.handshake("f1")
+        w2 = self.handshake("f2")
+        w3 = self.handshake("f3")
+        self.put_chunk(w1, f1[2][0], f1[1][0])
+        self.up2k.do_snapshot()
+        self.assertEqual(self.ls(), ["up2k.snap"])
+
+        # rotated, but the snap never happened (server died while writing it)
+        self.put_chunk(w2, f2[2][1], f2[1][1])
+        with self.up2k.mutex, self.up2k.reg_mutex:
+            self.up2k._jnl_rotate(self.ptop, self.hist)
+        self.assertEqual(self.ls(), ["up2k.jnl.1", "up2k.snap"])
+
+        # f1 completes, f3 is deleted, and f2 hasn't been poked in ages
+        self.put_chunk(w1, f1[2][1], f1[1][1])
+        buf = b"POST /f3?delete HTTP/1.1\r\nConnection: close\r\n\r\n"
+        HttpCli(self.conn.setbuf(buf)).run()
+        h = self.conn.s._reply.decode("utf-8", "replace")
+        self.assertIn(" 200 OK", h)
+        with self.up2k.mutex, self.up2k.reg_mutex:
+            reg = self.up2k.registry[self.ptop]
+            self.assertNotIn(w3, reg)
+            reg[w2]["poke"] = 1
+            self.up2k._jnl(self.ptop, "n", w2, reg[w2])
+            want = self.dump(reg)
+        self.assertEqual(want[w2]["need"], [f2[2][0]])
+
+        # and the last line got cut short by a crash
+        with open(os.path.join(self.hist, "up2k.jnl"), "ab") as f:
+            f.write(b'\n["c","%s",["%s' % (w2.encode(), f2[2][0][:9].encode()))
+
+        up2k = tu.VHub(self.args, self.asrv, self.log).up2k
+        with up2k.mutex, up2k.reg_mutex:
+            reg = up2k.registry[self.ptop]
+            self.assertEqual(self.dump(reg), want)
+
+            # replayed jobs are poked on load, so they don't get dropped
+            self.assertGreater(reg[w2]["poke"], 1)
+
+        up2k.do_snapshot()
+        with up2k.mutex, up2k.reg_mutex:
+            reg = up2k.registry[self.ptop]
+            self.assertEqual(self.dump(reg), want)
+        self.assertEqual(self.ls(), ["up2k.snap"])
+
+        # the snap alone gives the same thing
+        self.up2k.stop = True
+        up2k.shutdown()
+        up2k = tu.VHub(self.args, self.asrv, self.log).up2k
+        with up2k.mutex, up2k.reg_mutex:
+            self.assertEqual(self.dump(up2k.registry[self.ptop]), want)
+
+        # and the upload of f2 can be finished
+        self.conn.hsrv.hub.up2k = self.conn.hsrv.broker.hub.up2k = up2k
+        self.put_chunk(w2, f2[2][0], f2[1][0])
+        with open("f2", "rb") as f:
+            self.assertEqual(f.read(), f2[0])
+        up2k.shutdown()
+
+    def test_jnl_garbage(self):
+        w1 = self.handshake("f1")
+        self.up2k.do_snapshot()
+        self.put_chunk(w1, self.files["f1"][2][1], self.files["f1"][1][1])
+
+        # garbage in the middle and at the end; replay keeps going
+        with open(os.path.join(self.hist, "up2k.jnl"), "rb") as f:
+            jnl = f.read()
+        with open(os.path.join(self.hist, "up2k.jnl"), "wb") as f:
+            f.write(b"\n\x00\xff{]" + jnl + b'\n["d","' + w1.encode())
+
+        # just the one chunk; nothing to apply it to without the snap
+        reg = {}
+        self.assertEqual(self.up2k._jnl_replay(f.name, reg), 1)
+        self.assertEqual(reg, {})
+        with self.up2k.mutex, self.up2k.reg_mutex:
+            want = self.dump(self.up2k.registry[self.ptop])
+
+        up2k = tu.VHub(self.args, self.asrv, self.log).up2k
+        with up2k.mutex, up2k.reg_mutex:
+            self.assertEqual(self.dump(up2k.registry[self.ptop]), want)
+            self.assertEqual(len(want[w1]["need"]), 1)
+            self.assertIn("t0c", up2k.registry[self.ptop][w1])
+        up2k.shutdown()
+        self.up2k.shutdown()
+
+    def dump(self, reg):
+        ret = {}
+        for k, job in reg.items():
+            job = self.up2k._snap_job(job)
+            for k2 in ("busy", "poke", "t0c"):
+                job.pop(k2, None)
+            ret[k] = job
+        return json.loads(json.dumps(ret))
+
+    def ls(self):
+        zs = ("up2k.snap", "up2k.jnl")
+        return sorted(x for x in os.listdir(self.hist) if x.startswith(zs))
+
+    def chash(self, buf):
+        return ub64enc(hashlib.sha512(buf).digest()[:33]).decode("ascii")
+
+    def handshake(self, fn):
+        buf, _, chashes = self.files[fn]
+        msg = {"name": fn, "size": len(buf), "lmod": 1234567890, "hash": chashes}
+        h, b = self.post("", json.dumps(msg).encode("utf-8"), "text/plain")
+        jt = json.loads(b)
+        self.assertEqual(jt["hash"], chashes)
+        return jt["wark"]
+
+    def put_chunk(self, wark, chash, buf):
+        hdrs = "X-Up2k-Hash: %s\r\nX-Up2k-Wark: %s\r\n" % (chash, wark)
+        h, b = self.post("", buf, "application/octet-stream", hdrs)
+        self.assertEqual(b, "thank")
+
+    def post(self, url, body, ctype="text/plain", hdrs=""):
+        zs = "POST /%s HTTP/1.1\r\nConnection: close\r\nContent-Type: %s\r\nContent-Length: %d\r\n%s\r\n"
+        buf = (zs % (url, ctype, len(body), hdrs)).encode("utf-8") + body
+        HttpCli(self.conn.setbuf(buf)).run()
+        return self.conn.s._reply.decode("utf-8", "replace").split("\r\n\r\n", 1)
+
+    def log(self, src, msg, c=0):
+        print(msg)
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# coding: utf-8
+from __future__ import print_function, unicode_literals
+
+import hashlib
+import json
+import os
+import shutil
+import socket
+import tempfile
+import time
+import unittest
+
+from copyparty.authsrv import AuthSrv
+from copyparty.broker_thr import BrokerThr
+from copyparty.up2k import up2k_chunksize
+from copyparty.util import HAVE_PWRITE, ub64enc
+from tests import util as tu
+from tests.util import Cfg
+
+
+class TestKap(unittest.TestCase):
+    """keepalive parking; idle conns wait in HttpSrv.thr_kap"""
+
+    def setUp(self):
+        self.td = tu.get_ramdisk()
+        os.chdir(self.td)
+        with open("f", "wb") as f:
+            f.write(b"hello")
+
+        self.cinit([".::r"])
+
+    def cinit(self, vols, **ka):
+        self.args = Cfg(v=vols, a=[], no_htp=False, no_kap=False, s_thead=1, **ka)
+        self.asrv = AuthSrv(self.args, self.log)
+        self.hub = tu.VHub(self.args, self.asrv, self.log)
+        self.broker = BrokerThr(self.hub)
+        self.hsrv = self.broker.httpsrv
+        if not self.hsrv.kap:
+            self.skipTest("no epoll/kqueue")
+
+    def tearDown(self):
+        self.hsrv.shutdown()
+        self.hub.up2k.shutdown()
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(self.td)
+
+    def test_kap(self):
+        hsrv = self.hsrv
+        sck = self.connect()
+        self.assertEqual(self.get(sck), b"hello")
+        self.wait(lambda: hsrv.nkap == 1)
+        cli = next(iter(hsrv.clients))
+
+        # parked conn wakes up for the next request; same HttpConn
+        self.assertEqual(self.get(sck), b"hello")
+        self.wait(lambda: hsrv.nkap == 1)
+        self.assertEqual(list(hsrv.clients), [cli])
+        self.assertEqual(cli.nreq, 1)
+        self.assertEqual(hsrv.ncli, 1)
+
+        # a second client parks next to it
+        sck2 = self.connect()
+        self.assertEqual(self.get(sck2), b"hello")
+        self.wait(lambda: hsrv.nkap == 2)
+        self.assertEqual(hsrv.ncli, 2)
+
+        # and both are dropped when they idle out (s_thead)
+        sck.settimeout(5)
+        sck2.settimeout(5)
+        self.assertEqual(sck.recv(1), b"")
+        self.assertEqual(sck2.recv(1), b"")
+        self.wait(lambda: not hsrv.ncli)
+        self.assertEqual(hsrv.nkap, 0)
+        self.assertEqual(hsrv.clients, set())
+
+    def test_kap_client_dc(self):
+        hsrv = self.hsrv
+        sck = self.connect()
+        self.assertEqual(self.get(sck), b"hello")
+        self.wait(lambda: hsrv.nkap == 1)
+
+        # client goes away while parked; unparked and closed right away
+        sck.close()
+        self.wait(lambda: not hsrv.ncli)
+        self.assertEqual(hsrv.nkap, 0)
+
+    def test_kap_shutdown(self):
+        hsrv = self.hsrv
+        scks = [self.connect() for _ in range(3)]
+        for sck in scks:
+            self.assertEqual(self.get(sck), b"hello")
+        self.wait(lambda: hsrv.nkap == 3)
+
+        t0 = time.time()
+        hsrv.shutdown()
+        self.assertLess(time.time() - t0, 5)
+        for sck in scks:
+            sck.settimeout(5)
+            self.assertEqual(sck.recv(1), b"")
+        self.wait(lambda: not hsrv.ncli)
+
+    @unittest.skipUnless(HAVE_PWRITE, "no pwrite")
+    def test_kap_u2pipe(self):
+        self.hsrv.shutdown()
+        self.hub.up2k.shutdown()
+        self.cinit([".::A:c,e2d"], no_u2pipe=False)
+        hsrv = self.hsrv
+
+        csz = up2k_chunksize(4 * 1024 * 1024)
+        chunks = [tu.randbytes(csz) for _ in range(2)]
+        hashes = [self.chash(x) for x in chunks]
+        sck = self.connect()
+        zs = json.dumps({"name": "u", "size": 2 * csz, "lmod": 1, "hash": hashes})
+        jt = json.loads(self.req(sck, "POST / ", "text/plain", zs.encode("utf-8")))
+        self.assertEqual(jt["hash"], hashes)
+
+        # one chunk per request, parked in between; same HashPw for both
+        hpws = []
+        for chash, buf in zip(hashes, chunks):
+            self.wait(lambda: hsrv.nkap == 1)
+            hdrs = "X-Up2k-Hash: %s\r\nX-Up2k-Wark: %s\r\n"
+            hdrs = hdrs % (chash, jt["wark"])
+            zb = self.req(sck, "POST / ", "application/octet-stream", buf, hdrs)
+            self.assertEqual(zb, b"thank")
+            hpws.append(next(iter(hsrv.clients)).hpw)
+
+        self.assertTrue(hpws[0])
+        self.assertIs(hpws[0], hpws[1])
+        with open("u", "rb") as f:
+            self.assertEqual(f.read(), b"".join(chunks))
+
+        # freed when the connection closes
+        sck.close()
+        self.wait(lambda: not hsrv.ncli)
+        hpws[0].thr.join(5)
+        self.assertFalse(hpws[0].thr.is_alive())
+
+    def chash(self, buf):
+        return ub64enc(hashlib.sha512(buf).digest()[:33]).decode("ascii")
+
+    def req(self, sck, req, ctype, body, hdrs=""):
+        zs = "%sHTTP/1.1\r\nHost: a\r\nContent-Type: %s\r\nContent-Length: %d\r\n%s\r\n"
+        sck.sendall((zs % (req, ctype, len(body), hdrs)).encode("utf-8") + body)
+        return self.recv(sck)
+
+    def connect(self):
+        sck, peer = socket.socketpair()
+        self.hsrv.accept(peer, ("127.0.0.1", 4321))
+        return sck
+
+    def get(self, sck):
+        sck.sendall(b"GET /f HTTP/1.1\r\nHost: a\r\n\r\n")
+        return self.recv(sck)
+
+    def recv(self, sck):
+        sck.settimeout(5)
+        buf = b""
+        while b"\r\n\r\n" not in buf:
+            buf += sck.recv(4096)
+
+        h, b = buf.split(b"\r\n\r\n", 1)
+        self.assertIn(b" 200 OK", h)
+        self.assertIn(b"Connection: Keep-Alive", h)
+        zi = int(h.split(b"Content-Length: ")[1].split(b"\r")[0])
+        while len(b) < zi:
+            b += sck.recv(4096)
+        return b
+
+    def wait(self, fun):
+        for _ in range(100):
+            if fun():
+                return
+            time.sleep(0.05)
+        self.assertTrue(fun())
+
+    def log(self, src, msg, c=0):
+        print(msg)
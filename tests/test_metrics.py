@@ -60,7 +60,10 @@ cpp_boot_unixtime_seconds [0-9]{7,10}\.[0-9]{3}$
 cpp_http_reqs_created [0-9]{7,10}$
 cpp_http_reqs_total -1$
 cpp_http_conns 9$
+cpp_tls_handshakes_total 0$
+cpp_tls_failed_total 0$
 cpp_total_bans 9$
+cpp_log_dropped_total 0$
 cpp_sus_reqs_total 9$
 cpp_active_bans 0$
 cpp_idle_vols 0$
@@ -70,6 +73,8 @@ cpp_db_idle_seconds 86399999\.00$
 cpp_db_act_seconds 0\.00$
 cpp_hashing_files 0$
 cpp_tagq_files 0$
+cpp_lock_wait_seconds_total\{lock="main"\} [0-9]+\.[0-9]{3}$
+cpp_lock_max_wait_seconds\{lock="reg"\} [0-9]+\.[0-9]{3}$
 cpp_disk_size_bytes\{vol="/"\} [0-9]+$
 cpp_disk_free_bytes\{vol="/"\} [0-9]+$
 cpp_vol_bytes\{vol="/"\} 0$
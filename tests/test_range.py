@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# coding: utf-8
+from __future__ import print_function, unicode_literals
+
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+from copyparty.authsrv import AuthSrv
+from copyparty.httpcli import HttpCli
+from tests import util as tu
+from tests.util import Cfg
+
+
+class TestRange(unittest.TestCase):
+    def setUp(self):
+        self.td = tu.get_ramdisk()
+        os.chdir(self.td)
+        self.data = tu.randbytes(1000)
+        with open("f", "wb") as f:
+            f.write(self.data)
+
+        self.args = Cfg(v=[".::r"], a=[])
+        self.asrv = AuthSrv(self.args, self.log)
+        self.conn = tu.VHttpConn(self.args, self.asrv, self.log, b"")
+
+    def tearDown(self):
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(self.td)
+
+    def test_single(self):
+        d = self.data
+        for hr, lo, hi in (
+            ("0-0", 0, 1),
+            ("10-19", 10, 20),
+            ("990-", 990, 1000),
+            ("-1", 999, 1000),
+            ("-10", 990, 1000),
+            ("-5000", 0, 1000),
+            ("995-5000", 995, 1000),
+        ):
+            h, b = self.get(hr)
+            self.assertIn(" 206 Partial Content", h, hr)
+            self.assertEqual(b, d[lo:hi], hr)
+            self.assertEqual(int(self.hval(h, "Content-Length")), len(b), hr)
+            zs = "bytes %d-%d/1000" % (lo, hi - 1)
+            self.assertEqual(self.hval(h, "Content-Range"), zs, hr)
+
+        for hr in ("-0", "1000-", "5-4", "-", "a-b"):
+            h, b = self.get(hr)
+            self.assertIn(" 416 ", h, hr)
+
+    def test_multi(self):
+        d = self.data
+        for hr, want in (
+            # mixed
+            ("0-0,-1", [(0, 1), (999, 1000)]),
+            ("100-199,500-,20-29", [(20, 30), (100, 200), (500, 1000)]),
+            # suffix
+            ("-10,0-4", [(0, 5), (990, 1000)]),
+            # overlapping and adjacent get merged
+            ("0-99,50-149,150-159,-100,950-", [(0, 160), (900, 1000)]),
+        ):
+            h, b = self.get(hr)
+            self.assertIn(" 206 Partial Content", h, hr)
+            self.assertEqual(int(self.hval(h, "Content-Length")), len(b), hr)
+            self.assertIsNone(self.hval(h, "Content-Range"), hr)
+
+            ct = self.hval(h, "Content-Type")
+            bnd = re.match(r"multipart/byteranges; boundary=([0-9a-f]+)$", ct)
+            self.assertTrue(bnd, ct)
+            bnd = bnd.group(1).encode("ascii")
+
+            self.assertTrue(b.startswith(b"\r\n--" + bnd + b"\r\n"), hr)
+            self.assertTrue(b.endswith(b"\r\n--" + bnd + b"--\r\n"), hr)
+            parts = b.split(b"\r\n--" + bnd)[1:-1]
+            self.assertEqual(len(parts), len(want), hr)
+            for part, (lo, hi) in zip(parts, want):
+                ph, pb = part.split(b"\r\n\r\n", 1)
+                ph = ph.decode("utf-8")
+                zs = "Content-Range: bytes %d-%d/1000" % (lo, hi - 1)
+                self.assertIn(zs, ph, hr)
+                self.assertIn("Content-Type: ", ph, hr)
+                self.assertEqual(pb, d[lo:hi], hr)
+
+        # too many ranges; the whole file instead
+        hr = ",".join("%d-%d" % (n * 2, n * 2) for n in range(99))
+        h, b = self.get(hr)
+        self.assertIn(" 200 OK", h)
+        self.assertEqual(b, d)
+
+    def get(self, hr):
+        zs = "GET /f HTTP/1.1\r\nConnection: close\r\nRange: bytes=%s\r\n\r\n"
+        HttpCli(self.conn.setbuf((zs % (hr,)).encode("utf-8"))).run()
+        h, b = self.conn.s._reply.split(b"\r\n\r\n", 1)
+        return h.decode("utf-8"), b
+
+    def hval(self, h, k):
+        for ln in h.split("\r\n"):
+            if ln.lower().startswith(k.lower() + ": "):
+                return ln.split(": ", 1)[1]
+
+    def log(self, src, msg, c=0):
+        print(msg)
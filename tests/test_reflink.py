@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# coding: utf-8
+from __future__ import print_function, unicode_literals
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from copyparty import util as cu
+from copyparty.authsrv import AuthSrv
+from copyparty.httpcli import HttpCli
+from copyparty.up2k import up2k_chunksize, up2k_wark_from_hashlist
+from copyparty.util import clone_range, reflink, ub64enc
+from tests import util as tu
+from tests.util import Cfg
+
+try:
+    from unittest import mock
+except ImportError:
+    mock = None  # type: ignore
+
+
+def noioctl(*a):
+    raise OSError(95, "Operation not supported")
+
+
+@unittest.skipUnless(sys.platform.startswith("linux") and mock, "linux-only")
+class TestReflink(unittest.TestCase):
+    def setUp(self):
+        self.td = tu.get_ramdisk()
+        td = os.path.join(self.td, "vfs")
+        os.mkdir(td)
+        os.chdir(td)
+
+    def tearDown(self):
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(self.td)
+
+    def test_clone_range(self):
+        data = tu.randbytes(300000)
+        with open("f", "wb") as f:
+            f.write(data + b"\0" * 400000)
+
+        # no FICLONERANGE (tmpfs, ext4); must use copy_file_range
+        fd = os.open("f", os.O_RDWR)
+        try:
+            with mock.patch.object(cu.fcntl, "ioctl", noioctl):
+                for sofs, dofs, sz in ((0, 300000, 1), (4099, 300001, 200007)):
+                    zs = clone_range(fd, sofs, dofs, sz)
+                    self.assertEqual(zs, "copy_file_range")
+        finally:
+            os.close(fd)
+
+        with open("f", "rb") as f:
+            buf = f.read()
+        self.assertEqual(buf[:300000], data)
+        self.assertEqual(buf[300000:300001], data[:1])
+        self.assertEqual(buf[300001:500008], data[4099:204106])
+        self.assertEqual(buf[500008:], b"\0" * 199992)
+
+    def test_reflink_fallback(self):
+        with open("src", "wb") as f:
+            f.write(b"hello")
+
+        with mock.patch.object(cu.fcntl, "ioctl", noioctl):
+            # no half-created dst left behind
+            with self.assertRaises(OSError):
+                reflink(os.path.abspath("src"), "dst")
+            self.assertFalse(os.path.exists("dst"))
+
+            self.args = Cfg(v=[".::A"], a=[])
+            self.asrv = AuthSrv(self.args, self.log)
+            up2k = tu.VHub(self.args, self.asrv, self.log).up2k
+            src = os.path.abspath("src")
+            for fn, flags in (
+                ("hl", {"dedup": True, "reflink": True, "hardlink": True}),
+                ("sl", {"dedup": True, "reflink": True}),
+                ("cp", {"reflink": True}),
+            ):
+                dst = os.path.abspath(fn)
+                up2k._symlink(src, dst, flags, lmod=1600000000)
+                with open(dst, "rb") as f:
+                    self.assertEqual(f.read(), b"hello", fn)
+                self.assertEqual(os.path.islink(dst), fn == "sl", fn)
+                self.assertEqual(os.path.samefile(src, dst), fn != "cp", fn)
+            up2k.shutdown()
+
+    def test_reflink_upload(self):
+        self.args = Cfg(v=[".::A:c,reflink"], a=[], e2d=True)
+        self.asrv = AuthSrv(self.args, self.log)
+        self.conn = tu.VHttpConn(self.args, self.asrv, self.log, b"", True)
+
+        # three chunks where the first two are the same; the second
+        # one is cloned into place by the server (clone_range)
+        csz = up2k_chunksize(3 * 1024 * 1024)
+        c1 = tu.randbytes(csz)
+        c2 = tu.randbytes(3 * 1024 * 1024 - 2 * csz)
+        data = c1 + c1 + c2
+        hashes = [self.chash(x) for x in (c1, c1, c2)]
+        wark = up2k_wark_from_hashlist(self.args.warksalt, len(data), hashes)
+
+        hs = self.handshake("d", "f1", len(data), hashes)
+        self.assertEqual(hs["wark"], wark)
+        self.assertEqual(hs["hash"], [hashes[0], hashes[2]])
+        self.put_chunk("d", wark, hashes[0], c1)
+        self.put_chunk("d", wark, hashes[2], c2)
+        with open("d/f1", "rb") as f:
+            self.assertEqual(f.read(), data)
+
+        # and a dupe of the whole file; reflink if possible,
+        # else the usual symlink fallback
+        hs = self.handshake("d2", "f2", len(data), hashes)
+        self.assertEqual(hs["hash"], [])
+        with open("d2/f2", "rb") as f:
+            self.assertEqual(f.read(), data)
+        if os.path.islink("d2/f2"):
+            self.assertIn("cannot reflink", "".join(self.logs))
+
+        self.conn.hsrv.hub.up2k.shutdown()
+
+    def chash(self, buf):
+        return ub64enc(hashlib.sha512(buf).digest()[:33]).decode("ascii")
+
+    def handshake(self, dn, fn, sz, hashes):
+        msg = {"name": fn, "size": sz, "lmod": 1600000000, "hash": hashes}
+        buf = json.dumps(msg).encode("utf-8")
+        hdr = "POST /%s/ HTTP/1.1\r\nConnection: close\r\nContent-Type: text/plain\r\nContent-Length: %d\r\n\r\n"
+        buf = (hdr % (dn, len(buf))).encode("utf-8") + buf
+        HttpCli(self.conn.setbuf(buf)).run()
+        h, b = self.conn.s._reply.decode("utf-8").split("\r\n\r\n", 1)
+        self.assertIn(" 200 OK", h)
+        return json.loads(b)
+
+    def put_chunk(self, dn, wark, chash, data):
+        hdr = [
+            "POST /%s/ HTTP/1.1" % (dn,),
+            "Connection: close",
+            "Content-Type: application/octet-stream",
+            "Content-Length: %d" % (len(data),),
+            "X-Up2k-Hash: " + chash,
+            "X-Up2k-Wark: " + wark,
+            "",
+            "",
+        ]
+        buf = "\r\n".join(hdr).encode("utf-8") + data
+        HttpCli(self.conn.setbuf(buf)).run()
+        ret = self.conn.s._reply.decode("utf-8").split("\r\n\r\n", 1)
+        self.assertEqual(ret[1], "thank")
+
+    def log(self, src, msg, c=0):
+        if not hasattr(self, "logs"):
+            self.logs = []
+        self.logs.append(msg)
+        print(msg)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# coding: utf-8
+from __future__ import print_function, unicode_literals
+
+import gzip
+import os
+import shutil
+import tempfile
+import threading
+import types
+import unittest
+
+from copyparty.authsrv import AuthSrv
+from copyparty.httpcli import HttpCli
+from copyparty.httpsrv import HttpSrv
+from tests import util as tu
+from tests.util import Cfg
+
+
+class TestRes(unittest.TestCase):
+    def setUp(self):
+        self.td = tu.get_ramdisk()
+        os.chdir(self.td)
+
+    def tearDown(self):
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(self.td)
+
+    def cinit(self, **ka):
+        self.args = Cfg(v=[".::r"], a=[], **ka)
+        self.asrv = AuthSrv(self.args, self.log)
+        self.conn = tu.VHttpConn(self.args, self.asrv, self.log, b"")
+
+        # borrow the resource cache from the real thing
+        hsrv = self.conn.hsrv
+        hsrv.E = self.args.E
+        hsrv.name = "hsrv"
+        hsrv.res_cache = {}
+        hsrv.res_cb = ""
+        hsrv.res_mutex = threading.Lock()
+        for k in ("get_res", "_load_res"):
+            setattr(hsrv, k, types.MethodType(getattr(HttpSrv, k), hsrv))
+
+    def test_res_cache(self):
+        self.cinit(no_res_cache=False)
+        url = ".cpr/splash.js"
+        with open(os.path.join(self.args.E.mod, "web/splash.js"), "rb") as f:
+            plain = f.read()
+
+        h, b = self.get(url, {"Accept-Encoding": "zstd;q=0, gzip"})
+        self.assertIn(" 200 OK", h)
+        self.assertIn("Content-Encoding: gzip", h)
+        self.assertIn("Vary: Origin, PW, Cookie, Accept-Encoding", h)
+        self.assertEqual(gzip.decompress(b), plain)
+        etag = self.hval(h, "ETag")
+        self.assertEqual(int(self.hval(h, "Content-Length")), len(b))
+
+        h, b = self.get(url)
+        self.assertIn(" 200 OK", h)
+        self.assertNotIn("Content-Encoding", h)
+        self.assertEqual(b, plain)
+        self.assertNotEqual(self.hval(h, "ETag"), etag)
+
+        # 304 only for the etag of the encoding being asked for
+        h, b = self.get(url, {"Accept-Encoding": "gzip", "If-None-Match": etag})
+        self.assertIn(" 304 Not Modified", h)
+        self.assertEqual(b, b"")
+        h, b = self.get(url, {"If-None-Match": etag})
+        self.assertIn(" 200 OK", h)
+
+        self.assertIn("web/splash.js", self.conn.hsrv.res_cache)
+
+    def test_res_fail(self):
+        self.cinit(no_res_cache=False)
+        hsrv = self.conn.hsrv
+        load = hsrv._load_res
+
+        def fail(res_path):
+            raise IOError("transient")
+
+        hsrv._load_res = fail
+        self.assertIsNone(hsrv.get_res("web/splash.js"))
+        self.assertNotIn("web/splash.js", hsrv.res_cache)
+
+        # falls back to the uncached path in the meantime
+        h, b = self.get(".cpr/splash.js")
+        self.assertIn(" 200 OK", h)
+
+        hsrv._load_res = load
+        self.assertTrue(hsrv.get_res("web/splash.js"))
+        self.assertIn("web/splash.js", hsrv.res_cache)
+
+    def test_no_res_cache(self):
+        self.cinit(no_res_cache=True)
+        h, b = self.get(".cpr/splash.js")
+        self.assertIn(" 200 OK", h)
+        self.assertEqual(self.conn.hsrv.res_cache, {})
+
+    def get(self, url, hdrs={}):
+        zs = "".join("%s: %s\r\n" % (k, v) for k, v in hdrs.items())
+        zs = "GET /%s HTTP/1.1\r\nConnection: close\r\n%s\r\n" % (url, zs)
+        HttpCli(self.conn.setbuf(zs.encode("utf-8"))).run()
+        h, b = self.conn.s._reply.split(b"\r\n\r\n", 1)
+        return h.decode("utf-8"), b
+
+    def hval(self, h, k):
+        for ln in h.split("\r\n"):
+            if ln.lower().startswith(k.lower() + ": "):
+                return ln.split(": ", 1)[1]
+
+    def log(self, src, msg, c=0):
+        print(msg)
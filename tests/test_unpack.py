@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# coding: utf-8
+from __future__ import print_function, unicode_literals
+
+import io
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+import zipfile
+
+from copyparty.authsrv import AuthSrv
+from copyparty.httpcli import HttpCli
+from tests import util as tu
+from tests.util import Cfg
+
+
+class NoSeek(io.RawIOBase):
+    """makes zipfile write data-descriptors, like a streaming zipper would"""
+
+    def __init__(self):
+        self.buf = io.BytesIO()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        return self.buf.write(b)
+
+
+class TestUnpack(unittest.TestCase):
+    def setUp(self):
+        self.td = tu.get_ramdisk()
+        td = os.path.join(self.td, "vfs")
+        os.mkdir(td)
+        os.chdir(td)
+        os.mkdir("u")
+        os.mkdir("n")
+
+        # (path in archive, contents)
+        self.files = [
+            ("a.txt", b"hello"),
+            ("d1/b.txt", b"world" * 9999),
+            ("d1/d2/empty", b""),
+        ]
+
+    def tearDown(self):
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(self.td)
+
+    def mktar(self, cmp):
+        bio = io.BytesIO()
+        with tarfile.open(fileobj=bio, mode="w:" + cmp) as tf:
+            ti = tarfile.TarInfo("d1")
+            ti.type = tarfile.DIRTYPE
+            tf.addfile(ti)
+            for fn, data in self.files + [("../evil", b"x")]:
+                ti = tarfile.TarInfo(fn)
+                ti.size = len(data)
+                ti.mtime = 1600000000
+                tf.addfile(ti, io.BytesIO(data))
+            ti = tarfile.TarInfo("lnk")
+            ti.type = tarfile.SYMTYPE
+            ti.linkname = "/etc/passwd"
+            tf.addfile(ti)
+        return bio.getvalue()
+
+    def mkzip(self, cmp, seekable):
+        f = io.BytesIO() if seekable else NoSeek()
+        with zipfile.ZipFile(f, "w", cmp) as zf:
+            zf.writestr("d1/", b"")
+            for fn, data in self.files:
+                zi = zipfile.ZipInfo(fn, (2020, 9, 13, 12, 26, 40))
+                zi.compress_type = cmp
+                zf.writestr(zi, data)
+        return (f if seekable else f.buf).getvalue()
+
+    def test_unpack(self):
+        self.args = Cfg(v=["u:u:A:c,e2d,unpack", "n:n:A"], a=[])
+        self.asrv = AuthSrv(self.args, self.log)
+        self.conn = tu.VHttpConn(self.args, self.asrv, self.log, b"", True)
+
+        archives = [
+            ("tar", self.mktar("")),
+            ("tgz", self.mktar("gz")),
+            ("txz", self.mktar("xz")),
+            ("zip-store", self.mkzip(zipfile.ZIP_STORED, True)),
+            ("zip-defl", self.mkzip(zipfile.ZIP_DEFLATED, True)),
+            ("zip-defl-stream", self.mkzip(zipfile.ZIP_DEFLATED, False)),
+        ]
+        for name, buf in archives:
+            h, b = self.put("u/%s/x.bin?unpack&j" % (name,), buf)
+            self.assertIn(" 201 Created", h, name)
+            jt = json.loads(b)
+            self.assertEqual(jt["files"], 3, name)
+            self.assertEqual(jt["bytes"], 5 + 5 * 9999, name)
+            self.assertEqual(jt["skipped"], ["../evil"] if "t" in name[:1] else [])
+            for fn, data in self.files:
+                ap = os.path.join("u", name, fn)
+                with open(ap, "rb") as f:
+                    self.assertEqual(f.read(), data, name + fn)
+                if name.startswith("t"):
+                    self.assertEqual(os.path.getmtime(ap), 1600000000)
+            self.assertFalse(os.path.exists(os.path.join("u", name, "x.bin")))
+            self.assertFalse(os.path.exists(os.path.join("u", name, "lnk")))
+            self.assertFalse(os.path.exists(os.path.join("u", "evil")))
+
+        # and queued for indexing (no hasher thread in tests; do it here)
+        up2k = self.conn.hsrv.hub.up2k
+        tasks = list(up2k.hashq.pop(os.path.abspath("u")))
+        self.assertEqual(len(tasks), 3 * len(archives))
+        for task in tasks:
+            # contents were hashed while writing; must match a reread
+            ap = os.path.join(task[0], task[3], task[4])
+            if os.path.getsize(ap):
+                self.assertEqual(task[9], up2k._hashlist_from_file(ap)[0])
+        up2k._hash_batch(tasks)
+        cur = up2k.cur[os.path.abspath("u")]
+        zs = "select count(*) from up where rd like 'tgz%'"
+        self.assertEqual(cur.execute(zs).fetchone()[0], 3)
+
+        # volflag required
+        h, b = self.put("n/x.tar?unpack", archives[0][1])
+        self.assertIn(" 403 Forbidden", h)
+        self.assertEqual(os.listdir("n"), [])
+
+        # garbage
+        h, b = self.put("u/junk/?unpack", b"this is not a tar file" * 99)
+        self.assertIn(" 400 Bad Request", h)
+
+        # corrupted zip
+        buf = bytearray(archives[3][1])
+        buf[buf.index(b"world") + 7] ^= 1
+        h, b = self.put("u/crc/?unpack", bytes(buf))
+        self.assertIn(" 400 Bad Request", h)
+        self.assertIn("crc32 mismatch", b)
+        zs = [x for x in os.listdir("u/crc") if "PARTIAL" in x]
+        self.assertEqual(zs, [])
+
+        # empty zip; nothing but the end-of-central-directory
+        bio = io.BytesIO()
+        zipfile.ZipFile(bio, "w").close()
+        h, b = self.put("u/empty/?unpack&j", bio.getvalue())
+        self.assertIn(" 201 Created", h)
+        self.assertEqual(json.loads(b)["files"], 0)
+
+        up2k.shutdown()
+
+    def put(self, url, buf):
+        hdr = "PUT /%s HTTP/1.1\r\nConnection: close\r\nContent-Length: %d\r\n\r\n"
+        buf = (hdr % (url, len(buf))).encode("utf-8") + buf
+        HttpCli(self.conn.setbuf(buf)).run()
+        return self.conn.s._reply.decode("utf-8").split("\r\n\r\n", 1)
+
+    def log(self, src, msg, c=0):
+        print(msg)
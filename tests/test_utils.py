@@ -36,3 +36,335 @@ class TestUtils(unittest.TestCase):
             br"%ed%91qw,er;ty%20as df?gh+jkl%zxc&vbn <qwe>\"rty'uio&asd&nbsp;fgh",
         ):
             self.cmp(btxt, unquote(btxt), u2b(btxt))
+
+    def test_cmp_pick(self):
+        import gzip
+
+        from copyparty.util import cmp_buf, cmp_pick
+
+        encs = ["zstd", "br", "gzip"]
+        for ae, want in (
+            ("gzip, deflate, br, zstd", "zstd"),
+            ("gzip, deflate, br;q=0, zstd;q=0.0", "gzip"),
+            ("deflate, br;q=0.5", "br"),
+            ("identity", ""),
+        ):
+            self.assertEqual(cmp_pick(ae, encs), want)
+
+        zb = tu.randbytes(8192) * 2
+        self.assertEqual(gzip.decompress(cmp_buf("gzip", zb, 3)), zb)
+
+    def test_chunkhasher(self):
+        import hashlib
+        import random
+
+        from copyparty.up2k import ChunkHasher, up2k_chunksize
+        from copyparty.util import ub64enc
+
+        mib = 1024 * 1024
+        buf = tu.randbytes(3 * mib + 99)
+        for sz in (1, 4096, mib, mib + 1, 3 * mib + 99):
+            data = buf[:sz]
+            csz = up2k_chunksize(sz)
+            zl = [data[n : n + csz] for n in range(0, sz, csz)]
+            zl = [ub64enc(hashlib.sha512(x).digest()[:33]).decode("ascii") for x in zl]
+
+            u2h = ChunkHasher(random.choice([-1, sz]))
+            ofs = 0
+            while ofs < sz:
+                n = random.randint(1, 300000)
+                u2h.update(memoryview(data)[ofs : ofs + n])
+                ofs += n
+            self.assertEqual(u2h.finish(sz), zl)
+
+        # non-sequential writes, wrong size, wrong chunksize
+        u2h = ChunkHasher()
+        u2h.update_at(0, b"a")
+        u2h.update_at(2, b"b")
+        self.assertIsNone(u2h.finish(2))
+        u2h = ChunkHasher()
+        u2h.update(b"ab")
+        self.assertIsNone(u2h.finish(3))
+        self.assertIsNone(ChunkHasher(300 * mib).finish(0))
+        u2h = ChunkHasher(300 * mib)
+        u2h.update(b"ab")
+        self.assertIsNone(u2h.finish(2))
+
+        # more than 256 chunks of 1 MiB; 1.5 MiB chunks
+        sz = 257 * mib + 5
+        csz = up2k_chunksize(sz)
+        self.assertEqual(csz, mib * 3 // 2)
+
+        def feed(u2h, sz):
+            for ofs in range(0, sz, mib):
+                u2h.update(memoryview(buf)[ofs % 7 : ofs % 7 + min(mib, sz - ofs)])
+
+        # reference; same data, hashed the slow way
+        zl = []
+        hobj = hashlib.sha512()
+        rem = csz
+        for ofs in range(0, sz, mib):
+            zb = buf[ofs % 7 : ofs % 7 + min(mib, sz - ofs)]
+            while zb:
+                hobj.update(zb[:rem])
+                n = min(rem, len(zb))
+                zb = zb[n:]
+                rem -= n
+                if not rem or (not zb and ofs + mib >= sz):
+                    zl.append(ub64enc(hobj.digest()[:33]).decode("ascii"))
+                    hobj = hashlib.sha512()
+                    rem = csz
+
+        # bup; size of the whole request body (upper bound) as the hint,
+        # so the 1 MiB chunks give up halfway and the larger ones carry on
+        self.assertEqual(len(zl), 172)
+        for hint, ok in ((sz + 999, True), (-1, False)):
+            u2h = ChunkHasher(hint, True)
+            feed(u2h, sz)
+            self.assertEqual(u2h.ok, ok, hint)
+            self.assertEqual(u2h.finish(sz), zl if ok else None, hint)
+
+        # and still 1 MiB for a smaller file in the same request
+        u2h = ChunkHasher(sz, True)
+        feed(u2h, 3 * mib)
+        self.assertEqual(len(u2h.finish(3 * mib) or ""), 3)
+
+        # smb; size hint after the fact (set-end-of-file)
+        u2h = ChunkHasher()
+        u2h.hint(sz)
+        feed(u2h, sz)
+        self.assertEqual(u2h.finish(sz), zl)
+
+    def test_smb_eof(self):
+        import os
+        import tempfile
+
+        from copyparty.smbd import SMB
+        from copyparty.up2k import ChunkHasher, up2k_chunksize
+
+        # what smbserver does for set-end-of-file, then the actual data
+        smb = SMB.__new__(SMB)
+        fd, fn = tempfile.mkstemp()
+        try:
+            u2h = smb.u2h = {fd: ChunkHasher()}
+            os.lseek(fd, 5 * 1024 * 1024 - 1, 0)
+            smb._write(fd, b"\0")
+            self.assertEqual(u2h[fd].tiers[0].csz, 1024 * 1024)
+            os.lseek(fd, 0, 0)
+            zb = tu.randbytes(5 * 1024 * 1024)
+            for ofs in range(0, len(zb), 65536):
+                smb._write(fd, zb[ofs : ofs + 65536])
+            self.assertEqual(len(u2h[fd].finish(len(zb)) or ""), 5)
+
+            # the size decides the chunksize
+            u2h[fd] = ChunkHasher()
+            os.lseek(fd, 300 * 1024 * 1024 - 1, 0)
+            smb._write(fd, b"\0")
+            zi = up2k_chunksize(300 * 1024 * 1024)
+            self.assertEqual([x.csz for x in u2h[fd].tiers], [zi])
+            self.assertTrue(u2h[fd].ok)
+        finally:
+            os.close(fd)
+            os.unlink(fn)
+
+    def test_mthash(self):
+        import hashlib
+        import os
+        import tempfile
+
+        from copyparty import util
+        from copyparty.util import MTHash, ub64enc
+
+        buf = tu.randbytes(1024 * 1024 + 99)
+        csz = 64 * 1024
+        zl = [buf[n : n + csz] for n in range(0, len(buf), csz)]
+        zl = [ub64enc(hashlib.sha512(x).digest()[:33]).decode("ascii") for x in zl]
+
+        fd, fn = tempfile.mkstemp()
+        os.write(fd, buf)
+        os.close(fd)
+        mth = MTHash(3, 4096)
+        pread = util.HAVE_PREAD
+        try:
+            for util.HAVE_PREAD in set([pread, False]):
+                with open(fn, "rb") as f:
+                    ret = mth.hash(f, len(buf), csz)
+                self.assertEqual([x[0] for x in ret], zl)
+                self.assertEqual(ret[-1][1:], (len(buf) - 99, 99))
+        finally:
+            util.HAVE_PREAD = pread
+            os.unlink(fn)
+
+    def test_hashlist(self):
+        import copy
+        import json
+        import os
+        import tempfile
+
+        from copyparty.up2k import HashList, Up2k
+        from copyparty.util import Pebkac, ub64enc
+
+        def enc(zb):
+            return ub64enc(zb).decode("ascii")
+
+        zbs = [tu.randbytes(33) for _ in range(4)]
+        hs = [enc(x) for x in zbs]
+        hl = HashList(hs)
+        self.assertEqual(len(hl), 4)
+        self.assertEqual(list(hl), hs)
+        self.assertEqual(hl.tolist(), hs)
+        self.assertEqual(repr(hl), repr(hs))
+        self.assertEqual([hl[n] for n in range(-4, 4)], hs + hs)
+        for n in (4, -5):
+            with self.assertRaises(IndexError):
+                hl[n]
+
+        for n, chash in enumerate(hs):
+            self.assertIn(chash, hl)
+            self.assertEqual(hl.index(chash), n)
+
+        # present in the bytearray, but straddling two digests
+        for ofs in (1, 11, 32):
+            zs = enc(zbs[1][ofs:] + zbs[2][:ofs])
+            self.assertNotIn(zs, hl)
+            self.assertEqual(hl._find(zs), -1)
+            with self.assertRaises(ValueError):
+                hl.index(zs)
+
+            # and also aligned further on
+            hl2 = HashList(hs + [zs])
+            self.assertEqual(hl2.index(zs), 4)
+            hl2.remove(zs)
+            self.assertEqual(hl2.tolist(), hs)
+
+        for zs in ("", "abc", hs[0][:43], hs[0] + "A", "#" * 44):
+            self.assertNotIn(zs, hl)
+
+        with self.assertRaises(Pebkac) as cm:
+            HashList(hs[:2] + ["abc"])
+        self.assertEqual(cm.exception.code, 400)
+
+        # copies don't share the buffer
+        hl2 = HashList(hl)
+        hl3 = copy.deepcopy(hl)
+        hl.remove(hs[1])
+        self.assertEqual(hl.tolist(), [hs[0], hs[2], hs[3]])
+        self.assertEqual(hl2.tolist(), hs)
+        self.assertEqual(hl3.tolist(), hs)
+        with self.assertRaises(ValueError):
+            hl.remove(hs[1])
+        for zs in hs[::-1]:
+            if zs != hs[1]:
+                hl.remove(zs)
+        self.assertEqual((len(hl), list(hl)), (0, []))
+        self.assertFalse(hl)
+
+        # snap and journal; plain lists on disk, HashList again on load
+        up2k = Up2k.__new__(Up2k)
+        up2k.log = lambda *a: None
+        wark = "w" * 44
+        job = {"wark": wark, "hash": HashList(hs), "need": HashList(hs[1:])}
+        job["cidx"] = {}
+        zd = json.loads(json.dumps(up2k._snap_job(job)))
+        self.assertEqual(zd, {"wark": wark, "hash": hs, "need": hs[1:]})
+
+        fd, fn = tempfile.mkstemp()
+        try:
+            for ln in (["n", wark, zd], ["c", wark, [hs[2], hs[3]]]):
+                os.write(fd, b"\n" + json.dumps(ln).encode("utf-8"))
+            os.close(fd)
+            reg = {}
+            self.assertEqual(up2k._jnl_replay(fn, reg), 2)
+        finally:
+            os.unlink(fn)
+        self.assertEqual(HashList(reg[wark]["need"]).tolist(), [hs[1]])
+        self.assertEqual(HashList(reg[wark]["hash"]).tolist(), hs)
+
+    def test_ipc_tmo(self):
+        import threading
+
+        from copyparty.broker_mpw import MpWorker
+        from copyparty.util import Pebkac
+
+        class Args(object):
+            ipc_tmo = 0.01
+
+        class Ipc(object):
+            def put(self, msg):
+                self.msg = msg
+
+        mpw = MpWorker.__new__(MpWorker)
+        mpw.args = Args()
+        mpw.ipc = Ipc()
+        mpw.retpend = {}
+        mpw.retpend_mutex = threading.Lock()
+        mpw.retq_n = 0
+
+        retq = mpw.ask("up2k.nope")
+        self.assertEqual(list(mpw.retpend), [mpw.ipc.msg[0]])
+        with self.assertRaises(Pebkac):
+            retq.get()
+        self.assertEqual(mpw.retpend, {})
+
+        # reply in time; popped by handle as usual
+        retq = mpw.ask("up2k.yep")
+        mpw.logw = lambda *a: None
+        mpw.handle(mpw.ipc.msg[0], "retq", "ok")
+        self.assertEqual(mpw.retpend, {})
+        self.assertEqual(retq.get(), "ok")
+
+        # deletes and moves can take as long as they need
+        for dest in ("up2k.handle_rm", "up2k.handle_mv"):
+            self.assertIsNone(mpw.ask(dest).tmo)
+        self.assertEqual(mpw.ask("up2k.handle_json").tmo, 0.01)
+
+    def test_hashpw(self):
+        import hashlib
+        import os
+        import socket
+        import tempfile
+        import threading
+
+        from copyparty.util import HAVE_PWRITE, HashPw, Pebkac, Unrecv
+
+        if not HAVE_PWRITE:
+            raise unittest.SkipTest()
+
+        data = tu.randbytes(3 * 1024 * 1024 + 777)
+        s1, s2 = socket.socketpair()
+        sr = Unrecv(s1, None)
+        sr.buf = data[:5]  # leftovers from the headers
+        fd, path = tempfile.mkstemp()
+        hpw = HashPw(256 * 1024)
+        nthr = threading.active_count()
+        try:
+            thr = threading.Thread(target=s2.sendall, args=(data[5:],))
+            thr.start()
+            ofs = 0
+            for sz in (1, 999999, len(data) - 1000000):
+                tlen, hexd, _ = hpw.copy(sr, sz, fd, 4096 + ofs)
+                self.assertEqual(tlen, sz)
+                zs = hashlib.sha512(data[ofs : ofs + sz]).hexdigest()
+                self.assertEqual(hexd, zs)
+                ofs += sz
+            thr.join()
+
+            # the same helper for every chunk
+            self.assertEqual(threading.active_count(), nthr)
+
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), b"\0" * 4096 + data)
+
+            # client d/c
+            s2.sendall(b"abc")
+            s2.close()
+            with self.assertRaises(Pebkac) as cm:
+                hpw.copy(sr, 9, fd, 0)
+            self.assertIn("after 3 bytes, 6 bytes remaining", str(cm.exception))
+            self.assertEqual(hpw.free.qsize(), 2)
+        finally:
+            hpw.close()
+            hpw.thr.join()
+            s1.close()
+            os.close(fd)
+            os.unlink(path)
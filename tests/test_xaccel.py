@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# coding: utf-8
+from __future__ import print_function, unicode_literals
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from copyparty.authsrv import AuthSrv
+from copyparty.httpcli import HttpCli
+from tests import util as tu
+from tests.util import Cfg
+
+
+class TestXaccel(unittest.TestCase):
+    def setUp(self):
+        self.td = tu.get_ramdisk()
+        os.chdir(self.td)
+        for d in ("a", "b", "c", "d"):
+            os.makedirs(os.path.join(d, "sub dir"))
+            with open(os.path.join(d, "sub dir", "f #1%.txt"), "wb") as f:
+                f.write(b"hello")
+
+    def tearDown(self):
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(self.td)
+
+    def test_xaccel(self):
+        vols = [
+            "a:a:r:c,xaccel=/int/a/",  # prefix form
+            "b:b:r:c,xaccel",  # bare flag; defaults to the vpath
+            "c:c:r:c,xsendfile",
+            "d:d:r",
+        ]
+        self.args = Cfg(v=vols, a=[], rproxy=1, xff_hdr="x-forwarded-for")
+        self.asrv = AuthSrv(self.args, self.log)
+        self.assertEqual(self.asrv.vfs.all_vols["b"].flags["xaccel"], "/b")
+        self.conn = tu.VHttpConn(self.args, self.asrv, self.log, b"")
+        self.conn.xff_nm = None
+        self.conn.set_rproxy = lambda ip: "rp"
+
+        url = "%s/sub%%20dir/f%%20%%231%%25.txt"
+        ap = os.path.abspath(os.path.join("c", "sub dir", "f #1%.txt"))
+        for vol, hk, hv in (
+            ("a", "X-Accel-Redirect", "/int/a/sub%20dir/f%20%231%25.txt"),
+            ("b", "X-Accel-Redirect", "/b/sub%20dir/f%20%231%25.txt"),
+            ("c", "X-Sendfile", ap),
+        ):
+            h, b = self.get(url % (vol,), True)
+            self.assertIn(" 200 OK", h, vol)
+            self.assertEqual(self.hval(h, hk), hv, vol)
+            self.assertEqual(self.hval(h, "Content-Length"), "0", vol)
+            self.assertEqual(b, b"", vol)
+
+            # not behind the reverse-proxy; send it ourselves
+            h, b = self.get(url % (vol,), False)
+            self.assertIsNone(self.hval(h, hk), vol)
+            self.assertEqual(b, b"hello", vol)
+
+        h, b = self.get(url % ("d",), True)
+        self.assertIsNone(self.hval(h, "X-Accel-Redirect"))
+        self.assertEqual(b, b"hello")
+
+    def get(self, url, rproxied):
+        zs = "GET /%s HTTP/1.1\r\nConnection: close\r\n" % (url,)
+        if rproxied:
+            zs += "X-Forwarded-For: 1.2.3.4\r\n"
+        HttpCli(self.conn.setbuf((zs + "\r\n").encode("utf-8"))).run()
+        h, b = self.conn.s._reply.split(b"\r\n\r\n", 1)
+        return h.decode("utf-8"), b
+
+    def hval(self, h, k):
+        for ln in h.split("\r\n"):
+            if ln.lower().startswith(k.lower() + ": "):
+                return ln.split(": ", 1)[1]
+
+    def log(self, src, msg, c=0):
+        print(msg)
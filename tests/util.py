@@ -122,22 +122,22 @@ class Cfg(Namespace):
     def __init__(self, a=None, v=None, c=None, **ka0):
         ka = {}
 
-        ex = "chpw daw dav_auth dav_inf dav_mac dav_rt e2d e2ds e2dsa e2t e2ts e2tsr e2v e2vu e2vp early_ban ed emp exp force_js getmod grid gsel hardlink ih ihead magic hardlink_only nid nih no_acode no_athumb no_clone no_dav no_db_ip no_del no_dirsz no_dupe no_lifetime no_logues no_mv no_pipe no_poll no_readme no_robots no_sb_md no_sb_lg no_scandir no_tarcmp no_thumb no_vthumb no_zip nrand nw og og_no_head og_s_title q rand re_dirsz smb srch_dbg stats uqe vague_403 vc ver write_uplog xdev xlink xvol zs"
+        ex = "chpw daw dav_auth dav_inf dav_mac dav_rt e2d e2ds e2dsa e2t e2ts e2tsr e2v e2vu e2vp early_ban ed emp exp force_js getmod grid gsel hardlink http_only https_only ih ihead inotify log_conn log_htp magic hardlink_only nid nih no_acode no_athumb no_clone no_cmp no_dav no_db_ip no_del no_dirsz no_dupe no_lifetime no_logues no_mv no_pipe no_poll no_readme no_robots no_sb_md no_sb_lg no_scandir no_tarcmp no_thumb no_vthumb no_zip nrand nw og og_no_head og_s_title q rand re_dirsz reflink smb srch_dbg stats unpack uqe vague_403 vc ver write_uplog xdev xlink xvol zs"
         ka.update(**{k: False for k in ex.split()})
 
-        ex = "dedup dotpart dotsrch hook_v no_dhash no_fastboot no_fpool no_htp no_rescan no_sendfile no_ses no_snap no_up_list no_voldump re_dhash plain_ip"
+        ex = "dedup dotpart dotsrch hook_v no_dhash no_fastboot no_fpool no_htp no_kap no_rescan no_res_cache no_sendfile no_ses no_snap no_u2pipe no_up_list no_voldump re_dhash plain_ip"
         ka.update(**{k: True for k in ex.split()})
 
-        ex = "ah_cli ah_gen css_browser hist ipu js_browser js_other mime mimes no_forget no_hash no_idx nonsus_urls og_tpl og_ua"
+        ex = "ah_cli ah_gen css_browser hist ipu js_browser js_other lf_url mime mimes no_forget no_hash no_idx nonsus_urls og_tpl og_ua"
         ka.update(**{k: None for k in ex.split()})
 
-        ex = "hash_mt safe_dedup srch_time u2abort u2j u2sz"
+        ex = "hash_mt hashq_mt idx_mt j safe_dedup srch_time u2abort u2j u2sz"
         ka.update(**{k: 1 for k in ex.split()})
 
-        ex = "au_vol mtab_age reg_cap s_thead s_tbody th_convt"
+        ex = "au_vol cmp_lv cmp_min max_ranges mtab_age reg_cap s_thead s_tbody ssl_tickets th_convt"
         ka.update(**{k: 9 for k in ex.split()})
 
-        ex = "db_act k304 loris re_maxage rproxy rsp_jtr rsp_slp s_wr_slp snap_wri theme themes turbo"
+        ex = "db_act hashq_gmt inotify_cd k304 loris re_maxage rproxy rsp_jtr rsp_slp s_wr_slp snap_wri theme themes turbo"
         ka.update(**{k: 0 for k in ex.split()})
 
         ex = "ah_alg bname chpw_db doctitle df exit favico idp_h_usr ipa html_head lg_sbf log_fk md_sbf name og_desc og_site og_th og_title og_title_a og_title_v og_title_i shr tcolor textfiles unlist vname xff_src R RS SR"
@@ -146,7 +146,7 @@ class Cfg(Namespace):
         ex = "ban_403 ban_404 ban_422 ban_pw ban_url"
         ka.update(**{k: "no" for k in ex.split()})
 
-        ex = "grp on403 on404 xad xar xau xban xbd xbr xbu xiu xm"
+        ex = "cmp_enc grp on403 on404 xad xar xau xban xbd xbr xbu xiu xm"
         ka.update(**{k: [] for k in ex.split()})
 
         ex = "exp_lg exp_md"
@@ -162,6 +162,8 @@ class Cfg(Namespace):
             dbd="wal",
             dk_salt="b" * 16,
             fk_salt="a" * 16,
+            hash_rd_sz=12 * 1024 * 1024,
+            hashq_grp="vol",
             idp_gsep=re.compile("[|:;+,]"),
             iobuf=256 * 1024,
             lang="eng",
@@ -173,6 +175,7 @@ class Cfg(Namespace):
             mv_retry="0/0",
             rm_retry="0/0",
             s_rd_sz=256 * 1024,
+            s_wr_cmb=64 * 1024,
             s_wr_sz=256 * 1024,
             sort="href",
             srch_hits=99999,
@@ -235,6 +238,9 @@ class VHub(object):
         self.is_dut = True
         self.up2k = Up2k(self)
 
+    def get_log_drops(self):
+        return 0
+
 
 class VBrokerThr(BrokerThr):
     def __init__(self, hub):
@@ -305,9 +311,14 @@ class VHttpConn(object):
         self.pipes = CachedDict(1)
         self.u2mutex = threading.Lock()
         self.nbyte = 0
+        self.nhs = 0
+        self.nhs_err = 0
+        self.nhs_re = 0
+        self.hpw = None
         self.nid = None
         self.nreq = -1
         self.thumbcli = None
+        self.ths = 0.0
         self.u2fh = FHC()
 
         self.get_u2idx = self.hsrv.get_u2idx